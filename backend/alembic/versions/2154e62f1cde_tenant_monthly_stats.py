@@ -0,0 +1,52 @@
+"""tenant monthly stats
+
+Revision ID: 2154e62f1cde
+Revises: a0a17023ba8c
+Create Date: 2026-10-18 13:20:44.902671
+
+Cria tenant_monthly_stats (agregados do dashboard por dono e mês) e a preenche
+com a mesma reconstrução de `python -m app.dashboard rebuild`.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.dashboard import rebuild_stats
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2154e62f1cde'
+down_revision: Union[str, Sequence[str], None] = 'a0a17023ba8c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tenant_monthly_stats',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('clients_added', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('pools_added', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('services_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('services_revenue', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.Column('budgets_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('budgets_total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.Column('budgets_approved_total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'month')
+    )
+
+    if context.is_offline_mode():
+        logger.warning('Modo offline: rode `python -m app.dashboard rebuild` depois de aplicar o SQL.')
+        return
+    logger.info(f'tenant_monthly_stats: {rebuild_stats(op.get_bind())} linha(s) calculada(s)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('tenant_monthly_stats')
@@ -0,0 +1,156 @@
+"""typed numeric service and budget columns
+
+Revision ID: 3daa7516875a
+Revises: c9741c01c683
+Create Date: 2026-10-18 11:31:52.208417
+
+Converte as colunas de texto de services (value, time_spent, ph, chlorine,
+alkalinity) e budgets.total para Numeric/Interval. Os valores são lidos e
+convertidos em lotes; os que não puderem ser interpretados ficam NULL e são
+listados no log e, com `alembic -x report=caminho.csv upgrade head`, num CSV.
+"""
+import csv
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.parsing import format_duration, parse_decimal, parse_duration, parse_money
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3daa7516875a'
+down_revision: Union[str, Sequence[str], None] = 'c9741c01c683'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+BATCH_SIZE = 2000
+
+# tabela -> {coluna: novo tipo}
+COLUMNS = {
+    'services': {
+        'value': sa.Numeric(10, 2),
+        'time_spent': sa.Interval(),
+        'ph': sa.Numeric(4, 2),
+        'chlorine': sa.Numeric(6, 2),
+        'alkalinity': sa.Numeric(7, 2),
+    },
+    'budgets': {
+        'total': sa.Numeric(12, 2),
+    },
+}
+
+
+# Colunas em reais: "1.500" é mil e quinhentos; nas leituras (pH, cloro...) é 1,5
+MONEY_COLUMNS = {('services', 'value'), ('budgets', 'total')}
+
+
+def _convert(raw, new_type, money: bool = False):
+    """Valor convertido para a coluna nova; ValueError se não couber ou não for número."""
+    if isinstance(new_type, sa.Interval):
+        return parse_duration(raw)
+    number = parse_money(raw) if money else parse_decimal(raw)
+    if number is None:
+        return None
+    number = round(number, new_type.scale)
+    if abs(number) >= 10 ** (new_type.precision - new_type.scale):
+        raise ValueError(f'Fora do intervalo de {new_type}: {raw!r}')
+    return number
+
+
+def _copy_in_batches(table: str, columns: dict, source_suffix: str, target_suffix: str, convert, to_text: bool = False) -> list:
+    """
+    Lê as colunas de origem por faixas de id e grava as convertidas; devolve as falhas.
+    Na ida a origem é texto e o destino tipado; com to_text=True, o contrário.
+    """
+    bind = op.get_bind()
+    source = sa.table(
+        table,
+        sa.column('id'),
+        *(sa.column(f'{name}{source_suffix}', new_type if to_text else sa.String()) for name, new_type in columns.items()),
+    )
+    target = sa.table(
+        table,
+        sa.column('id'),
+        *(sa.column(f'{name}{target_suffix}', sa.String() if to_text else new_type) for name, new_type in columns.items()),
+    )
+    update = (
+        target.update()
+        .where(target.c.id == sa.bindparam('row_id'))
+        .values({f'{name}{target_suffix}': sa.bindparam(f'new_{name}') for name in columns})
+    )
+    failures, last_id = [], 0
+    while True:
+        rows = bind.execute(
+            sa.select(source).where(source.c.id > last_id).order_by(source.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return failures
+        params = []
+        for row in rows:
+            values = {'row_id': row.id}
+            for name, new_type in columns.items():
+                raw = row._mapping[f'{name}{source_suffix}']
+                try:
+                    values[f'new_{name}'] = convert(raw, new_type, (table, name) in MONEY_COLUMNS)
+                except ValueError:
+                    values[f'new_{name}'] = None
+                    failures.append((table, row.id, name, raw))
+            params.append(values)
+        bind.execute(update, params)
+        last_id = rows[-1].id
+
+
+def _report(failures: list) -> None:
+    for table, row_id, column, raw in failures:
+        logger.warning(f'{table}.{column} id={row_id}: valor não convertido {raw!r} (gravado como NULL)')
+    logger.info(f'Conversão numérica: {len(failures)} valor(es) não convertido(s)')
+    report_path = context.get_x_argument(as_dictionary=True).get('report')
+    if report_path:
+        with open(report_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['tabela', 'id', 'coluna', 'valor'])
+            writer.writerows(failures)
+
+
+def _swap_columns(table: str, columns: dict, new_suffix: str) -> None:
+    with op.batch_alter_table(table) as batch_op:
+        for name in columns:
+            batch_op.drop_column(name)
+            batch_op.alter_column(f'{name}{new_suffix}', new_column_name=name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if context.is_offline_mode():
+        raise RuntimeError('Esta migração converte os valores em Python e precisa rodar online.')
+
+    failures = []
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for name, new_type in columns.items():
+                batch_op.add_column(sa.Column(f'{name}_typed', new_type, nullable=True))
+        failures += _copy_in_batches(table, columns, '', '_typed', _convert)
+        _swap_columns(table, columns, '_typed')
+    _report(failures)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if context.is_offline_mode():
+        raise RuntimeError('Esta migração converte os valores em Python e precisa rodar online.')
+
+    def to_text(value, new_type, money):
+        if value is None:
+            return None
+        return format_duration(value) if isinstance(new_type, sa.Interval) else str(value)
+
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for name in columns:
+                batch_op.add_column(sa.Column(f'{name}_text', sa.String(), nullable=True))
+        _copy_in_batches(table, columns, '', '_text', to_text, to_text=True)
+        _swap_columns(table, columns, '_text')
@@ -0,0 +1,30 @@
+"""add readings_version to users
+
+Revision ID: 4491c585564c
+Revises: d2843dfa256e
+Create Date: 2026-10-18 18:40:17.284903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4491c585564c'
+down_revision: Union[str, Sequence[str], None] = 'd2843dfa256e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('readings_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('readings_version')
@@ -0,0 +1,149 @@
+"""structured budget items
+
+Revision ID: 49abb80e8f76
+Revises: 3daa7516875a
+Create Date: 2026-10-18 11:58:14.730925
+
+Cria budget_items (produto, quantidade, preço unitário) e converte budgets.items
+de texto para JSON (JSONB no PostgreSQL). Os itens antigos são lidos em lotes:
+texto JSON vira a lista estruturada, texto livre vira um item só com descrição.
+Os totais já gravados são mantidos.
+"""
+import logging
+from decimal import Decimal
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.parsing import parse_budget_items, parse_decimal, parse_money
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49abb80e8f76'
+down_revision: Union[str, Sequence[str], None] = '3daa7516875a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+BATCH_SIZE = 1000
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+budget_items = sa.table(
+    'budget_items',
+    sa.column('budget_id', sa.Integer()),
+    sa.column('position', sa.Integer()),
+    sa.column('product', sa.String()),
+    sa.column('description', sa.String()),
+    sa.column('quantity', sa.Numeric(12, 3)),
+    sa.column('unit_price', sa.Numeric(10, 2)),
+    sa.column('line_total', sa.Numeric(12, 2)),
+)
+
+
+def _number(value, budget_id: int, field: str, parser=parse_decimal):
+    try:
+        return parser(value)
+    except ValueError:
+        logger.warning(f'budgets id={budget_id}: {field} não convertido {value!r}')
+        return None
+
+
+def _normalize(raw_items: str | None, budget_id: int) -> list[dict]:
+    items = []
+    for item in parse_budget_items(raw_items):
+        quantity = _number(item.get('quantity'), budget_id, 'quantity') or Decimal(1)
+        unit_price = _number(item.get('unit_price'), budget_id, 'unit_price', parse_money)
+        line_total = (quantity * unit_price).quantize(Decimal('0.01')) if unit_price is not None else None
+        items.append({
+            'product': item.get('product'),
+            'description': item.get('description'),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'line_total': line_total,
+        })
+    return items
+
+
+def _as_json(item: dict) -> dict:
+    return {key: str(value) if isinstance(value, Decimal) else value for key, value in item.items()}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if context.is_offline_mode():
+        raise RuntimeError('Esta migração converte os itens em Python e precisa rodar online.')
+
+    op.create_table('budget_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('budget_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('product', sa.String(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('quantity', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('line_total', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['budget_id'], ['budgets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_budget_items_id'), 'budget_items', ['id'], unique=False)
+    op.create_index(op.f('ix_budget_items_budget_id'), 'budget_items', ['budget_id'], unique=False)
+    op.create_index(op.f('ix_budget_items_product'), 'budget_items', ['product'], unique=False)
+
+    with op.batch_alter_table('budgets') as batch_op:
+        batch_op.add_column(sa.Column('items_json', JSON_TYPE, nullable=True))
+
+    bind = op.get_bind()
+    budgets = sa.table('budgets', sa.column('id'), sa.column('items', sa.String()), sa.column('items_json', JSON_TYPE))
+    update = (
+        budgets.update()
+        .where(budgets.c.id == sa.bindparam('row_id'))
+        .values(items_json=sa.bindparam('new_items'))
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(budgets.c.id, budgets.c['items']).where(budgets.c.id > last_id).order_by(budgets.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        updates, item_rows = [], []
+        for row in rows:
+            items = _normalize(row._mapping['items'], row.id)
+            updates.append({'row_id': row.id, 'new_items': [_as_json(item) for item in items]})
+            item_rows += [{'budget_id': row.id, 'position': position, **item} for position, item in enumerate(items)]
+        bind.execute(update, updates)
+        if item_rows:
+            bind.execute(budget_items.insert(), item_rows)
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('budgets') as batch_op:
+        batch_op.drop_column('items')
+        batch_op.alter_column('items_json', new_column_name='items', nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if context.is_offline_mode():
+        raise RuntimeError('Esta migração converte os itens em Python e precisa rodar online.')
+
+    with op.batch_alter_table('budgets') as batch_op:
+        batch_op.add_column(sa.Column('items_text', sa.String(), nullable=True))
+
+    # O JSON volta como texto, que é o formato que a versão anterior lia
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('UPDATE budgets SET items_text = items::text')
+    else:
+        op.execute('UPDATE budgets SET items_text = items')
+
+    with op.batch_alter_table('budgets') as batch_op:
+        batch_op.drop_column('items')
+        batch_op.alter_column('items_text', new_column_name='items')
+
+    op.drop_index(op.f('ix_budget_items_product'), table_name='budget_items')
+    op.drop_index(op.f('ix_budget_items_budget_id'), table_name='budget_items')
+    op.drop_index(op.f('ix_budget_items_id'), table_name='budget_items')
+    op.drop_table('budget_items')
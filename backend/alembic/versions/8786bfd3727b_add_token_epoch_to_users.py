@@ -0,0 +1,28 @@
+"""add token_epoch to users
+
+Revision ID: 8786bfd3727b
+Revises: d58460bf2a1c
+Create Date: 2026-10-18 10:20:41.118524
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8786bfd3727b'
+down_revision: Union[str, Sequence[str], None] = 'd58460bf2a1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_epoch', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_epoch')
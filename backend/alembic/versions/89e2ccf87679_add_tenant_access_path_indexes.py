@@ -0,0 +1,53 @@
+"""add tenant access path indexes
+
+Revision ID: 89e2ccf87679
+Revises: 8786bfd3727b
+Create Date: 2026-10-18 10:52:07.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '89e2ccf87679'
+down_revision: Union[str, Sequence[str], None] = '8786bfd3727b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# nome -> (tabela, colunas)
+INDEXES = {
+    'ix_clients_owner_id_id': ('clients', ['owner_id', 'id']),
+    'ix_pools_client_id': ('pools', ['client_id']),
+    'ix_services_pool_id_date': ('services', ['pool_id', sa.text('date DESC')]),
+    'ix_budgets_client_id_status': ('budgets', ['client_id', 'status']),
+}
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _is_postgresql():
+        # CREATE INDEX CONCURRENTLY não roda dentro de transação e não bloqueia escritas
+        with op.get_context().autocommit_block():
+            for name, (table, columns) in INDEXES.items():
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            for name, (table, _) in INDEXES.items():
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, (table, _) in INDEXES.items():
+            op.drop_index(name, table_name=table)
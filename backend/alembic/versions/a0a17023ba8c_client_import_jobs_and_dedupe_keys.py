@@ -0,0 +1,111 @@
+"""client import jobs and dedupe keys
+
+Revision ID: a0a17023ba8c
+Revises: 49abb80e8f76
+Create Date: 2026-10-18 12:41:07.318842
+
+Cria import_jobs (importação de clientes por planilha) e as colunas
+clients.cpf_cnpj_digits / clients.phone_digits, só com dígitos, indexadas com
+owner_id para a deduplicação. As chaves dos clientes existentes são calculadas
+em Python (app/normalize.py), em lotes.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.normalize import document_key, phone_key
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a0a17023ba8c'
+down_revision: Union[str, Sequence[str], None] = '49abb80e8f76'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 2000
+
+INDEXES = {
+    'ix_clients_owner_id_cpf_cnpj_digits': ('clients', ['owner_id', 'cpf_cnpj_digits']),
+    'ix_clients_owner_id_phone_digits': ('clients', ['owner_id', 'phone_digits']),
+}
+
+
+def _backfill() -> None:
+    """Preenche as chaves por faixas de id, uma transação curta por faixa no PostgreSQL."""
+    bind = op.get_bind()
+    clients = sa.table(
+        'clients', sa.column('id'), sa.column('phone', sa.String()), sa.column('cpf_cnpj', sa.String()),
+        sa.column('phone_digits', sa.String()), sa.column('cpf_cnpj_digits', sa.String()),
+    )
+    update = (
+        clients.update()
+        .where(clients.c.id == sa.bindparam('row_id'))
+        .values(phone_digits=sa.bindparam('new_phone'), cpf_cnpj_digits=sa.bindparam('new_document'))
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(clients.c.id, clients.c.phone, clients.c.cpf_cnpj)
+            .where(clients.c.id > last_id).order_by(clients.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+        bind.execute(update, [
+            {'row_id': row.id, 'new_phone': phone_key(row.phone), 'new_document': document_key(row.cpf_cnpj)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if context.is_offline_mode():
+        raise RuntimeError('Esta migração calcula as chaves em Python e precisa rodar online.')
+
+    op.create_table('import_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('processed_rows', sa.Integer(), nullable=False),
+    sa.Column('created_count', sa.Integer(), nullable=False),
+    sa.Column('duplicate_count', sa.Integer(), nullable=False),
+    sa.Column('error_count', sa.Integer(), nullable=False),
+    sa.Column('errors', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=False),
+    sa.Column('detail', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_import_jobs_id'), 'import_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_import_jobs_owner_id'), 'import_jobs', ['owner_id'], unique=False)
+
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.add_column(sa.Column('cpf_cnpj_digits', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('phone_digits', sa.String(), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Fora de transação: cada lote é confirmado sozinho e os índices não bloqueiam escritas
+        with op.get_context().autocommit_block():
+            _backfill()
+            for name, (table, columns) in INDEXES.items():
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        _backfill()
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.drop_column('phone_digits')
+        batch_op.drop_column('cpf_cnpj_digits')
+    op.drop_index(op.f('ix_import_jobs_owner_id'), table_name='import_jobs')
+    op.drop_index(op.f('ix_import_jobs_id'), table_name='import_jobs')
+    op.drop_table('import_jobs')
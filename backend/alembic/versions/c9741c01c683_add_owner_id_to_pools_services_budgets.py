@@ -0,0 +1,89 @@
+"""add owner_id to pools, services and budgets
+
+Revision ID: c9741c01c683
+Revises: 89e2ccf87679
+Create Date: 2026-10-18 11:04:36.551872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9741c01c683'
+down_revision: Union[str, Sequence[str], None] = '89e2ccf87679'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+# tabela -> (tabela pai, coluna que aponta para o pai); pools antes de services
+BACKFILL = {
+    'pools': ('clients', 'client_id'),
+    'budgets': ('clients', 'client_id'),
+    'services': ('pools', 'pool_id'),
+}
+
+INDEXES = {
+    'ix_pools_owner_id_id': ('pools', ['owner_id', 'id']),
+    'ix_services_owner_id_date': ('services', ['owner_id', sa.text('date DESC')]),
+    'ix_budgets_owner_id_id': ('budgets', ['owner_id', 'id']),
+}
+
+
+def _backfill(table: str, parent: str, parent_column: str) -> None:
+    """Copia owner_id do pai em faixas de id, uma transação curta por faixa."""
+    statement = (
+        f'UPDATE {table} SET owner_id = '
+        f'(SELECT {parent}.owner_id FROM {parent} WHERE {parent}.id = {table}.{parent_column})'
+    )
+    if op.get_context().as_sql:
+        # Modo offline (--sql): sem acesso ao banco para descobrir as faixas
+        op.execute(statement)
+        return
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+    for start in range(0, max_id + 1, BATCH_SIZE):
+        bind.execute(
+            sa.text(f'{statement} WHERE {table}.id >= :start AND {table}.id < :end'),
+            {'start': start, 'end': start + BATCH_SIZE},
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('pools') as batch_op:
+        batch_op.add_column(sa.Column('owner_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_pools_owner_id_users', 'users', ['owner_id'], ['id'])
+    with op.batch_alter_table('services') as batch_op:
+        batch_op.add_column(sa.Column('owner_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_services_owner_id_users', 'users', ['owner_id'], ['id'])
+    with op.batch_alter_table('budgets') as batch_op:
+        batch_op.add_column(sa.Column('owner_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_budgets_owner_id_users', 'users', ['owner_id'], ['id'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Fora de transação: cada lote do backfill é confirmado sozinho e os
+        # índices são criados sem bloquear escritas.
+        with op.get_context().autocommit_block():
+            for table, (parent, parent_column) in BACKFILL.items():
+                _backfill(table, parent, parent_column)
+            for name, (table, columns) in INDEXES.items():
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for table, (parent, parent_column) in BACKFILL.items():
+            _backfill(table, parent, parent_column)
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table in ('budgets', 'services', 'pools'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_owner_id_users', type_='foreignkey')
+            batch_op.drop_column('owner_id')
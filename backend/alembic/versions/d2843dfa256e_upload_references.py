@@ -0,0 +1,41 @@
+"""upload references
+
+Revision ID: d2843dfa256e
+Revises: fc5d6509c824
+Create Date: 2026-10-18 18:02:41.563210
+
+Cria upload_references: as referências de cada conteúdo por dono, para que
+DELETE /upload/{filename} só tire as referências de quem enviou. Os registros de
+stored_files anteriores (envios anônimos) ficam sem dono e não são apagados pela API.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2843dfa256e'
+down_revision: Union[str, Sequence[str], None] = 'fc5d6509c824'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('upload_references',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['sha256'], ['stored_files.sha256'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'sha256')
+    )
+    op.create_index(op.f('ix_upload_references_sha256'), 'upload_references', ['sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_upload_references_sha256'), table_name='upload_references')
+    op.drop_table('upload_references')
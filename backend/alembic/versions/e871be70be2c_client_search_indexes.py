@@ -0,0 +1,107 @@
+"""client search indexes
+
+Revision ID: e871be70be2c
+Revises: 2154e62f1cde
+Create Date: 2026-10-18 14:02:37.561204
+
+Cria clients.search_text (nome e e-mail normalizados, app/normalize.search_key)
+para /clientes/busca. No PostgreSQL habilita pg_trgm e cria índices GIN trigram
+em search_text, phone_digits e cpf_cnpj_digits; no SQLite cria a tabela FTS5
+clients_fts (tokenizador trigram) e os triggers que a mantêm.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.normalize import search_key
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e871be70be2c'
+down_revision: Union[str, Sequence[str], None] = '2154e62f1cde'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 2000
+
+TRIGRAM_INDEXES = {
+    'ix_clients_search_text_trgm': 'search_text',
+    'ix_clients_phone_digits_trgm': 'phone_digits',
+    'ix_clients_cpf_cnpj_digits_trgm': 'cpf_cnpj_digits',
+}
+
+FTS_COLUMNS = 'search_text, phone_digits, cpf_cnpj_digits'
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE clients_fts USING fts5({FTS_COLUMNS}, content='clients', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER clients_fts_insert AFTER INSERT ON clients BEGIN "
+    f"INSERT INTO clients_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, new.search_text, new.phone_digits, new.cpf_cnpj_digits); END",
+    f"CREATE TRIGGER clients_fts_delete AFTER DELETE ON clients BEGIN "
+    f"INSERT INTO clients_fts(clients_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, old.search_text, old.phone_digits, old.cpf_cnpj_digits); END",
+    f"CREATE TRIGGER clients_fts_update AFTER UPDATE ON clients BEGIN "
+    f"INSERT INTO clients_fts(clients_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, old.search_text, old.phone_digits, old.cpf_cnpj_digits); "
+    f"INSERT INTO clients_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, new.search_text, new.phone_digits, new.cpf_cnpj_digits); END",
+    "INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')",
+]
+
+
+def _backfill() -> None:
+    """Preenche search_text por faixas de id, uma transação curta por faixa no PostgreSQL."""
+    bind = op.get_bind()
+    clients = sa.table(
+        'clients', sa.column('id'), sa.column('name', sa.String()), sa.column('email', sa.String()),
+        sa.column('search_text', sa.String()),
+    )
+    update = (
+        clients.update()
+        .where(clients.c.id == sa.bindparam('row_id'))
+        .values(search_text=sa.bindparam('new_search_text'))
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(clients.c.id, clients.c.name, clients.c.email)
+            .where(clients.c.id > last_id).order_by(clients.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+        bind.execute(update, [{'row_id': row.id, 'new_search_text': search_key(row.name, row.email)} for row in rows])
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if context.is_offline_mode():
+        raise RuntimeError('Esta migração calcula search_text em Python e precisa rodar online.')
+
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.String(), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Fora de transação: cada lote é confirmado sozinho e os índices não bloqueiam escritas
+        with op.get_context().autocommit_block():
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            _backfill()
+            for name, column in TRIGRAM_INDEXES.items():
+                op.create_index(
+                    name, 'clients', [column], unique=False, postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True,
+                )
+    else:
+        _backfill()
+        if op.get_bind().dialect.name == 'sqlite':
+            for statement in SQLITE_FTS:
+                op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for name in TRIGRAM_INDEXES:
+            op.drop_index(name, table_name='clients')
+    elif op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('clients_fts_insert', 'clients_fts_delete', 'clients_fts_update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS clients_fts')
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.drop_column('search_text')
@@ -0,0 +1,39 @@
+"""stored files
+
+Revision ID: fc5d6509c824
+Revises: e871be70be2c
+Create Date: 2026-10-18 14:48:12.907315
+
+Cria stored_files: um registro por conteúdo enviado em /upload (nome do arquivo
+= SHA-256), com a contagem de referências. Os arquivos antigos, com nome uuid,
+continuam servidos como estão e não entram na contagem.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc5d6509c824'
+down_revision: Union[str, Sequence[str], None] = 'e871be70be2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stored_files',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('extension', sa.String(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stored_files')
@@ -1,20 +1,113 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
 from jose import jwt, JWTError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session # Importar Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached # Importar Session
 
+from app.cache import TTLCache
 from app.config import settings
 from app.models import User as DBUser # Importar modelo de usuário
-from app.database import get_db # Importar a função get_db
+from app.database import get_async_db, get_db # Importar a função get_db
 
 # Constantes para JWT
 ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token") # Define o esquema OAuth2
 
+# Cache por worker dos usuários autenticados, indexado pelo `sub` do token.
+# Guarda apenas os valores das colunas; a cada requisição o usuário é reanexado
+# à sessão com merge(load=False), sem ida ao banco.
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+_PRINCIPAL_COLUMNS = ("id", "email", "username", "hashed_password", "is_superuser", "token_epoch")
+
+# Época atual dos tokens de cada usuário (uid -> token_epoch), usada no modo stateless
+token_epoch_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Identidade leve do usuário autenticado, suficiente para filtros por dono."""
+    id: int
+    username: str
+    is_superuser: bool = False
+
+    @classmethod
+    def from_user(cls, user: DBUser) -> "Principal":
+        return cls(id=user.id, username=user.username, is_superuser=bool(user.is_superuser))
+
+
+def invalidate_principal(*usernames: str, user_id: int | None = None):
+    """Remove usuários do cache; chamar sempre que um usuário for alterado ou removido."""
+    principal_cache.invalidate(*usernames)
+    if user_id is not None:
+        token_epoch_cache.invalidate(user_id)
+
+def revoke_user_tokens(user: DBUser):
+    """Invalida todos os tokens já emitidos para o usuário (efetivado no commit do chamador)."""
+    user.token_epoch = (user.token_epoch or 0) + 1
+
+def _cached_user(username: str):
+    snapshot = principal_cache.get(username)
+    if snapshot is None:
+        return None
+    cached_user = DBUser(**snapshot)
+    make_transient_to_detached(cached_user)
+    return cached_user
+
+def _remember_user(user):
+    if user is not None:
+        principal_cache.set(user.username, {column: getattr(user, column) for column in _PRINCIPAL_COLUMNS})
+    return user
+
+def _remember_epoch(user_id: int, epoch: int | None) -> int | None:
+    if epoch is not None:
+        token_epoch_cache.set(user_id, epoch)
+    return epoch
+
+def _load_user(db: Session, username: str):
+    cached_user = _cached_user(username)
+    if cached_user is not None:
+        return db.merge(cached_user, load=False)
+    return _remember_user(db.query(DBUser).filter(DBUser.username == username).first())
+
+def _current_token_epoch(db: Session, user_id: int) -> int | None:
+    epoch = token_epoch_cache.get(user_id)
+    if epoch is None:
+        epoch = _remember_epoch(user_id, db.query(DBUser.token_epoch).filter(DBUser.id == user_id).scalar())
+    return epoch
+
+# Versões para as rotas async (AsyncSession de get_async_db), com os mesmos caches.
+# Só o Principal é devolvido: o usuário em cache não precisa ser reanexado à sessão.
+async def _load_user_async(db: AsyncSession, username: str):
+    cached_user = _cached_user(username)
+    if cached_user is not None:
+        return cached_user
+    return _remember_user(await db.scalar(select(DBUser).where(DBUser.username == username)))
+
+async def _current_token_epoch_async(db: AsyncSession, user_id: int) -> int | None:
+    epoch = token_epoch_cache.get(user_id)
+    if epoch is None:
+        epoch = _remember_epoch(user_id, await db.scalar(select(DBUser.token_epoch).where(DBUser.id == user_id)))
+    return epoch
+
+def build_token_claims(user: DBUser) -> dict:
+    """Claims do token de acesso; no modo stateless inclui uid, superusuário e época."""
+    claims = {"sub": user.username}
+    if settings.STATELESS_TOKENS:
+        claims.update({"uid": user.id, "su": bool(user.is_superuser), "ep": user.token_epoch or 0})
+    return claims
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -25,39 +118,74 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str):
+def _credentials_exception(detail: str = "Token de autenticação inválido"):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def decode_token_payload(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token de autenticação inválido",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token de autenticação inválido",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def decode_access_token(token: str):
+    return decode_token_payload(token)["sub"]
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     username = decode_access_token(token)
-    user = db.query(DBUser).filter(DBUser.username == username).first()
+    user = _load_user(db, username)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuário não encontrado",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception("Usuário não encontrado")
     return user
 
-def get_current_active_superuser(current_user: DBUser = Depends(get_current_user)):
+def _principal_from_user(user) -> Principal:
+    if user is None:
+        raise _credentials_exception("Usuário não encontrado")
+    return Principal.from_user(user)
+
+def _stateless_principal(payload: dict, current_epoch: int | None) -> Principal:
+    if current_epoch is None:
+        raise _credentials_exception("Usuário não encontrado")
+    if payload.get("ep", 0) != current_epoch:
+        raise _credentials_exception("Token revogado")
+    return Principal(id=payload["uid"], username=payload["sub"], is_superuser=bool(payload.get("su")))
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """
+    Resolve o usuário autenticado sem carregar a linha ORM quando o token é stateless.
+    Tokens antigos (apenas `sub`) continuam aceitos e caem na busca por username.
+    Para rotas síncronas; as async usam get_current_principal_async.
+    """
+    payload = decode_token_payload(token)
+    if payload.get("uid") is None:
+        return _principal_from_user(_load_user(db, payload["sub"]))
+    return _stateless_principal(payload, _current_token_epoch(db, payload["uid"]))
+
+async def get_current_principal_async(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """Como get_current_principal, na AsyncSession da rota: não ocupa o pool síncrono nem uma thread."""
+    payload = decode_token_payload(token)
+    if payload.get("uid") is None:
+        return _principal_from_user(await _load_user_async(db, payload["sub"]))
+    return _stateless_principal(payload, await _current_token_epoch_async(db, payload["uid"]))
+
+def _require_superuser(current_user: Principal) -> Principal:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="O usuário não tem privilégios de superusuário",
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def get_current_active_superuser(current_user: Principal = Depends(get_current_principal)):
+    return _require_superuser(current_user)
+
+async def get_current_active_superuser_async(current_user: Principal = Depends(get_current_principal_async)):
+    return _require_superuser(current_user)
@@ -0,0 +1,79 @@
+"""
+Criação em lote para os endpoints /bulk: cada item é validado separadamente, as
+linhas válidas são gravadas em blocos de BULK_CHUNK_SIZE com um único
+INSERT ... RETURNING por bloco, e os itens recusados voltam em `errors` sem
+derrubar o restante do lote.
+
+O INSERT em lote não passa pelos hooks de flush de app/models.py: quem chama já
+entrega owner_id preenchido (a posse dos pais é conferida numa consulta só) e os
+agregados do dashboard são somados aqui com record_inserted.
+"""
+import logging
+from typing import Any
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import record_inserted
+from app.schemas import BulkCreated, BulkError, BulkResult
+
+logger = logging.getLogger("app")
+
+
+def validate_items(items: list[Any], schema: type[BaseModel]) -> tuple[list[tuple[int, BaseModel]], list[BulkError]]:
+    """Separa os itens válidos (com a posição no lote) dos recusados pela validação."""
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Lote acima do limite de {settings.BULK_MAX_ITEMS} itens")
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item)))
+        except ValidationError as exc:
+            errors.append(BulkError(index=index, detail=exc.errors(include_url=False, include_context=False)))
+    return valid, errors
+
+
+async def insert_rows(db: AsyncSession, model, response_schema: type[BaseModel], rows: list[tuple[int, dict]]):
+    """
+    Grava `rows` ((posição, valores)) em blocos, cada um num savepoint. Se o banco
+    recusar um bloco, ele é regravado linha a linha para apontar só os itens com problema.
+    """
+    statement = insert(model).returning(model, sort_by_parameter_order=True)
+    chunk_size = max(settings.BULK_CHUNK_SIZE, 1)
+    created, errors = [], []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            async with db.begin_nested():
+                result = await db.execute(statement, [values for _, values in chunk])
+                objects = result.scalars().all()
+        except DBAPIError:
+            logger.warning(f"Bloco de {len(chunk)} {model.__tablename__} recusado pelo banco; gravando item a item")
+            objects = []
+            for index, values in chunk:
+                try:
+                    async with db.begin_nested():
+                        objects.append((await db.execute(statement, [values])).scalars().one())
+                except DBAPIError as exc:
+                    logger.warning(f"{model.__tablename__} item {index} recusado: {exc.orig}")
+                    errors.append(BulkError(index=index, detail="Não foi possível gravar o item"))
+                    objects.append(None)
+        await db.run_sync(record_inserted, [obj for obj in objects if obj is not None])
+        created += [
+            BulkCreated(index=index, item=response_schema.model_validate(obj))
+            for (index, _), obj in zip(chunk, objects) if obj is not None
+        ]
+    return created, errors
+
+
+async def bulk_create(db: AsyncSession, model, response_schema: type[BaseModel], rows: list[tuple[int, dict]], errors: list[BulkError]) -> BulkResult:
+    """Grava as linhas, faz um único commit e junta os erros de validação e de gravação."""
+    created, insert_errors = await insert_rows(db, model, response_schema, rows)
+    if created:
+        await db.commit()
+    errors = sorted(errors + insert_errors, key=lambda error: error.index)
+    return BulkResult(created=created, errors=errors)
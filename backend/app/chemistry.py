@@ -0,0 +1,214 @@
+"""
+Tendências da química da água (pH, cloro, alcalinidade) por piscina.
+
+As leituras de um tenant (ou de uma piscina) vêm numa única consulta e viram
+colunas NumPy ordenadas por (piscina, data). Todas as métricas são calculadas
+para todas as piscinas de uma vez, sem laço por piscina:
+
+- média móvel das últimas ROLLING_WINDOW visitas (somas acumuladas por grupo);
+- inclinação (mínimos quadrados) das últimas SLOPE_WINDOW leituras, por semana;
+- sequência atual de leituras fora da faixa ideal.
+
+Os resultados ficam em cache por worker (app.cache.TTLCache), com a chave incluindo
+users.readings_version: as rotas de serviços chamam invalidate_pool_trends, que
+incrementa a versão no banco, e todos os workers deixam de usar o resultado antigo
+na requisição seguinte, ao custo de uma leitura por chave primária.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.config import settings
+from app.models import Service, User
+
+PARAMETERS = ("ph", "chlorine", "alkalinity")
+LABELS = {"ph": "pH", "chlorine": "cloro", "alkalinity": "alcalinidade"}
+IDEAL_RANGES = {"ph": (7.2, 7.6), "chlorine": (1.0, 3.0), "alkalinity": (80.0, 120.0)} # cloro e alcalinidade em ppm
+ROLLING_WINDOW = 4 # visitas na média móvel
+SLOPE_WINDOW = 8 # leituras mais recentes usadas na inclinação
+ATTENTION_STREAK = 2 # leituras seguidas fora da faixa para pedir atenção
+PROJECTION_DAYS = 14 # horizonte para avisar que a tendência vai sair da faixa
+
+trend_cache = TTLCache(maxsize=settings.CHEMISTRY_CACHE_MAX_SIZE, ttl=settings.CHEMISTRY_CACHE_TTL_SECONDS)
+
+
+@dataclass
+class Readings:
+    pool_ids: np.ndarray # int64, ordenado
+    days: np.ndarray # float64, dias desde a época
+    dates: list[datetime]
+    values: dict[str, np.ndarray] # float64, NaN quando a visita não mediu o parâmetro
+
+
+async def load_readings(db: AsyncSession, owner_id: int, pool_ids: list[int] | None = None) -> Readings:
+    since = datetime.now(timezone.utc) - timedelta(days=settings.CHEMISTRY_HISTORY_DAYS)
+    statement = (
+        select(Service.pool_id, Service.date, Service.ph, Service.chlorine, Service.alkalinity)
+        .filter(
+            Service.owner_id == owner_id,
+            Service.date >= since,
+            or_(Service.ph.isnot(None), Service.chlorine.isnot(None), Service.alkalinity.isnot(None)),
+        )
+        .order_by(Service.pool_id, Service.date, Service.id)
+    )
+    if pool_ids:
+        statement = statement.filter(Service.pool_id.in_(pool_ids))
+    rows = (await db.execute(statement)).all()
+    columns = list(zip(*rows)) if rows else [()] * 5
+    return Readings(
+        pool_ids=np.array(columns[0], dtype=np.int64),
+        days=np.array([date.timestamp() / 86400 for date in columns[1]], dtype=np.float64),
+        dates=list(columns[1]),
+        values={
+            name: np.array([np.nan if value is None else float(value) for value in column], dtype=np.float64)
+            for name, column in zip(PARAMETERS, columns[2:])
+        },
+    )
+
+
+def latest_values(readings: Readings) -> tuple[list[int], dict[str, np.ndarray], list[datetime]]:
+    """Por piscina: ids, última leitura de cada parâmetro (NaN se nunca medido) e data da última visita."""
+    if len(readings.pool_ids) == 0:
+        return [], {name: np.empty(0) for name in PARAMETERS}, []
+    starts = np.flatnonzero(np.r_[True, readings.pool_ids[1:] != readings.pool_ids[:-1]])
+    ends = np.r_[starts[1:], len(readings.pool_ids)] - 1
+    index = np.arange(len(readings.pool_ids))
+    values = {}
+    for name in PARAMETERS:
+        column = readings.values[name]
+        last_index = np.maximum.reduceat(np.where(np.isnan(column), -1, index), starts)
+        values[name] = np.where(last_index >= 0, column[np.maximum(last_index, 0)], np.nan)
+    return readings.pool_ids[starts].tolist(), values, [readings.dates[end] for end in ends.tolist()]
+
+
+def _round(value, digits: int = 2):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def analyze(readings: Readings, with_series: bool = False) -> dict[int, dict]:
+    """Métricas por piscina: {pool_id: {"readings", "parameters", "reasons"[, "series"]}}."""
+    n = len(readings.pool_ids)
+    if n == 0:
+        return {}
+    is_start = np.r_[True, readings.pool_ids[1:] != readings.pool_ids[:-1]]
+    starts = np.flatnonzero(is_start)
+    group = np.cumsum(is_start) - 1 # índice da piscina de cada linha
+    groups = len(starts)
+    sizes = np.diff(np.r_[starts, n])
+    index = np.arange(n)
+    rank_from_end = (starts + sizes - 1)[group] - index
+    x = readings.days - readings.days[(starts + sizes - 1)[group]] # dias até a última visita (<= 0)
+
+    def group_sum(weights):
+        return np.bincount(group, weights=weights, minlength=groups)
+
+    metrics, rolling = {}, {}
+    for name in PARAMETERS:
+        values = readings.values[name]
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        low, high = IDEAL_RANGES[name]
+
+        # Média móvel: somas acumuladas, com a janela cortada no início de cada piscina
+        window_start = np.maximum(index - ROLLING_WINDOW + 1, starts[group])
+        cumulative, counts = np.r_[0.0, np.cumsum(filled)], np.r_[0, np.cumsum(valid)]
+        window_sum = cumulative[index + 1] - cumulative[window_start]
+        window_count = counts[index + 1] - counts[window_start]
+        rolling[name] = np.divide(window_sum, window_count, out=np.full(n, np.nan), where=window_count > 0)
+
+        # Inclinação por mínimos quadrados sobre as últimas SLOPE_WINDOW linhas de cada piscina
+        used = valid & (rank_from_end < SLOPE_WINDOW)
+        count, sum_x, sum_y = group_sum(used), group_sum(np.where(used, x, 0.0)), group_sum(np.where(used, filled, 0.0))
+        sum_xx, sum_xy = group_sum(np.where(used, x * x, 0.0)), group_sum(np.where(used, x * filled, 0.0))
+        denominator = count * sum_xx - sum_x * sum_x
+        slope = np.divide(count * sum_xy - sum_x * sum_y, denominator, out=np.full(groups, np.nan),
+                          where=(count >= 2) & (denominator > 1e-9))
+
+        # Última leitura e sequência atual fora da faixa (linhas depois da última leitura boa)
+        last_index = np.maximum.reduceat(np.where(valid, index, -1), starts)
+        last = np.where(last_index >= 0, values[np.maximum(last_index, 0)], np.nan)
+        out_of_range = valid & ((values < low) | (values > high))
+        last_ok = np.maximum.reduceat(np.where(valid & ~out_of_range, index, -1), starts)
+        streak = group_sum(out_of_range & (index > last_ok[group])).astype(int)
+        last_mean = rolling[name][starts + sizes - 1]
+        metrics[name] = (last, last_mean, slope, streak)
+
+    results = {}
+    for position, pool_id in enumerate(readings.pool_ids[starts].tolist()):
+        parameters, reasons = {}, []
+        for name in PARAMETERS:
+            last, last_mean, slope, streak = (array[position] for array in metrics[name])
+            low, high = IDEAL_RANGES[name]
+            status = "sem_leitura" if np.isnan(last) else "baixo" if last < low else "alto" if last > high else "ok"
+            parameters[name] = {
+                "last": _round(last),
+                "rolling_mean": _round(last_mean),
+                "slope_per_week": _round(slope * 7, 3),
+                "out_of_range_streak": int(streak),
+                "status": status,
+            }
+            if streak >= ATTENTION_STREAK:
+                reasons.append(f"{LABELS[name]} {status} nas últimas {streak} visitas")
+            elif status in ("baixo", "alto"):
+                reasons.append(f"{LABELS[name]} {status} na última visita")
+            elif status == "ok" and not np.isnan(slope):
+                projected = last + slope * PROJECTION_DAYS
+                if projected < low or projected > high:
+                    direction = "caindo" if slope < 0 else "subindo"
+                    reasons.append(f"{LABELS[name]} {direction} {abs(slope * 7):.2f}/semana, deve sair da faixa em {PROJECTION_DAYS} dias")
+        result = {"pool_id": pool_id, "readings": int(sizes[position]), "parameters": parameters, "reasons": reasons}
+        if with_series:
+            rows = range(starts[position], starts[position] + sizes[position])
+            result["series"] = [
+                {
+                    "date": readings.dates[row],
+                    **{name: _round(readings.values[name][row]) for name in PARAMETERS},
+                    **{f"{name}_mean": _round(rolling[name][row]) for name in PARAMETERS},
+                }
+                for row in rows
+            ]
+        results[pool_id] = result
+    return results
+
+
+async def _readings_version(db: AsyncSession, owner_id: int) -> int:
+    return (await db.execute(select(User.readings_version).filter(User.id == owner_id))).scalar() or 0
+
+
+async def pool_trends(db: AsyncSession, owner_id: int, pool_id: int) -> dict:
+    key = ("pool", pool_id, await _readings_version(db, owner_id))
+    cached = trend_cache.get(key)
+    if cached is not None:
+        return cached
+    readings = await load_readings(db, owner_id, [pool_id])
+    result = (await run_in_threadpool(analyze, readings, True)).get(pool_id)
+    if result is None:
+        result = {"pool_id": pool_id, "readings": 0, "parameters": {}, "reasons": [], "series": []}
+    trend_cache.set(key, result)
+    return result
+
+
+async def pools_needing_attention(db: AsyncSession, owner_id: int) -> list[dict]:
+    key = ("attention", owner_id, await _readings_version(db, owner_id))
+    cached = trend_cache.get(key)
+    if cached is not None:
+        return cached
+    readings = await load_readings(db, owner_id)
+    results = await run_in_threadpool(analyze, readings)
+    attention = [result for result in results.values() if result["reasons"]]
+    trend_cache.set(key, attention)
+    return attention
+
+
+async def invalidate_pool_trends(db: AsyncSession, owner_id: int) -> None:
+    """
+    Chamar depois do commit que grava, altera ou exclui serviços (ou piscinas) do tenant.
+    Depois, não antes: quem ler a versão nova já encontra os dados novos.
+    """
+    await db.execute(update(User).filter(User.id == owner_id).values(readings_version=User.readings_version + 1))
+    await db.commit()
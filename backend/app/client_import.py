@@ -0,0 +1,252 @@
+"""
+Importação de clientes a partir de planilhas (CSV ou XLSX).
+
+A rota grava o arquivo enviado num temporário e cria um ImportJob; o processamento
+roda em segundo plano, lendo o arquivo linha a linha (memória constante) e gravando
+em lotes de IMPORT_BATCH_SIZE, um commit por lote, com o progresso salvo no job.
+Telefone e CPF/CNPJ são normalizados (app/normalize.py) e cada linha é comparada
+com os clientes do tenant pelos índices (owner_id, cpf_cnpj_digits) e
+(owner_id, phone_digits): o CPF/CNPJ decide quando existe, senão o telefone.
+"""
+import codecs
+import csv
+import importlib.util
+import itertools
+import logging
+import os
+import re
+import tempfile
+import unicodedata
+from datetime import datetime, timezone
+from typing import Iterator
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.bulk import insert_rows
+from app.config import settings
+from app.database import open_background_session
+from app.models import Client as DBClient, ImportJob as DBImportJob
+from app.normalize import document_key, normalize_cpf_cnpj, normalize_phone, phone_key
+from app.schemas import Client, ClientCreate
+
+logger = logging.getLogger("app")
+
+_READ_BLOCK_SIZE = 64 * 1024
+
+# Cabeçalhos aceitos (sem acento, minúsculos, separados por "_") -> campo de ClientCreate
+HEADER_ALIASES = {
+    "name": "name", "nome": "name", "cliente": "name", "nome_completo": "name", "razao_social": "name",
+    "phone": "phone", "telefone": "phone", "celular": "phone", "fone": "phone", "whatsapp": "phone",
+    "email": "email", "e_mail": "email",
+    "address": "address", "endereco": "address",
+    "cpf_cnpj": "cpf_cnpj", "cpf": "cpf_cnpj", "cnpj": "cpf_cnpj", "documento": "cpf_cnpj",
+}
+
+
+class ImportFileError(Exception):
+    """Arquivo que não dá para ler como planilha de clientes."""
+
+
+def file_kind(upload: UploadFile) -> str:
+    name = (upload.filename or "").lower()
+    if name.endswith(".csv") or upload.content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if name.endswith(".xlsx"):
+        if importlib.util.find_spec("openpyxl") is None:
+            raise HTTPException(status_code=415, detail="Importação de XLSX indisponível neste servidor (openpyxl não instalado)")
+        return "xlsx"
+    raise HTTPException(status_code=415, detail="Formato não suportado; envie um arquivo CSV ou XLSX")
+
+
+async def save_upload(upload: UploadFile, kind: str) -> str:
+    """Copia o upload em blocos para um temporário, que sobrevive ao fim da requisição."""
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=f".{kind}")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await upload.read(_READ_BLOCK_SIZE):
+                size += len(chunk)
+                if size > settings.IMPORT_MAX_FILE_SIZE:
+                    raise HTTPException(status_code=413, detail="Arquivo acima do tamanho máximo para importação")
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def _header_key(value) -> str:
+    text = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def _map_header(header) -> list[str | None]:
+    fields = [HEADER_ALIASES.get(_header_key(value)) for value in header]
+    if "name" not in fields:
+        raise ImportFileError("Cabeçalho sem a coluna de nome (ex.: \"nome\")")
+    return fields
+
+
+def _rows_with_header(rows: Iterator) -> Iterator[tuple[int, dict]]:
+    """(número da linha, {campo: valor}) para cada linha não vazia depois do cabeçalho."""
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError("Arquivo vazio")
+    fields = _map_header(header)
+    for row_number, row in enumerate(rows, start=2):
+        values = {field: value for field, value in zip(fields, row) if field and value not in (None, "")}
+        if values:
+            yield row_number, values
+
+
+def _detect_encoding(sample: bytes) -> str:
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # Um caractere cortado no fim da amostra não conta
+        if exc.start < len(sample) - 3:
+            return "cp1252" # Planilhas exportadas pelo Excel em português
+    return "utf-8-sig"
+
+
+def read_csv_rows(path: str) -> Iterator[tuple[int, dict]]:
+    with open(path, "rb") as f:
+        sample = f.read(_READ_BLOCK_SIZE)
+    encoding = _detect_encoding(sample)
+    text_sample = codecs.decode(sample, encoding, errors="ignore")
+    try:
+        dialect = csv.Sniffer().sniff(text_sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    with open(path, newline="", encoding=encoding, errors="replace") as f:
+        yield from _rows_with_header(csv.reader(f, dialect))
+
+
+def read_xlsx_rows(path: str) -> Iterator[tuple[int, dict]]:
+    from openpyxl import load_workbook
+
+    try:
+        # read_only: as linhas são lidas do XML sob demanda, sem carregar a planilha
+        workbook = load_workbook(path, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFileError(f"XLSX inválido: {exc}")
+    try:
+        yield from _rows_with_header(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+READERS = {"csv": read_csv_rows, "xlsx": read_xlsx_rows}
+
+
+def _clean(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or None
+
+
+def normalize_row(values: dict) -> ClientCreate:
+    """Campos da planilha -> ClientCreate; ValueError/ValidationError se a linha for inválida."""
+    data = {field: _clean(value) for field, value in values.items()}
+    if "phone" in values:
+        data["phone"] = normalize_phone(values["phone"])
+    if "cpf_cnpj" in values:
+        data["cpf_cnpj"] = normalize_cpf_cnpj(values["cpf_cnpj"])
+    if data.get("email"):
+        data["email"] = data["email"].lower()
+    if not data.get("name"):
+        raise ValueError("Nome obrigatório")
+    return ClientCreate.model_validate(data)
+
+
+def _error_detail(exc: Exception):
+    if isinstance(exc, ValidationError):
+        return exc.errors(include_url=False, include_context=False, include_input=False)
+    return str(exc)
+
+
+def _add_errors(job: DBImportJob, errors: list[dict]) -> None:
+    job.error_count += len(errors)
+    room = settings.IMPORT_MAX_ERRORS - len(job.errors)
+    if room > 0 and errors:
+        job.errors = job.errors + errors[:room] # Lista nova: a coluna JSON não rastreia mutações
+
+
+async def import_batch(db: AsyncSession, job: DBImportJob, batch: list[tuple[int, dict]]) -> None:
+    """Normaliza, deduplica (no banco e dentro do lote) e grava um lote de linhas."""
+    errors, candidates = [], []
+    for row_number, values in batch:
+        try:
+            client = normalize_row(values)
+        except (ValueError, ValidationError) as exc:
+            errors.append({"row": row_number, "detail": _error_detail(exc)})
+            continue
+        document, phone = document_key(client.cpf_cnpj), phone_key(client.phone)
+        candidates.append((row_number, client, ("cpf_cnpj", document) if document else ("phone", phone) if phone else None))
+
+    documents = {key[1] for _, _, key in candidates if key and key[0] == "cpf_cnpj"}
+    phones = {key[1] for _, _, key in candidates if key and key[0] == "phone"}
+    existing = set()
+    if documents or phones:
+        result = await db.execute(
+            select(DBClient.cpf_cnpj_digits, DBClient.phone_digits).filter(
+                DBClient.owner_id == job.owner_id,
+                or_(DBClient.cpf_cnpj_digits.in_(documents), DBClient.phone_digits.in_(phones)),
+            )
+        )
+        for cpf_cnpj_digits, phone_digits in result:
+            existing.update({("cpf_cnpj", cpf_cnpj_digits), ("phone", phone_digits)})
+
+    rows = []
+    for row_number, client, key in candidates:
+        if key in existing:
+            job.duplicate_count += 1
+            continue
+        if key:
+            existing.add(key) # Repetido mais adiante no mesmo lote
+        rows.append((row_number, {**client.model_dump(), "owner_id": job.owner_id}))
+
+    created, insert_errors = await insert_rows(db, DBClient, Client, rows)
+    errors += [{"row": error.index, "detail": error.detail} for error in insert_errors]
+    job.created_count += len(created)
+    job.processed_rows += len(batch)
+    _add_errors(job, sorted(errors, key=lambda error: error["row"]))
+
+
+async def run_import(job_id: int, path: str, kind: str) -> None:
+    """Tarefa em segundo plano: processa o arquivo inteiro e apaga o temporário."""
+    rows = READERS[kind](path)
+    try:
+        async with open_background_session() as db:
+            job = await db.get(DBImportJob, job_id)
+            job.status = "running"
+            await db.commit()
+            try:
+                while batch := await run_in_threadpool(list, itertools.islice(rows, settings.IMPORT_BATCH_SIZE)):
+                    await import_batch(db, job, batch)
+                    await db.commit()
+                job.status = "done"
+            except ImportFileError as exc:
+                await db.rollback()
+                await db.refresh(job) # Volta aos contadores do último lote confirmado
+                job.status, job.detail = "failed", str(exc)
+            except Exception:
+                logger.exception(f"Importação {job_id} interrompida")
+                await db.rollback()
+                await db.refresh(job)
+                job.status, job.detail = "failed", "Erro inesperado; as linhas já confirmadas foram mantidas"
+            job.finished_at = datetime.now(timezone.utc)
+            await db.commit()
+            logger.info(
+                f"Importação {job_id} ({job.status}): {job.processed_rows} linhas, {job.created_count} criadas, "
+                f"{job.duplicate_count} duplicadas, {job.error_count} com erro"
+            )
+    finally:
+        rows.close()
+        os.remove(path)
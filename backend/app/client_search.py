@@ -0,0 +1,75 @@
+"""
+Busca de clientes por trecho do nome, e-mail, telefone ou CPF/CNPJ (/clientes/busca).
+
+Compara o termo normalizado com as colunas normalizadas de clients: search_text
+(nome e e-mail sem acentos, app/normalize.search_key) e os dígitos de telefone e
+documento. No PostgreSQL os índices GIN pg_trgm atendem "contém" e a similaridade
+(erros de digitação); no SQLite, a tabela FTS5 clients_fts com tokenizador trigram.
+
+Ordem: começo do telefone/CPF/CNPJ, começo do nome, começo de uma palavra, o resto
+(no PostgreSQL, por similaridade).
+"""
+from sqlalchemy import case, func, literal_column, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Client as DBClient
+from app.normalize import only_digits, search_key
+
+MIN_DIGITS = 3 # Menos que isso casa com quase todo telefone
+TRIGRAM = 3 # Termos menores não geram trigramas: ficam com LIKE
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _match(dialect_name: str, term: str | None, digits: str | None):
+    conditions = []
+    if dialect_name == "postgresql":
+        if term:
+            conditions += [DBClient.search_text.contains(term, autoescape=True), DBClient.search_text.op("%")(term)]
+        if digits:
+            conditions += [DBClient.phone_digits.contains(digits), DBClient.cpf_cnpj_digits.contains(digits)]
+        return or_(*conditions)
+
+    phrases = []
+    if term and len(term) >= TRIGRAM:
+        phrases.append(f"search_text : {_fts_phrase(term)}")
+    elif term:
+        conditions.append(DBClient.search_text.contains(term, autoescape=True))
+    if digits:
+        phrases.append(f"{{phone_digits cpf_cnpj_digits}} : {_fts_phrase(digits)}")
+    if phrases:
+        fts = select(literal_column("rowid")).select_from(text("clients_fts")).where(
+            text("clients_fts MATCH :fts_query").bindparams(fts_query=" OR ".join(phrases))
+        )
+        conditions.append(DBClient.id.in_(fts))
+    return or_(*conditions)
+
+
+async def search_clients(db: AsyncSession, owner_id: int, q: str, limit: int) -> list[DBClient]:
+    term = search_key(q)
+    digits = only_digits(q)
+    digits = digits if len(digits) >= MIN_DIGITS else None
+    if not term and not digits:
+        return []
+    dialect_name = db.get_bind().dialect.name
+
+    ranks = []
+    if digits:
+        ranks.append((or_(DBClient.phone_digits.startswith(digits), DBClient.cpf_cnpj_digits.startswith(digits)), 0))
+    if term:
+        ranks += [
+            (DBClient.search_text.startswith(term, autoescape=True), 1),
+            (DBClient.search_text.contains(" " + term, autoescape=True), 2),
+        ]
+    order_by = [case(*ranks, else_=3)]
+    if dialect_name == "postgresql" and term:
+        order_by.append(func.similarity(DBClient.search_text, term).desc())
+    statement = (
+        select(DBClient)
+        .filter(DBClient.owner_id == owner_id, _match(dialect_name, term, digits))
+        .order_by(*order_by, DBClient.search_text, DBClient.id) # search_text: ordem alfabética sem acentos
+        .limit(limit)
+    )
+    return (await db.execute(statement)).scalars().all()
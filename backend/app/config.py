@@ -9,13 +9,64 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Propiscineiro"
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
+    LOG_FILE: str = "/app/logs/app.log" # Arquivo de log lido por /admin/system-logs
 
     # Database settings
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 5 # Conexões mantidas abertas por engine
+    DB_MAX_OVERFLOW: int = 10 # Conexões extras permitidas em picos (-1 = sem limite)
+    DB_POOL_TIMEOUT: float = 30.0 # Segundos esperando uma conexão livre antes de erro
+    DB_POOL_RECYCLE: int = 1800 # Recicla conexões com mais de N segundos (-1 desativa)
+    DB_POOL_PRE_PING: bool = True # Testa a conexão antes de entregá-la
+    DATABASE_REPLICA_URLS: str = "" # Réplicas de leitura, separadas por vírgula
+    REPLICA_RETRY_SECONDS: float = 30.0 # Tempo fora da rotação após uma falha de conexão
+    READ_YOUR_WRITES_SECONDS: float = 5.0 # Após escrever, o usuário lê do primário por N segundos
+    SLOW_QUERY_MS: float = 200.0 # Consultas acima disso são logadas como lentas (negativo desativa)
+    BULK_CHUNK_SIZE: int = 500 # Linhas por INSERT nos endpoints /bulk
+    BULK_MAX_ITEMS: int = 5000 # Itens aceitos por requisição nos endpoints /bulk
+    IMPORT_BATCH_SIZE: int = 500 # Linhas por transação na importação de clientes
+    IMPORT_MAX_FILE_SIZE: int = 20 * 1024 * 1024 # Tamanho máximo da planilha importada (bytes)
+    IMPORT_MAX_ERRORS: int = 1000 # Erros guardados no relatório de cada importação
+    EXPORT_BATCH_SIZE: int = 1000 # Linhas buscadas por vez do cursor nas exportações
+
+    # Tendências da química da água (app/chemistry.py), em cache por worker
+    CHEMISTRY_HISTORY_DAYS: int = 365 # Leituras mais antigas ficam fora da análise
+    CHEMISTRY_CACHE_TTL_SECONDS: float = 600.0 # Rede de segurança entre workers; 0 desativa
+    CHEMISTRY_CACHE_MAX_SIZE: int = 4096
+
+    # Armazenamento dos uploads (app/storage.py)
+    STORAGE_BACKEND: str = "local" # "local" (disco, servido em /static/uploads) ou "s3" (S3, R2, MinIO)
+    LOCAL_STORAGE_DIR: str = "backend/static/uploads"
+    LOCAL_STORAGE_URL: str = "/static/uploads"
+    S3_BUCKET: str = ""
+    S3_ENDPOINT_URL: str = "" # Vazio para a AWS; ex.: http://localhost:9000 (MinIO) ou o endpoint do R2
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str = "" # Vazio: credenciais do ambiente (variáveis AWS_*, perfil, IAM)
+    S3_SECRET_ACCESS_KEY: str = ""
+    S3_PUBLIC_URL: str = "" # Base pública (bucket público ou CDN); vazio gera URLs pré-assinadas
+    S3_PRESIGN_EXPIRES_SECONDS: int = 3600
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024 # A partir daqui o envio é multipart (mínimo do S3: 5 MB por parte)
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 8 # Partes enviadas em paralelo por arquivo
+
+    # Variantes das fotos enviadas (app/images.py)
+    IMAGE_WORKERS: int = 2 # Processos do pool de redimensionamento, por worker da API
+    IMAGE_QUALITY: int = 82 # Qualidade JPEG/WebP das variantes
+    IMAGE_FAILED_TTL_SECONDS: float = 86400.0 # Imagem que o Pillow não decodifica só volta à fila depois disso
+    IMAGE_FAILED_MAX_SIZE: int = 10000
 
     # Security settings
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30 # Token JWT expira em 30 minutos
+    STATELESS_TOKENS: bool = False # Emite tokens com uid/is_superuser para dispensar a busca do usuário
+
+    # Cache de usuários autenticados (por worker)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0 # 0 desativa o cache
+    PRINCIPAL_CACHE_MAX_SIZE: int = 1024
+
+    # Password hashing (bcrypt) settings
+    PASSWORD_HASH_MAX_WORKERS: int = 2 # Máximo de hashes bcrypt simultâneos por worker
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = 5.0 # Segundos aguardando na fila antes de responder 503
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -23,7 +74,7 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # Ensure log directory exists
-log_directory = os.path.dirname("/app/logs/app.log")
+log_directory = os.path.dirname(settings.LOG_FILE)
 os.makedirs(log_directory, exist_ok=True)
 
 # Configure logging
@@ -56,7 +107,7 @@ LOGGING_CONFIG = {
             "class": "logging.handlers.RotatingFileHandler",
             "formatter": "standard",
             "level": "INFO",
-            "filename": "/app/logs/app.log", # Log file path inside the container
+            "filename": settings.LOG_FILE, # Log file path inside the container
             "maxBytes": 10485760, # 10 MB
             "backupCount": 5
         }
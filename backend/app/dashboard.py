@@ -0,0 +1,84 @@
+"""
+Recalcula tenant_monthly_stats a partir de clients, pools, services e budgets.
+
+A tabela é mantida de forma incremental pelos hooks de app/models.py; este módulo
+serve para reparo (dados alterados por SQL direto, restaurações, bugs) e para a
+carga inicial na migração 2154e62f1cde.
+
+Uso (a partir de backend/):
+    python -m app.dashboard rebuild [--owner-id 42]
+"""
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# tabela de origem -> (coluna que define o mês, expressões na ordem de STAT_COLUMNS)
+STAT_COLUMNS = [
+    "clients_added", "pools_added", "services_count", "services_revenue",
+    "budgets_count", "budgets_total", "budgets_approved_total",
+]
+SOURCES = {
+    "clients": ("created_at", ["1", "0", "0", "0", "0", "0", "0"]),
+    "pools": ("created_at", ["0", "1", "0", "0", "0", "0", "0"]),
+    "services": ("date", ["0", "0", "1", "COALESCE(value, 0)", "0", "0", "0"]),
+    "budgets": ("date", [
+        "0", "0", "0", "0", "1", "COALESCE(total, 0)",
+        "CASE WHEN status = 'Approved' THEN COALESCE(total, 0) ELSE 0 END",
+    ]),
+}
+
+
+def _month_sql(dialect_name: str, column: str) -> str:
+    # Mesmo critério de app.models.month_of: primeiro dia do mês em UTC
+    if dialect_name == "postgresql":
+        return f"CAST(date_trunc('month', {column} AT TIME ZONE 'UTC') AS DATE)"
+    return f"date({column}, 'start of month')"
+
+
+def rebuild_stats(connection: Connection, owner_id: int | None = None) -> int:
+    """Apaga e recalcula as linhas (de um dono ou de todos); devolve quantas foram gravadas."""
+    dialect_name = connection.dialect.name
+    owner_filter = "owner_id = :owner_id" if owner_id is not None else "owner_id IS NOT NULL"
+    if dialect_name == "postgresql":
+        # Escritas concorrentes esperam o fim da reconstrução e aplicam o delta por cima,
+        # em vez de somar numa linha que será apagada
+        connection.execute(text("LOCK TABLE tenant_monthly_stats IN EXCLUSIVE MODE"))
+    delete_filter = "WHERE owner_id = :owner_id" if owner_id is not None else ""
+    connection.execute(text(f"DELETE FROM tenant_monthly_stats {delete_filter}"), {"owner_id": owner_id})
+
+    selects = [
+        f"SELECT owner_id, {_month_sql(dialect_name, month_column)} AS month, "
+        + ", ".join(f"{expression} AS {column}" for expression, column in zip(expressions, STAT_COLUMNS))
+        + f" FROM {table} WHERE {owner_filter} AND {month_column} IS NOT NULL"
+        for table, (month_column, expressions) in SOURCES.items()
+    ]
+    columns = ", ".join(STAT_COLUMNS)
+    sums = ", ".join(f"SUM({column})" for column in STAT_COLUMNS)
+    result = connection.execute(
+        text(
+            f"INSERT INTO tenant_monthly_stats (owner_id, month, {columns}) "
+            f"SELECT owner_id, month, {sums} FROM ({' UNION ALL '.join(selects)}) AS contributions "
+            "GROUP BY owner_id, month"
+        ),
+        {"owner_id": owner_id},
+    )
+    return result.rowcount
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.dashboard", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="recalcula tenant_monthly_stats a partir das tabelas de origem")
+    rebuild.add_argument("--owner-id", type=int, help="só os dados deste usuário")
+    args = parser.parse_args(argv)
+
+    from app.database import engine
+
+    with engine.begin() as connection:
+        count = rebuild_stats(connection, args.owner_id)
+    print(f"tenant_monthly_stats: {count} linha(s) recalculada(s)")
+
+
+if __name__ == "__main__":
+    main()
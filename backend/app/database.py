@@ -1,19 +1,60 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import itertools
+import logging
+import math
+import time
+
+from fastapi import Request
+from jose import jwt, JWTError
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 import os
 
+from app.cache import TTLCache
+from app.config import settings
+from app.db_metrics import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, instrument_engine
+
 # Pega a URL do banco de dados das variáveis de ambiente
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL não configurada nas variáveis de ambiente.")
 
+# URL do engine assíncrono; se ausente, é derivada de DATABASE_URL trocando o driver
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+logger = logging.getLogger("app")
+
+# Drivers assíncronos usados para cada backend suportado
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def engine_options(url: str, name: str, is_async: bool = False) -> dict:
+    """Parâmetros de pool vindos de Settings; o SQLite mantém o pool padrão do dialeto."""
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() == "sqlite":
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncAdaptedQueuePool if is_async else InstrumentedQueuePool,
+        pool_logging_name=name,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return options
+
 # Cria o motor (engine) do SQLAlchemy
 # connect_args={"check_same_thread": False} é necessário apenas para SQLite, não para PostgreSQL.
 # No entanto, em alguns cenários Docker, pode ser útil para evitar problemas de thread,
 # mas para PostgreSQL, a conexão é multi-thread por padrão. Vou remover para clareza
 # e adicionar a opção de pool para melhor performance em FastAPI.
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, "primary"))
+instrument_engine(engine, "primary", settings.DB_MAX_OVERFLOW)
 
 # Cria uma instância de SessionLocal
 # Cada instância de SessionLocal será uma sessão de banco de dados.
@@ -24,10 +65,191 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base para os modelos declarativos do SQLAlchemy
 Base = declarative_base()
 
+# Engine/sessões assíncronos são criados sob demanda, na primeira requisição que os usa,
+# para que o driver assíncrono só seja exigido quando as rotas assíncronas forem servidas.
+_async_engine = None
+_AsyncSessionLocal = None
+
+def to_async_url(url: str) -> str:
+    """Converte uma URL síncrona (psycopg2/pysqlite) para o driver assíncrono equivalente."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Sem driver assíncrono conhecido para o banco '{backend}'.")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        url = ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+        _async_engine = create_async_engine(url, **engine_options(url, "primary_async", is_async=True))
+        instrument_engine(_async_engine, "primary_async", settings.DB_MAX_OVERFLOW)
+    return _async_engine
+
+def make_async_sessionmaker(bind):
+    # expire_on_commit=False: em sessões assíncronas não há lazy load implícito
+    # depois do commit, então os objetos precisam continuar legíveis.
+    return async_sessionmaker(bind=bind, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+def get_async_sessionmaker():
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _AsyncSessionLocal = make_async_sessionmaker(get_async_engine())
+    return _AsyncSessionLocal
+
+
+class ReplicaRouter:
+    """
+    Escolhe a sessão de leitura: réplicas em round-robin, pulando as que falharam
+    recentemente, e o primário para quem escreveu há menos de READ_YOUR_WRITES_SECONDS.
+
+    _recent_writers só vale para este processo; entre workers quem carrega a marca
+    é o cliente, no cookie WRITE_MARKER_COOKIE (ver mark_write_response).
+    """
+
+    def __init__(self, primary, replicas: list, retry_seconds: float, read_your_writes_seconds: float):
+        self.primary = primary # async_sessionmaker do primário
+        self.replicas = replicas # lista de async_sessionmaker, um por réplica
+        self.retry_seconds = retry_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._unhealthy_until: dict[int, float] = {}
+        self._next = itertools.count()
+        self._recent_writers = TTLCache(maxsize=100_000, ttl=read_your_writes_seconds)
+
+    def note_write(self, subject: str) -> None:
+        self._recent_writers.set(subject, True)
+
+    def mark_unhealthy(self, index: int) -> None:
+        self._unhealthy_until[index] = time.monotonic() + self.retry_seconds
+
+    def _healthy_order(self) -> list[int]:
+        start = next(self._next)
+        now = time.monotonic()
+        order = [(start + offset) % len(self.replicas) for offset in range(len(self.replicas))]
+        return [index for index in order if self._unhealthy_until.get(index, 0) <= now]
+
+    async def open_read_session(self, subject: str | None, wrote_recently: bool = False) -> AsyncSession:
+        if not self.replicas or wrote_recently or (subject and self._recent_writers.get(subject)):
+            return self.primary()
+        for index in self._healthy_order():
+            session = self.replicas[index]()
+            try:
+                # Conecta já aqui para detectar réplica fora do ar e tentar a próxima
+                await session.connection()
+            except (DBAPIError, OSError) as exc:
+                await session.close()
+                self.mark_unhealthy(index)
+                logger.warning(f"Réplica {index} indisponível, tentando outra fonte de leitura: {exc}")
+                continue
+            return session
+        return self.primary()
+
+
+_replica_router = None
+
+def get_replica_router() -> ReplicaRouter:
+    global _replica_router
+    if _replica_router is None:
+        replicas = []
+        for index, url in enumerate(u.strip() for u in settings.DATABASE_REPLICA_URLS.split(",") if u.strip()):
+            async_url = to_async_url(url)
+            replica_engine = create_async_engine(async_url, **engine_options(async_url, f"replica_{index}", is_async=True))
+            instrument_engine(replica_engine, f"replica_{index}", settings.DB_MAX_OVERFLOW)
+            replicas.append(make_async_sessionmaker(replica_engine))
+        _replica_router = ReplicaRouter(
+            get_async_sessionmaker(),
+            replicas,
+            retry_seconds=settings.REPLICA_RETRY_SECONDS,
+            read_your_writes_seconds=settings.READ_YOUR_WRITES_SECONDS,
+        )
+    return _replica_router
+
+def request_subject(request: Request) -> str | None:
+    """
+    `sub` do token Bearer, sem validar assinatura: serve só para rotear leituras;
+    a autenticação de verdade continua em app.auth.
+    """
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
+# Cookie com o instante (epoch) até o qual o cliente lê do primário. Vai no cliente
+# porque a escrita e a leitura seguinte podem cair em workers diferentes. O frontend
+# chama a API de outra origem: precisa de withCredentials (frontend/src/services/api.ts),
+# a origem em CORS (main.py) e o mesmo site que a API (SameSite=Lax).
+WRITE_MARKER_COOKIE = "rw_until"
+
+def track_writes(session, request: Request) -> None:
+    """Liga a sessão à requisição: commits com escrita marcam o autor e a resposta."""
+    session.info["subject"] = request_subject(request)
+    session.info["request"] = request
+
+def mark_write_response(request: Request, response) -> None:
+    """Chamado pelo middleware: se a requisição escreveu, devolve o cookie de read-your-writes."""
+    if getattr(request.state, "wrote", False):
+        window = get_replica_router().read_your_writes_seconds
+        response.set_cookie(
+            WRITE_MARKER_COOKIE, f"{time.time() + window:.3f}",
+            max_age=max(1, math.ceil(window)), httponly=True, samesite="lax",
+        )
+
+def wrote_recently(request: Request) -> bool:
+    try:
+        until = float(request.cookies.get(WRITE_MARKER_COOKIE, ""))
+    except ValueError:
+        return False
+    # Limitado à janela: um cookie adulterado não prende as leituras no primário
+    now = time.time()
+    return now < until <= now + get_replica_router().read_your_writes_seconds
+
+# Sessões que escreveram algo marcam o autor, para que as leituras seguintes dele
+# venham do primário (read-your-writes) enquanto as réplicas alcançam.
+@event.listens_for(Session, "after_flush")
+def _flag_flush_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+@event.listens_for(Session, "after_commit")
+def _track_tenant_writes(session):
+    if not session.info.pop("has_writes", False):
+        return
+    if session.info.get("subject"):
+        get_replica_router().note_write(session.info["subject"])
+    if session.info.get("request") is not None:
+        session.info["request"].state.wrote = True
+
 # Função de utilidade para obter a sessão do banco de dados
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    track_writes(db, request)
     try:
         yield db
     finally:
         db.close()
+
+# Equivalente assíncrono de get_db, para rotas `async def`
+async def get_async_db(request: Request):
+    async with get_async_sessionmaker()() as db:
+        track_writes(db, request)
+        yield db
+
+# Sessão de escrita fora de uma requisição (tarefas em segundo plano)
+def open_background_session() -> AsyncSession:
+    return get_replica_router().primary()
+
+# Sessão para rotas somente leitura: réplica quando configurada, primário caso contrário
+async def get_read_db(request: Request):
+    db = await get_replica_router().open_read_session(request_subject(request), wrote_recently(request))
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Métricas dos pools de conexão, por engine registrado.
+# Contadores vêm dos eventos de pool do SQLAlchemy (connect/checkout/checkin/invalidate);
+# a latência de checkout é medida em volta de Pool.connect(), que é onde a espera
+# por uma conexão livre acontece.
+
+_LATENCY_SAMPLES = 1024
+
+
+class PoolMetrics:
+    def __init__(self, name: str, max_overflow: int):
+        self.name = name
+        self.max_overflow = max_overflow
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_checkout(self, elapsed: float, waited: bool) -> None:
+        with self._lock:
+            self._latencies.append(elapsed)
+            if waited:
+                self.waits += 1
+                self.wait_time_total += elapsed
+                self.wait_time_max = max(self.wait_time_max, elapsed)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "waits": self.waits,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+            }
+
+        def percentile(fraction: float) -> float | None:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(fraction * len(latencies)))
+            return round(latencies[index] * 1000, 3)
+
+        return {
+            "name": self.name,
+            "pool_class": type(pool).__name__,
+            "size": _call(pool, "size"),
+            "checked_in": _call(pool, "checkedin"),
+            "checked_out": _call(pool, "checkedout"),
+            # QueuePool.overflow() começa em -pool_size; expomos só as conexões extras em uso
+            "overflow": max(0, overflow) if (overflow := _call(pool, "overflow")) is not None else None,
+            "max_overflow": self.max_overflow,
+            **counters,
+            "checkout_latency_p50_ms": percentile(0.50),
+            "checkout_latency_p99_ms": percentile(0.99),
+        }
+
+
+def _call(pool, method: str):
+    # Nem todo pool (ex.: StaticPool/NullPool do SQLite) expõe todas as contagens
+    fn = getattr(pool, method, None)
+    return fn() if callable(fn) else None
+
+
+# nome do pool (pool_logging_name) -> (engine síncrono, métricas)
+_registry: dict[str, tuple] = {}
+
+
+class _TimedCheckoutMixin:
+    """Mede o tempo de Pool.connect() e se a requisição teve de esperar por um slot."""
+
+    def connect(self):
+        entry = _registry.get(getattr(self, "logging_name", None))
+        if entry is None:
+            return super().connect()
+        metrics = entry[1]
+        saturated = (
+            metrics.max_overflow >= 0
+            and self.checkedin() == 0
+            and self.overflow() >= metrics.max_overflow
+        )
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            metrics.record_checkout(time.perf_counter() - start, saturated)
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, name: str, max_overflow: int) -> PoolMetrics:
+    """Registra o engine (síncrono ou AsyncEngine) e liga os eventos de pool."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    metrics = PoolMetrics(name, max_overflow)
+    _registry[name] = (sync_engine, metrics)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.increment("connects")
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.increment("checkouts")
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.increment("checkins")
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("invalidations")
+
+    return metrics
+
+
+def pool_metrics_snapshot() -> list[dict]:
+    return [metrics.snapshot(sync_engine.pool) for sync_engine, metrics in _registry.values()]
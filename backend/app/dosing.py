@@ -0,0 +1,136 @@
+"""
+Folha de dosagem: quanto de cada produto aplicar em cada piscina do usuário.
+
+Usa o volume da piscina (litros) e a última leitura de cada parâmetro
+(app/chemistry.py). Quando a leitura está fora da faixa ideal, a dose leva o
+parâmetro ao meio da faixa:
+
+    quantidade = |alvo - leitura| * dose do produto * volume / 1000
+
+As piscinas vêm numa consulta e as leituras noutra; o cálculo é feito em colunas
+NumPy para todas as piscinas de uma vez, produto a produto.
+
+O catálogo de produtos fica em AppSetting, na chave "dosing_catalog" (lista JSON
+de DosingProduct). Sem a chave, vale DEFAULT_CATALOG. Para cada parâmetro e
+sentido usa-se o primeiro produto do catálogo.
+"""
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chemistry import IDEAL_RANGES, LABELS, latest_values, load_readings
+from app.models import AppSetting as DBAppSetting, Client as DBClient, Pool as DBPool
+from app.schemas import DosingProduct
+
+logger = logging.getLogger("app")
+
+CATALOG_KEY = "dosing_catalog"
+APPLICATION_ORDER = ("alkalinity", "ph", "chlorine") # Alcalinidade primeiro: ela segura o pH
+
+# Valores típicos; cada instalação ajusta os seus em /dosagem/catalogo
+DEFAULT_CATALOG = [
+    DosingProduct(key="bicarbonato", name="Elevador de alcalinidade (bicarbonato de sódio)", parameter="alkalinity", direction="raise", dose=1.7),
+    DosingProduct(key="barrilha", name="Elevador de pH (barrilha)", parameter="ph", direction="raise", dose=100.0),
+    DosingProduct(key="redutor_ph", name="Redutor de pH", parameter="ph", direction="lower", dose=100.0, unit="ml"),
+    DosingProduct(key="cloro_granulado", name="Cloro granulado 65%", parameter="chlorine", direction="raise", dose=1.5),
+]
+
+catalog_adapter = TypeAdapter(list[DosingProduct])
+
+
+def check_catalog(products: list[DosingProduct]) -> list[DosingProduct]:
+    keys = [product.key for product in products]
+    if len(keys) != len(set(keys)):
+        raise ValueError("Chaves de produto repetidas no catálogo")
+    return products
+
+
+def parse_catalog(value: str) -> list[DosingProduct]:
+    return check_catalog(catalog_adapter.validate_json(value))
+
+
+async def load_catalog(db: AsyncSession) -> list[DosingProduct]:
+    value = (await db.execute(select(DBAppSetting.value).filter(DBAppSetting.key == CATALOG_KEY))).scalar()
+    if value is None:
+        return DEFAULT_CATALOG
+    try:
+        return parse_catalog(value)
+    except (ValidationError, ValueError):
+        # Gravado por fora de PUT /dosagem/catalogo (ex.: /admin/settings) sem validação
+        logger.exception(f"Catálogo de dosagem inválido em app_settings.{CATALOG_KEY}; usando o padrão")
+        return DEFAULT_CATALOG
+
+
+def compute_doses(pools: list, readings, catalog: list[DosingProduct]) -> list[dict]:
+    """pools: linhas (id, volume, client_id, client_name, address) em ordem de id."""
+    reading_pool_ids, last, reading_dates = latest_values(readings)
+    pool_ids = np.array([pool.id for pool in pools], dtype=np.int64)
+    volumes = np.array([pool.volume or np.nan for pool in pools], dtype=np.float64)
+
+    # Alinha as leituras (também em ordem de pool_id) com as piscinas
+    reading_ids = np.array(reading_pool_ids, dtype=np.int64)
+    if len(reading_ids):
+        position = np.minimum(np.searchsorted(reading_ids, pool_ids), len(reading_ids) - 1)
+        has_reading = reading_ids[position] == pool_ids
+        current_values = {name: np.where(has_reading, last[name][position], np.nan) for name in APPLICATION_ORDER}
+    else:
+        has_reading = np.zeros(len(pools), dtype=bool)
+        current_values = {name: np.full(len(pools), np.nan) for name in APPLICATION_ORDER}
+
+    doses = [[] for _ in pools]
+    warnings = [[] for _ in pools]
+    for index in np.flatnonzero(~has_reading).tolist():
+        warnings[index].append("Sem leituras no período")
+    for index in np.flatnonzero(has_reading & np.isnan(volumes)).tolist():
+        warnings[index].append("Volume da piscina não informado")
+
+    for name in APPLICATION_ORDER:
+        current = current_values[name]
+        low, high = IDEAL_RANGES[name]
+        target = (low + high) / 2
+        for direction, needed in (("raise", current < low), ("lower", current > high)):
+            product = next((p for p in catalog if p.parameter == name and p.direction == direction), None)
+            if product is None:
+                for index in np.flatnonzero(needed).tolist():
+                    warnings[index].append(f"{LABELS[name]} fora da faixa e sem produto no catálogo para corrigir")
+                continue
+            quantity = np.abs(target - current) * product.dose * volumes / 1000
+            for index in np.flatnonzero(needed & ~np.isnan(quantity)).tolist():
+                doses[index].append({
+                    "product": product.key, "name": product.name, "parameter": name, "unit": product.unit,
+                    "current": round(float(current[index]), 2), "target": target,
+                    "quantity": round(float(quantity[index]), 1),
+                })
+
+    dates = dict(zip(reading_pool_ids, reading_dates))
+    return [
+        {
+            "pool_id": pool.id, "client_id": pool.client_id, "client_name": pool.client_name,
+            "address": pool.address, "volume": pool.volume, "last_reading": dates.get(pool.id),
+            "doses": doses[index], "warnings": warnings[index],
+        }
+        for index, pool in enumerate(pools)
+    ]
+
+
+async def dosing_sheet(db: AsyncSession, owner_id: int, pool_ids: list[int] | None = None, include_ok: bool = False) -> dict:
+    statement = (
+        select(DBPool.id, DBPool.volume, DBPool.client_id, DBClient.name.label("client_name"), DBClient.address)
+        .join(DBClient, DBClient.id == DBPool.client_id)
+        .filter(DBPool.owner_id == owner_id, DBClient.is_active.isnot(False)) # Clientes inativos ficam fora da rota
+        .order_by(DBPool.id)
+    )
+    if pool_ids:
+        statement = statement.filter(DBPool.id.in_(pool_ids))
+    pools = (await db.execute(statement)).all()
+    readings = await load_readings(db, owner_id, pool_ids=pool_ids)
+    catalog = await load_catalog(db)
+    sheet = await run_in_threadpool(compute_doses, pools, readings, catalog)
+    if not include_ok:
+        sheet = [pool for pool in sheet if pool["doses"] or pool["warnings"]]
+    return {"date": datetime.now(timezone.utc).date(), "pools": sheet}
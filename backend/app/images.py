@@ -0,0 +1,170 @@
+"""
+Variantes das fotos enviadas: miniatura, média e WebP em tamanho original.
+
+Cada upload aceito vira um job num ProcessPoolExecutor (o redimensionamento é CPU
+puro e não deve disputar o GIL com o event loop). O worker lê o original do
+armazenamento (app/storage.py), aplica a rotação do EXIF e grava as variantes sem
+metadados (EXIF, GPS do celular) num temporário, que é então guardado no
+armazenamento: se a variante existe, está completa.
+
+As variantes ficam em variants/<variante>/<nome>. Enquanto não existem,
+GET /upload/{filename}/{variant} devolve o original.
+"""
+import importlib.util
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.cache import TTLCache
+from app.config import settings
+from app.storage import FILE_MODE, StorageBackend
+
+logger = logging.getLogger("app")
+
+# variante -> (lado maior em px ou None para manter o tamanho, formato ou None para manter o do original)
+VARIANTS = {
+    "thumb": (320, None),
+    "medium": (1280, None),
+    "webp": (None, "WEBP"),
+}
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+_executor: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+_pending: dict[str, Future] = {} # Nome do original -> job em andamento
+# Não reenfileirar imagens que o Pillow não consegue decodificar; erros de armazenamento
+# ou do pool são transitórios e a próxima leitura da variante tenta de novo
+_failed = TTLCache(maxsize=settings.IMAGE_FAILED_MAX_SIZE, ttl=settings.IMAGE_FAILED_TTL_SECONDS)
+
+
+def available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+def variant_name(filename: str, variant: str) -> str:
+    stem = filename.rpartition(".")[0]
+    _, output_format = VARIANTS[variant]
+    return f"{stem}.{EXTENSIONS[output_format]}" if output_format else filename
+
+
+def variant_key(filename: str, variant: str) -> str:
+    return f"variants/{variant}/{variant_name(filename, variant)}"
+
+
+def _save(image, storage: StorageBackend, key: str, image_format: str, icc_profile) -> None:
+    params = {"icc_profile": icc_profile} if icc_profile else {}
+    if image_format == "JPEG":
+        image = image.convert("RGB") if image.mode not in ("RGB", "L", "CMYK") else image
+        params.update(quality=settings.IMAGE_QUALITY, optimize=True, progressive=True)
+    elif image_format == "WEBP":
+        params.update(quality=settings.IMAGE_QUALITY, method=4)
+    else:
+        params.update(optimize=True)
+    fd, temporary = tempfile.mkstemp(dir=storage.staging_dir, prefix=".variant-", suffix=f".{EXTENSIONS[image_format]}")
+    os.close(fd)
+    try:
+        os.chmod(temporary, FILE_MODE)
+        # Sem exif=/pnginfo=: o Pillow não copia os metadados do original
+        image.save(temporary, image_format, **params)
+        storage.save(temporary, key, CONTENT_TYPES[image_format])
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def make_variants(storage: StorageBackend, filename: str) -> list[str]:
+    """Roda no processo worker: grava as variantes que faltam e devolve suas chaves."""
+    from PIL import Image, ImageOps
+
+    missing = [variant for variant in VARIANTS if not storage.exists(variant_key(filename, variant))]
+    if not missing:
+        return []
+    with storage.fetch(filename) as source, Image.open(source) as original:
+        source_format = original.format
+        icc_profile = original.info.get("icc_profile")
+        image = ImageOps.exif_transpose(original) # Fotos de celular vêm "deitadas" + tag de rotação
+        for variant in missing:
+            size, output_format = VARIANTS[variant]
+            resized = image
+            if size and max(image.size) > size:
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            _save(resized, storage, variant_key(filename, variant), output_format or source_format, icc_profile)
+    return [variant_key(filename, variant) for variant in missing]
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # Criado no primeiro uso: nada de processos extras em imports, testes ou CLIs
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def _is_permanent(error: BaseException) -> bool:
+    """Só o conteúdo da imagem é falha definitiva; o resto (S3, disco, pool) pode passar."""
+    try:
+        from PIL import Image, UnidentifiedImageError
+    except ImportError:
+        return False
+    return isinstance(error, (UnidentifiedImageError, Image.DecompressionBombError))
+
+
+def _reset_broken_executor(broken: ProcessPoolExecutor) -> None:
+    # Um worker morto (OOM, kill) quebra o pool inteiro: o próximo job cria outro
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _finished(filename: str, executor: ProcessPoolExecutor, future: Future) -> None:
+    with _lock:
+        _pending.pop(filename, None)
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        return
+    if _is_permanent(error):
+        _failed.set(filename, True)
+        logger.error(f"Falha ao gerar variantes de {filename}: {error!r}")
+        return
+    if isinstance(error, BrokenProcessPool):
+        _reset_broken_executor(executor)
+    logger.warning(f"Falha transitória ao gerar variantes de {filename}, será tentado de novo: {error!r}")
+
+
+def schedule_variants(storage: StorageBackend, filename: str) -> Future | None:
+    """Enfileira a geração das variantes (sem esperar). None se já está na fila ou não há Pillow."""
+    if not available() or _failed.get(filename):
+        return None
+    global _executor
+    with _lock:
+        if filename in _pending:
+            return None
+        executor = _get_executor()
+        try:
+            future = executor.submit(make_variants, storage, filename)
+        except BrokenProcessPool:
+            # Quebrou antes de algum job avisar: troca o pool e tenta uma vez
+            executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            executor = _get_executor()
+            future = executor.submit(make_variants, storage, filename)
+        _pending[filename] = future
+    future.add_done_callback(lambda done: _finished(filename, executor, done))
+    return future
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
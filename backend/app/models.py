@@ -1,7 +1,13 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import relationship
+from collections import Counter
+from datetime import date, timezone
+
+from sqlalchemy import DDL, Column, Date, Integer, Interval, JSON, Numeric, String, ForeignKey, DateTime, Boolean, Index, event, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, relationship, validates
 from sqlalchemy.sql import func
 from app.database import Base
+from app.normalize import document_key, phone_key, search_key
 
 class User(Base):
     __tablename__ = "users"
@@ -11,6 +17,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_superuser = Column(Boolean, default=False, nullable=False)
+    token_epoch = Column(Integer, default=0, server_default="0", nullable=False) # Incrementado para revogar tokens emitidos
+    readings_version = Column(Integer, default=0, server_default="0", nullable=False) # Incrementado a cada serviço gravado; chave do cache de app/chemistry.py
 
     projects = relationship("Project", back_populates="owner")
     clients = relationship("Client", back_populates="owner")
@@ -34,6 +42,20 @@ class AppSetting(Base):
     key = Column(String, unique=True, index=True, nullable=False)
     value = Column(String, nullable=False)
 
+def _key_default(column: str, key):
+    # Também cobre INSERTs em lote (app/bulk.py), que não passam pelos @validates
+    def default(context):
+        return key(context.get_current_parameters().get(column))
+    return default
+
+def _search_default(context):
+    parameters = context.get_current_parameters()
+    return search_key(parameters.get("name"), parameters.get("email"))
+
+def _trigram_index(name: str, column: str) -> Index:
+    # GIN com pg_trgm: atende LIKE '%termo%' e similaridade; no SQLite a busca usa clients_fts
+    return Index(name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+
 class Client(Base):
     __tablename__ = "clients"
 
@@ -47,16 +69,62 @@ class Client(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    # Chaves só com dígitos para deduplicação e busca (app/normalize.py)
+    cpf_cnpj_digits = Column(String, nullable=True, default=_key_default("cpf_cnpj", document_key))
+    phone_digits = Column(String, nullable=True, default=_key_default("phone", phone_key))
+    search_text = Column(String, nullable=True, default=_search_default) # Nome e e-mail para /clientes/busca
+
+    # Caminhos de acesso por tenant (migrações 89e2ccf87679, a0a17023ba8c e e871be70be2c)
+    __table_args__ = (
+        Index("ix_clients_owner_id_id", "owner_id", "id"),
+        Index("ix_clients_owner_id_cpf_cnpj_digits", "owner_id", "cpf_cnpj_digits"),
+        Index("ix_clients_owner_id_phone_digits", "owner_id", "phone_digits"),
+        _trigram_index("ix_clients_search_text_trgm", "search_text"),
+        _trigram_index("ix_clients_phone_digits_trgm", "phone_digits"),
+        _trigram_index("ix_clients_cpf_cnpj_digits_trgm", "cpf_cnpj_digits"),
+    )
 
     owner = relationship("User", back_populates="clients")
     pools = relationship("Pool", back_populates="client")
     budgets = relationship("Budget", back_populates="client")
 
+    @validates("cpf_cnpj", "phone")
+    def _update_keys(self, field, value):
+        if field == "cpf_cnpj":
+            self.cpf_cnpj_digits = document_key(value)
+        else:
+            self.phone_digits = phone_key(value)
+        return value
+
+    @validates("name", "email")
+    def _update_search_text(self, field, value):
+        self.search_text = search_key(value if field == "name" else self.name, value if field == "email" else self.email)
+        return value
+
+# SQLite (testes e desenvolvimento): índice FTS5 com tokenizador trigram sobre as mesmas
+# colunas, mantido por triggers. A migração e871be70be2c cria o equivalente.
+_FTS_COLUMNS = "search_text, phone_digits, cpf_cnpj_digits"
+CLIENTS_FTS_SQLITE = [
+    f"CREATE VIRTUAL TABLE clients_fts USING fts5({_FTS_COLUMNS}, content='clients', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER clients_fts_insert AFTER INSERT ON clients BEGIN "
+    f"INSERT INTO clients_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, new.search_text, new.phone_digits, new.cpf_cnpj_digits); END",
+    f"CREATE TRIGGER clients_fts_delete AFTER DELETE ON clients BEGIN "
+    f"INSERT INTO clients_fts(clients_fts, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, old.search_text, old.phone_digits, old.cpf_cnpj_digits); END",
+    f"CREATE TRIGGER clients_fts_update AFTER UPDATE ON clients BEGIN "
+    f"INSERT INTO clients_fts(clients_fts, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, old.search_text, old.phone_digits, old.cpf_cnpj_digits); "
+    f"INSERT INTO clients_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, new.search_text, new.phone_digits, new.cpf_cnpj_digits); END",
+]
+for _statement in CLIENTS_FTS_SQLITE:
+    event.listen(Client.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Client.__table__, "before_drop", DDL("DROP TABLE IF EXISTS clients_fts").execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
 class Pool(Base):
     __tablename__ = "pools"
 
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, ForeignKey("clients.id"))
+    owner_id = Column(Integer, ForeignKey("users.id")) # Cópia de clients.owner_id (ver _sync_owner_ids)
     volume = Column(Integer)
     pool_type = Column(String)
     coating = Column(String, nullable=True)
@@ -64,6 +132,11 @@ class Pool(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_pools_client_id", "client_id"),
+        Index("ix_pools_owner_id_id", "owner_id", "id"),
+    )
+
     client = relationship("Client", back_populates="pools")
     services = relationship("Service", back_populates="pool")
 
@@ -72,17 +145,23 @@ class Service(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     pool_id = Column(Integer, ForeignKey("pools.id"))
+    owner_id = Column(Integer, ForeignKey("users.id")) # Cópia de pools.owner_id
     date = Column(DateTime(timezone=True), server_default=func.now())
     service_type = Column(String)
     description = Column(String, nullable=True)
-    value = Column(String, nullable=True)
-    time_spent = Column(String, nullable=True)
-    ph = Column(String, nullable=True)
-    chlorine = Column(String, nullable=True)
-    alkalinity = Column(String, nullable=True)
+    value = Column(Numeric(10, 2), nullable=True) # R$
+    time_spent = Column(Interval, nullable=True)
+    ph = Column(Numeric(4, 2), nullable=True)
+    chlorine = Column(Numeric(6, 2), nullable=True) # ppm
+    alkalinity = Column(Numeric(7, 2), nullable=True) # ppm
     remarks = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_services_pool_id_date", "pool_id", date.desc()),
+        Index("ix_services_owner_id_date", "owner_id", date.desc()),
+    )
+
     pool = relationship("Pool", back_populates="services")
 
 class Budget(Base):
@@ -90,11 +169,222 @@ class Budget(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, ForeignKey("clients.id"))
+    owner_id = Column(Integer, ForeignKey("users.id")) # Cópia de clients.owner_id
     date = Column(DateTime(timezone=True), server_default=func.now())
-    items = Column(String) # JSON
-    total = Column(String)
+    items = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=list) # Cópia dos itens para leitura; consultas usam budget_items
+    total = Column(Numeric(12, 2)) # R$; calculado a partir dos itens com preço
     status = Column(String, default="Open")
     validity = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    client = relationship("Client", back_populates="budgets")
\ No newline at end of file
+    __table_args__ = (
+        Index("ix_budgets_client_id_status", "client_id", "status"),
+        Index("ix_budgets_owner_id_id", "owner_id", "id"),
+    )
+
+    client = relationship("Client", back_populates="budgets")
+
+class BudgetItem(Base):
+    __tablename__ = "budget_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    budget_id = Column(Integer, ForeignKey("budgets.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0) # Ordem do item no orçamento
+    product = Column(String, nullable=True, index=True)
+    description = Column(String, nullable=True)
+    quantity = Column(Numeric(12, 3), nullable=False, default=1)
+    unit_price = Column(Numeric(10, 2), nullable=True) # R$
+    line_total = Column(Numeric(12, 2), nullable=True) # quantity * unit_price
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending") # pending, running, done, failed
+    processed_rows = Column(Integer, nullable=False, default=0)
+    created_count = Column(Integer, nullable=False, default=0)
+    duplicate_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=list) # [{"row", "detail"}], até IMPORT_MAX_ERRORS
+    detail = Column(String, nullable=True) # Motivo da falha quando status == "failed"
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class TenantMonthlyStats(Base):
+    """Agregados do dashboard por dono e mês; mantidos pelos hooks no fim deste arquivo."""
+    __tablename__ = "tenant_monthly_stats"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True) # Primeiro dia do mês (UTC)
+    clients_added = Column(Integer, nullable=False, default=0, server_default="0")
+    pools_added = Column(Integer, nullable=False, default=0, server_default="0")
+    services_count = Column(Integer, nullable=False, default=0, server_default="0")
+    services_revenue = Column(Numeric(14, 2), nullable=False, default=0, server_default="0") # Soma de services.value
+    budgets_count = Column(Integer, nullable=False, default=0, server_default="0")
+    budgets_total = Column(Numeric(14, 2), nullable=False, default=0, server_default="0")
+    budgets_approved_total = Column(Numeric(14, 2), nullable=False, default=0, server_default="0") # status "Approved"
+
+class StoredFile(Base):
+    """Upload guardado uma vez por conteúdo, na chave <sha256>.<extension> do armazenamento (app/uploads.py, app/storage.py)."""
+    __tablename__ = "stored_files"
+
+    sha256 = Column(String(64), primary_key=True) # Hex do SHA-256 do conteúdo
+    extension = Column(String, nullable=False) # Do primeiro envio; os seguintes reaproveitam
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1) # Envios ainda não apagados, somando todos os donos
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UploadReference(Base):
+    """Envios de um conteúdo por um usuário: cada um só apaga as próprias referências."""
+    __tablename__ = "upload_references"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    sha256 = Column(String(64), ForeignKey("stored_files.sha256"), primary_key=True, index=True)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# --- owner_id desnormalizado ---
+# Pool, Service e Budget guardam o dono do cliente para que as rotas filtrem por
+# (id, owner_id) sem join até clients. O valor é derivado do pai na criação e
+# sempre que a linha muda de pai; se o dono de um cliente ou o cliente de uma
+# piscina mudar, os descendentes são atualizados na mesma transação.
+
+def _parent_owner_id(session, obj, relation: str, parent_model, parent_id):
+    parent = obj.__dict__.get(relation)
+    if parent is None and parent_id is not None:
+        parent = session.identity_map.get(inspect(parent_model).identity_key_from_primary_key((parent_id,)))
+    if parent is not None:
+        return parent.owner_id
+    if parent_id is None:
+        return None
+    return session.execute(select(parent_model.owner_id).filter(parent_model.id == parent_id)).scalar()
+
+def _parent_changed(obj, attribute: str, relation: str) -> bool:
+    state = inspect(obj)
+    return state.attrs[attribute].history.has_changes() or state.attrs[relation].history.has_changes()
+
+@event.listens_for(Session, "before_flush")
+def _sync_owner_ids(session, flush_context, instances):
+    candidates = list(session.new) + list(session.dirty)
+    # Piscinas antes de serviços: um serviço novo pode apontar para uma piscina nova
+    for model, attribute, relation, parent_model in (
+        (Pool, "client_id", "client", Client),
+        (Budget, "client_id", "client", Client),
+        (Service, "pool_id", "pool", Pool),
+    ):
+        for obj in candidates:
+            if type(obj) is not model:
+                continue
+            is_new = obj in session.new
+            if (is_new and obj.owner_id is None) or (not is_new and _parent_changed(obj, attribute, relation)):
+                parent = obj.__dict__.get(relation)
+                parent_id = parent.id if parent is not None else getattr(obj, attribute)
+                obj.owner_id = _parent_owner_id(session, obj, relation, parent_model, parent_id)
+
+@event.listens_for(Session, "after_flush")
+def _cascade_owner_ids(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, Client) and inspect(obj).attrs.owner_id.history.has_changes():
+            pool_ids = select(Pool.id).filter(Pool.client_id == obj.id).scalar_subquery()
+            session.execute(update(Pool).filter(Pool.client_id == obj.id).values(owner_id=obj.owner_id).execution_options(synchronize_session=False))
+            session.execute(update(Budget).filter(Budget.client_id == obj.id).values(owner_id=obj.owner_id).execution_options(synchronize_session=False))
+            session.execute(update(Service).filter(Service.pool_id.in_(pool_ids)).values(owner_id=obj.owner_id).execution_options(synchronize_session=False))
+        elif isinstance(obj, Pool) and inspect(obj).attrs.owner_id.history.has_changes():
+            session.execute(update(Service).filter(Service.pool_id == obj.id).values(owner_id=obj.owner_id).execution_options(synchronize_session=False))
+
+
+# --- Agregados mensais do dashboard ---
+# Cada Client, Pool, Service e Budget contribui para a linha (owner_id, mês) de
+# tenant_monthly_stats. No after_flush, criações somam, exclusões subtraem e
+# alterações dos campos abaixo movem a contribuição antiga para a nova, com um
+# upsert incremental na mesma transação. Os INSERTs em lote de app/bulk.py não
+# passam pelo flush e chamam record_inserted. Mudanças feitas só por UPDATE em SQL
+# (como a cascata de owner_id acima) não são acompanhadas: para corrigir,
+# `python -m app.dashboard rebuild` recalcula a tabela a partir das de origem.
+
+def month_of(value) -> date | None:
+    if value is None:
+        return None
+    if getattr(value, "tzinfo", None) is not None:
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+def _approved_total(values):
+    return values["total"] or 0 if values["status"] == "Approved" else 0
+
+# modelo -> (coluna que define o mês, campos acompanhados, contribuição de uma linha)
+_STATS_SOURCES = {
+    Client: ("created_at", ("owner_id", "created_at"), lambda v: {"clients_added": 1}),
+    Pool: ("created_at", ("owner_id", "created_at"), lambda v: {"pools_added": 1}),
+    Service: ("date", ("owner_id", "date", "value"), lambda v: {"services_count": 1, "services_revenue": v["value"] or 0}),
+    Budget: ("date", ("owner_id", "date", "total", "status"), lambda v: {
+        "budgets_count": 1, "budgets_total": v["total"] or 0, "budgets_approved_total": _approved_total(v),
+    }),
+}
+
+_STATS_COLUMNS = [column.name for column in TenantMonthlyStats.__table__.columns if column.name not in ("owner_id", "month")]
+
+def _current_values(obj) -> dict:
+    return {field: getattr(obj, field) for field in _STATS_SOURCES[type(obj)][1]}
+
+def _add_contribution(deltas: dict, model, values: dict, sign: int) -> None:
+    month_field, _, contribution = _STATS_SOURCES[model]
+    month = month_of(values[month_field])
+    if values["owner_id"] is None or month is None:
+        return
+    counter = deltas.setdefault((values["owner_id"], month), Counter())
+    for column, amount in contribution(values).items():
+        counter[column] += sign * amount
+
+def _apply_stats_deltas(session, deltas: dict) -> None:
+    params = [
+        {"owner_id": owner_id, "month": month, **{column: counter.get(column, 0) for column in _STATS_COLUMNS}}
+        # Ordem fixa das chaves: transações concorrentes travam as linhas na mesma ordem
+        for (owner_id, month), counter in sorted(deltas.items()) if any(counter.values())
+    ]
+    if not params:
+        return
+    table = TenantMonthlyStats.__table__
+    dialect = postgresql if session.connection().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.owner_id, table.c.month],
+        set_={column: table.c[column] + statement.excluded[column] for column in _STATS_COLUMNS},
+    )
+    session.execute(statement, params)
+
+def record_inserted(session, objects) -> None:
+    """Soma a contribuição de linhas gravadas fora do flush (INSERT em lote)."""
+    deltas = {}
+    for obj in objects:
+        if type(obj) in _STATS_SOURCES:
+            _add_contribution(deltas, type(obj), _current_values(obj), 1)
+    _apply_stats_deltas(session, deltas)
+
+@event.listens_for(Session, "after_flush")
+def _update_monthly_stats(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if type(obj) in _STATS_SOURCES:
+            _add_contribution(deltas, type(obj), _current_values(obj), 1)
+    for obj in session.deleted:
+        if type(obj) in _STATS_SOURCES:
+            _add_contribution(deltas, type(obj), _current_values(obj), -1)
+    for obj in session.dirty:
+        if type(obj) not in _STATS_SOURCES:
+            continue
+        state = inspect(obj)
+        histories = {field: state.attrs[field].history for field in _STATS_SOURCES[type(obj)][1]}
+        if not any(history.has_changes() for history in histories.values()):
+            continue
+        old = {
+            field: history.deleted[0] if history.deleted else getattr(obj, field)
+            for field, history in histories.items()
+        }
+        _add_contribution(deltas, type(obj), old, -1)
+        _add_contribution(deltas, type(obj), _current_values(obj), 1)
+    _apply_stats_deltas(session, deltas)
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+# Telefones e CPF/CNPJ chegam do app e de planilhas em formatos variados
+# ("+55 (11) 98765-4321", "11987654321", 12345678909 numa célula numérica...).
+# As formas só com dígitos são as chaves de comparação (deduplicação na importação,
+# colunas *_digits de clients); as formatadas são as gravadas para exibição.
+# search_key gera o texto de busca de clients.search_text (nome e e-mail).
+
+_CPF_WEIGHTS = (range(10, 1, -1), range(11, 1, -1))
+_CNPJ_WEIGHTS = ((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+
+
+def only_digits(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value) # Célula numérica de planilha: 11987654321.0
+    return re.sub(r"\D", "", str(value))
+
+
+def phone_key(value) -> str | None:
+    """DDD + número, sem o +55 e sem o 0 de discagem interurbana."""
+    digits = only_digits(value)
+    if len(digits) in (12, 13) and digits.startswith("55"):
+        digits = digits[2:]
+    elif len(digits) in (11, 12) and digits.startswith("0"):
+        digits = digits[1:]
+    return digits or None
+
+
+def document_key(value) -> str | None:
+    return only_digits(value) or None
+
+
+def normalize_phone(value) -> str | None:
+    """
+    "(11) 98765-4321" ou "(11) 3333-4444". Texto vazio vira None; sem DDD + 8 ou 9
+    dígitos gera ValueError.
+    """
+    digits = phone_key(value)
+    if digits is None:
+        return None
+    if len(digits) == 11:
+        return f"({digits[:2]}) {digits[2:7]}-{digits[7:]}"
+    if len(digits) == 10:
+        return f"({digits[:2]}) {digits[2:6]}-{digits[6:]}"
+    raise ValueError(f"Telefone inválido: {value!r}")
+
+
+def _check_digits(digits: str, weights) -> str:
+    result = ""
+    for weight in weights:
+        rest = sum(int(d) * w for d, w in zip(digits + result, weight)) % 11
+        result += "0" if rest < 2 else str(11 - rest)
+    return result
+
+
+def normalize_cpf_cnpj(value) -> str | None:
+    """
+    CPF como "123.456.789-09" e CNPJ como "12.345.678/0001-95", com os dígitos
+    verificadores conferidos. Texto vazio vira None; documento inválido gera ValueError.
+    """
+    digits = only_digits(value)
+    if not digits:
+        return None
+    if isinstance(value, (int, float)):
+        # Planilhas guardam o documento como número e perdem os zeros à esquerda
+        digits = digits.zfill(11 if len(digits) <= 11 else 14)
+    if len(digits) == 11 and len(set(digits)) > 1 and _check_digits(digits[:9], _CPF_WEIGHTS) == digits[9:]:
+        return f"{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}"
+    if len(digits) == 14 and len(set(digits)) > 1 and _check_digits(digits[:12], _CNPJ_WEIGHTS) == digits[12:]:
+        return f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}/{digits[8:12]}-{digits[12:]}"
+    raise ValueError(f"CPF/CNPJ inválido: {value!r}")
+
+
+def search_key(*values) -> str | None:
+    """Minúsculo, sem acentos e com espaços simples: "José  Álvares" -> "jose alvares"."""
+    text = " ".join(str(value) for value in values if value)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return " ".join(text.split()) or None
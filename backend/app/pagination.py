@@ -0,0 +1,63 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, func, select, tuple_
+
+# Paginação por keyset: a página seguinte começa depois da última linha entregue,
+# comparando a chave de ordenação (coluna, id) em vez de pular N linhas com OFFSET.
+# O cursor é opaco para o cliente: base64 de [valor da coluna, id].
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_column):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(sort_column.type, DateTime) and sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+
+def keyset_query(statement, sort_column, id_column, cursor: str | None, limit: int, descending: bool = False):
+    """
+    Aplica ordenação e o filtro de keyset a `statement`. Busca limit + 1 linhas
+    para saber se existe próxima página (ver `page_from_rows`).
+    """
+    if sort_column is id_column:
+        if cursor:
+            _, row_id = decode_cursor(cursor, sort_column)
+            statement = statement.filter(id_column < row_id if descending else id_column > row_id)
+        return statement.order_by(id_column.desc() if descending else id_column).limit(limit + 1)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_column)
+        # Compara com o valor gravado na própria linha do cursor (evita diferenças de
+        # formato entre o valor serializado e o do banco); se ela sumiu, usa o do cursor.
+        anchor = select(sort_column).filter(id_column == row_id).scalar_subquery()
+        boundary = tuple_(func.coalesce(anchor, sort_value), row_id)
+        key = tuple_(sort_column, id_column)
+        statement = statement.filter(key < boundary if descending else key > boundary)
+    if descending:
+        statement = statement.order_by(sort_column.desc(), id_column.desc())
+    else:
+        statement = statement.order_by(sort_column, id_column)
+    return statement.limit(limit + 1)
+
+
+def page_from_rows(rows: list, limit: int, sort_attribute: str) -> dict:
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and items:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_attribute), last.id)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,138 @@
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+# Conversão dos valores digitados pelos técnicos (formato brasileiro, com unidades)
+# para os tipos numéricos do banco. Usado pelos schemas e pela migração 3daa7516875a,
+# que converteu as colunas antigas de texto.
+
+_THOUSANDS = re.compile(r"-?[1-9]\d{0,2}\.\d{3}") # "1.500"; "0.500" não
+_DURATION_CLOCK = re.compile(r"^(\d+):([0-5]\d)(?::([0-5]\d))?$")
+_DURATION_UNITS = re.compile(
+    r"^(?:(?P<hours>\d+(?:[.,]\d+)?)\s*(?:h|hr|hrs|hora|horas))?\s*"
+    r"(?:(?P<minutes>\d+)\s*(?:m|min|mins|minuto|minutos)?)?$"
+)
+
+
+def parse_decimal(value, thousands_dot: bool = False) -> Decimal | None:
+    """
+    Aceita "1.234,56", "1,234.56", "R$ 150", "7,2", "3 ppm"...
+    Com um só ponto e três casas ("1.500"), o ponto é decimal (1,5 ppm de cloro),
+    a não ser com thousands_dot=True, usado nos valores em reais (R$ 1.500).
+    Texto vazio vira None; qualquer outra coisa sem número válido gera ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Valor numérico inválido: {value!r}")
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    text = re.sub(r"r\$|ppm|mg/l|%", "", text).replace(" ", "")
+    if "," in text and "." in text:
+        # O separador que aparece por último é o decimal
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif text.count(",") == 1:
+        text = text.replace(",", ".")
+    elif text.count(",") > 1 or text.count(".") > 1 or (thousands_dot and _THOUSANDS.fullmatch(text)):
+        # "1.234.567" ou, em dinheiro, "1.500": ponto como separador de milhar
+        text = text.replace(",", "").replace(".", "")
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Valor numérico inválido: {value!r}")
+    if not number.is_finite():
+        raise ValueError(f"Valor numérico inválido: {value!r}")
+    return number
+
+
+def parse_money(value) -> Decimal | None:
+    """parse_decimal para valores em reais: "1.500" é mil e quinhentos."""
+    return parse_decimal(value, thousands_dot=True)
+
+
+def parse_duration(value) -> timedelta | None:
+    """
+    Aceita "1h30", "1h 30min", "1:30", "90min", "1,5h" ou só minutos ("45").
+    Texto vazio vira None.
+    """
+    if value is None or isinstance(value, timedelta):
+        return value
+    if isinstance(value, bool):
+        raise ValueError(f"Duração inválida: {value!r}")
+    if isinstance(value, (int, float, Decimal)):
+        return timedelta(minutes=float(value))
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    clock = _DURATION_CLOCK.match(text)
+    if clock:
+        hours, minutes, seconds = clock.groups()
+        return timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds or 0))
+    units = _DURATION_UNITS.match(text)
+    if units and (units.group("hours") or units.group("minutes")):
+        hours = float((units.group("hours") or "0").replace(",", "."))
+        return timedelta(hours=hours, minutes=int(units.group("minutes") or 0))
+    raise ValueError(f"Duração inválida: {value!r}")
+
+
+def format_duration(value: timedelta | None) -> str | None:
+    """Formato de exibição: "1h30", "2h" ou "45min"."""
+    if value is None:
+        return None
+    total_minutes = round(value.total_seconds() / 60)
+    hours, minutes = divmod(total_minutes, 60)
+    if not hours:
+        return f"{minutes}min"
+    return f"{hours}h{minutes:02d}" if minutes else f"{hours}h"
+
+
+# Chaves usadas nos itens em texto JSON antigos -> campos de BudgetItem
+_LEGACY_ITEM_KEYS = {"price": "unit_price", "qty": "quantity", "name": "product"}
+_ITEM_FIELDS = ("product", "description", "quantity", "unit_price")
+
+
+def _legacy_item(item: dict) -> dict:
+    """Renomeia as chaves antigas; as desconhecidas vão para a descrição, para não se perderem."""
+    converted, extras = {}, []
+    for key, value in item.items():
+        field = _LEGACY_ITEM_KEYS.get(key, key)
+        if field in _ITEM_FIELDS and field not in converted:
+            converted[field] = value
+        elif value not in (None, ""):
+            extras.append(f"{key}: {value}")
+    if extras:
+        converted["description"] = "; ".join(filter(None, [converted.get("description"), *extras]))
+    return converted
+
+
+def parse_budget_items(value) -> list:
+    """
+    Itens de orçamento no formato antigo: texto JSON (lista de objetos, um objeto ou
+    lista de textos) ou texto livre, que vira um único item com descrição. No texto
+    JSON, price/qty/name viram unit_price/quantity/product e as outras chaves vão
+    para a descrição. Listas já estruturadas passam direto.
+    """
+    if value is None:
+        return []
+    legacy = isinstance(value, str)
+    if legacy:
+        text = value.strip()
+        if not text:
+            return []
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return [{"description": text}]
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list):
+        return [{"description": str(value)}]
+    items = [item if isinstance(item, dict) else {"description": str(item)} for item in value]
+    return [_legacy_item(item) for item in items] if legacy else items
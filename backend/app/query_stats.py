@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+# Contabilidade de consultas por requisição.
+# Os eventos before/after_cursor_execute são registrados na classe Engine, então
+# valem para todos os engines (primário, assíncronos e réplicas). As estatísticas
+# da requisição corrente ficam numa ContextVar, que acompanha tanto as rotas
+# `async def` quanto as síncronas executadas no threadpool.
+
+logger = logging.getLogger("app")
+
+_MAX_SLOW_STATEMENTS = 20
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_time: float = 0.0 # segundos
+    slow: list[dict] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def total_time_ms(self) -> float:
+        return round(self.total_time * 1000, 3)
+
+    def record(self, statement: str, parameters, elapsed: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            if _is_slow(elapsed) and len(self.slow) < _MAX_SLOW_STATEMENTS:
+                self.slow.append(
+                    {
+                        "statement": statement,
+                        "parameters": redact_parameters(parameters),
+                        "duration_ms": round(elapsed * 1000, 3),
+                    }
+                )
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+# Chamados ao fim de cada requisição com (método, caminho, estatísticas); usado pelos testes
+request_observers: list[Callable[[str, str, QueryStats], None]] = []
+
+
+def _is_slow(elapsed: float) -> bool:
+    return settings.SLOW_QUERY_MS >= 0 and elapsed * 1000 >= settings.SLOW_QUERY_MS
+
+
+def redact_parameters(parameters):
+    """Troca os valores dos parâmetros pelo nome do tipo, para não vazar dados de clientes no log."""
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        # executemany: lista de conjuntos de parâmetros
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} linhas"]
+        return [f"<{type(value).__name__}>" for value in parameters]
+    return parameters if parameters is None else f"<{type(parameters).__name__}>"
+
+
+@contextmanager
+def track_queries():
+    """Acumula as consultas executadas dentro do bloco num QueryStats."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def notify_request(method: str, path: str, stats: QueryStats) -> None:
+    for observer in list(request_observers):
+        observer(method, path, stats)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, parameters, elapsed)
+    if _is_slow(elapsed):
+        logger.warning(
+            f"Consulta lenta ({elapsed * 1000:.1f} ms): {statement} "
+            f"parâmetros={redact_parameters(parameters)}"
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_cursor_error(exception_context):
+    # Consulta que falhou não passa por after_cursor_execute; descarta o início pendente
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from typing import List
-from fastapi.responses import FileResponse # Import FileResponse
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 import os # Import os
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import User as DBUser, AppSetting as DBAppSetting # Import AppSetting model
-from app.schemas import User, UserCreate, UserUpdate, AppSetting, AppSettingCreate, AppSettingUpdate # Import AppSetting schemas
-from app.security import get_password_hash
-from app.auth import get_current_active_superuser
+from app.schemas import User, UserCreate, UserUpdate, AppSetting, AppSettingCreate, AppSettingUpdate, Page # Import AppSetting schemas
+from app.pagination import keyset_query, page_from_rows
+from app.security import get_password_hash_async
+from app.auth import Principal, get_current_active_superuser_async, invalidate_principal, revoke_user_tokens
 from app.config import settings # Import settings
+from app.db_metrics import pool_metrics_snapshot
+
+# Todas as rotas deste router são `async def`: acesso ao banco via AsyncSession e
+# E/S de arquivo via run_in_threadpool, para nunca bloquear o event loop.
 
 router = APIRouter(
     prefix="/admin",
@@ -19,49 +25,96 @@ router = APIRouter(
     responses={403: {"description": "Operação não permitida para este usuário"}},
 )
 
+_LOG_READ_BLOCK_SIZE = 64 * 1024
+
+def _tail_lines(path: str, last_n_lines: int) -> str:
+    """Lê as últimas N linhas a partir do fim do arquivo, sem carregar o arquivo inteiro."""
+    if last_n_lines <= 0:
+        return ""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        # N+1 quebras: a última linha normalmente termina em "\n"
+        while position > 0 and data.count(b"\n") <= last_n_lines:
+            read_size = min(_LOG_READ_BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.splitlines(keepends=True)[-last_n_lines:]
+    return b"".join(lines).decode("utf-8", errors="replace")
+
+async def _count_superusers(db: AsyncSession) -> int:
+    result = await db.execute(select(func.count(DBUser.id)).filter(DBUser.is_superuser == True))
+    return result.scalar_one()
+
+async def _get_user(db: AsyncSession, **filters):
+    result = await db.execute(select(DBUser).filter_by(**filters))
+    return result.scalars().first()
+
+async def _get_user_with_relations(db: AsyncSession, user_id: int):
+    # O schema User inclui projects/clients; em AsyncSession não há lazy load,
+    # então as relações são carregadas junto.
+    result = await db.execute(
+        select(DBUser)
+        .options(selectinload(DBUser.projects), selectinload(DBUser.clients))
+        .filter(DBUser.id == user_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def _get_setting(db: AsyncSession, key: str):
+    result = await db.execute(select(DBAppSetting).filter(DBAppSetting.key == key))
+    return result.scalars().first()
+
 # App Settings Management Routes
 @router.post("/settings/", response_model=AppSetting, status_code=status.HTTP_201_CREATED)
 async def create_app_setting(
     setting: AppSettingCreate,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Cria uma nova configuração de aplicativo.
     """
-    db_setting = db.query(DBAppSetting).filter(DBAppSetting.key == setting.key).first()
+    db_setting = await _get_setting(db, setting.key)
     if db_setting:
         raise HTTPException(status_code=400, detail="Configuração com esta chave já existe")
 
     db_setting = DBAppSetting(**setting.model_dump())
     db.add(db_setting)
-    db.commit()
-    db.refresh(db_setting)
+    await db.commit()
+    await db.refresh(db_setting)
     return db_setting
 
-@router.get("/settings/", response_model=List[AppSetting])
+@router.get("/settings/", response_model=List[AppSetting] | Page[AppSetting])
 async def read_app_settings(
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser), # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async), # Add this dependency
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
 ):
     """
     Lista todas as configurações do aplicativo.
+    Com `cursor` (vazio na primeira página), pagina por id e devolve {items, next_cursor}.
     """
-    settings = db.query(DBAppSetting).offset(skip).limit(limit).all()
-    return settings
+    if cursor is None:
+        result = await db.execute(select(DBAppSetting).offset(skip).limit(limit))
+        return result.scalars().all()
+    result = await db.execute(keyset_query(select(DBAppSetting), DBAppSetting.id, DBAppSetting.id, cursor, limit))
+    return page_from_rows(result.scalars().all(), limit, "id")
 
 @router.get("/settings/{key}", response_model=AppSetting)
 async def read_app_setting(
     key: str,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Obtém uma configuração de aplicativo específica pela chave.
     """
-    setting = db.query(DBAppSetting).filter(DBAppSetting.key == key).first()
+    setting = await _get_setting(db, key)
     if setting is None:
         raise HTTPException(status_code=404, detail="Configuração não encontrada")
     return setting
@@ -70,306 +123,99 @@ async def read_app_setting(
 async def update_app_setting(
     key: str,
     setting_update: AppSettingUpdate,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Atualiza uma configuração de aplicativo existente pela chave.
     """
-    db_setting = db.query(DBAppSetting).filter(DBAppSetting.key == key).first()
+    db_setting = await _get_setting(db, key)
     if db_setting is None:
         raise HTTPException(status_code=404, detail="Configuração não encontrada")
 
     update_data = setting_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_setting, field, value)
-    
+
     db.add(db_setting)
-    db.commit()
-    db.refresh(db_setting)
+    await db.commit()
+    await db.refresh(db_setting)
     return db_setting
 
 @router.delete("/settings/{key}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_app_setting(
     key: str,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Deleta uma configuração de aplicativo pela chave.
     """
-    db_setting = db.query(DBAppSetting).filter(DBAppSetting.key == key).first()
+    db_setting = await _get_setting(db, key)
     if db_setting is None:
         raise HTTPException(status_code=404, detail="Configuração não encontrada")
 
-    db.delete(db_setting)
-    db.commit()
+    await db.delete(db_setting)
+    await db.commit()
     return {"message": "Configuração deletada com sucesso"}
 
-@router.get("/system-logs", response_class=FileResponse)
+@router.get("/system-logs", response_class=PlainTextResponse)
 async def get_system_logs(
     last_n_lines: int = 200, # Default to last 200 lines
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Recupera as últimas N linhas do arquivo de log do sistema.
     Apenas superusuários podem acessar.
     """
-    log_file_path = "/app/logs/app.log" # Defined in app/config.py
+    log_file_path = settings.LOG_FILE
 
-    if not os.path.exists(log_file_path):
+    if not await run_in_threadpool(os.path.exists, log_file_path):
         raise HTTPException(status_code=404, detail="Arquivo de log não encontrado")
 
     try:
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            # Get the last N lines
-            recent_lines = lines[-last_n_lines:]
-            log_content = "".join(recent_lines)
-            
-            # Save to a temporary file for FileResponse
-            temp_log_path = f"/tmp/app_logs_{os.getpid()}.log"
-            with open(temp_log_path, "w", encoding="utf-8") as temp_f:
-                temp_f.write(log_content)
-            
-            return FileResponse(temp_log_path, media_type="text/plain", filename="app.log")
+        log_content = await run_in_threadpool(_tail_lines, log_file_path, last_n_lines)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao ler o arquivo de log: {e}")
 
-
-@router.post("/initial-superuser", response_model=User, status_code=status.HTTP_201_CREATED)
-async def create_initial_superuser(
-    user: UserCreate,
-    db: Session = Depends(get_db)
-):
-    """
-    Cria o primeiro superusuário no sistema.
-    Esta rota só funciona se não houver superusuários existentes.
-    """
-    existing_superusers = db.query(DBUser).filter(DBUser.is_superuser == True).count()
-    if existing_superusers > 0:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Já existe um superusuário. Esta rota é apenas para criação inicial."
-        )
-
-    existing_user_email = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if existing_user_email:
-        raise HTTPException(status_code=400, detail="Email já registrado")
-
-    existing_user_username = db.query(DBUser).filter(DBUser.username == user.username).first()
-    if existing_user_username:
-        raise HTTPException(status_code=400, detail="Username já em uso")
-
-    hashed_password = get_password_hash(user.password)
-    db_user = DBUser(
-        email=user.email,
-        username=user.username,
-        hashed_password=hashed_password,
-        is_superuser=True # Define como superusuário
+    return PlainTextResponse(
+        log_content,
+        headers={"Content-Disposition": 'attachment; filename="app.log"'},
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
 
-@router.get("/users", response_model=List[User])
-async def read_users(
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser), # Add this dependency
-    skip: int = 0,
-    limit: int = 100
+@router.get("/db-pool")
+async def get_db_pool_metrics(
+    current_superuser: Principal = Depends(get_current_active_superuser_async)
 ):
     """
-    Lista todos os usuários. Apenas superusuários podem acessar.
-    """
-    users = db.query(DBUser).offset(skip).limit(limit).all()
-    return users
-
-@router.get("/users/{user_id}", response_model=User)
-async def read_user(
-    user_id: int,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
-):
-    """
-    Obtém um usuário pelo ID. Apenas superusuários podem acessar.
-    """
-    user = db.query(DBUser).filter(DBUser.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    return user
-
-@router.put("/users/{user_id}", response_model=User)
-async def update_user(
-    user_id: int,
-    user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
-):
-    """
-    Atualiza informações de um usuário (incluindo status de superusuário). Apenas superusuários podem acessar.
-    """
-    db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
-
-    update_data = user_update.model_dump(exclude_unset=True)
-    
-    # Se a senha for atualizada, faça o hash
-    if "password" in update_data and update_data["password"]:
-        update_data["hashed_password"] = get_password_hash(update_data["password"])
-        del update_data["password"] # Remove a senha em texto claro
-
-    for key, value in update_data.items():
-        setattr(db_user, key, value)
-    
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
-
-@router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(
-    user_id: int,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
-):
-    """
-    Deleta um usuário pelo ID. Apenas superusuários podem acessar.
-    """
-    db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
-
-    if db_user.is_superuser:
-        # Impedir a exclusão do último superusuário para evitar bloqueio
-        existing_superusers = db.query(DBUser).filter(DBUser.is_superuser == True).count()
-        if existing_superusers == 1:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Não é possível deletar o último superusuário."
-            )
-
-    db.delete(db_user)
-    db.commit()
-    return {"message": "Usuário deletado com sucesso"}
-
-
-# ... (existing user management routes)
-
-# App Settings Management Routes
-@router.post("/settings/", response_model=AppSetting, status_code=status.HTTP_201_CREATED)
-async def create_app_setting(
-    setting: AppSettingCreate,
-    db: Session = Depends(get_db),
-    # current_superuser: DBUser = Depends(get_current_active_superuser) # Already set as router dependency
-):
-    """
-    Cria uma nova configuração de aplicativo.
-    """
-    db_setting = db.query(DBAppSetting).filter(DBAppSetting.key == setting.key).first()
-    if db_setting:
-        raise HTTPException(status_code=400, detail="Configuração com esta chave já existe")
-
-    db_setting = DBAppSetting(**setting.model_dump())
-    db.add(db_setting)
-    db.commit()
-    db.refresh(db_setting)
-    return db_setting
-
-@router.get("/settings/", response_model=List[AppSetting])
-async def read_app_settings(
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
-    # current_superuser: DBUser = Depends(get_current_active_superuser) # Already set as router dependency
-):
-    """
-    Lista todas as configurações do aplicativo.
-    """
-    settings = db.query(DBAppSetting).offset(skip).limit(limit).all()
-    return settings
-
-@router.get("/settings/{key}", response_model=AppSetting)
-async def read_app_setting(
-    key: str,
-    db: Session = Depends(get_db),
-    # current_superuser: DBUser = Depends(get_current_active_superuser) # Already set as router dependency
-):
-    """
-    Obtém uma configuração de aplicativo específica pela chave.
-    """
-    setting = db.query(DBAppSetting).filter(DBAppSetting.key == key).first()
-    if setting is None:
-        raise HTTPException(status_code=404, detail="Configuração não encontrada")
-    return setting
-
-@router.put("/settings/{key}", response_model=AppSetting)
-async def update_app_setting(
-    key: str,
-    setting_update: AppSettingUpdate,
-    db: Session = Depends(get_db),
-    # current_superuser: DBUser = Depends(get_current_active_superuser) # Already set as router dependency
-):
-    """
-    Atualiza uma configuração de aplicativo existente pela chave.
-    """
-    db_setting = db.query(DBAppSetting).filter(DBAppSetting.key == key).first()
-    if db_setting is None:
-        raise HTTPException(status_code=404, detail="Configuração não encontrada")
-
-    update_data = setting_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_setting, field, value)
-    
-    db.add(db_setting)
-    db.commit()
-    db.refresh(db_setting)
-    return db_setting
-
-@router.delete("/settings/{key}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_app_setting(
-    key: str,
-    db: Session = Depends(get_db),
-    # current_superuser: DBUser = Depends(get_current_active_superuser) # Already set as router dependency
-):
-    """
-    Deleta uma configuração de aplicativo pela chave.
+    Métricas dos pools de conexão (conexões em uso, overflow, esperas e latência de checkout).
+    Apenas superusuários podem acessar.
     """
-    db_setting = db.query(DBAppSetting).filter(DBAppSetting.key == key).first()
-    if db_setting is None:
-        raise HTTPException(status_code=404, detail="Configuração não encontrada")
+    return pool_metrics_snapshot()
 
-    db.delete(db_setting)
-    db.commit()
-    return {"message": "Configuração deletada com sucesso"}
 
 @router.post("/initial-superuser", response_model=User, status_code=status.HTTP_201_CREATED)
 async def create_initial_superuser(
     user: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cria o primeiro superusuário no sistema.
     Esta rota só funciona se não houver superusuários existentes.
     """
-    existing_superusers = db.query(DBUser).filter(DBUser.is_superuser == True).count()
-    if existing_superusers > 0:
+    if await _count_superusers(db) > 0:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Já existe um superusuário. Esta rota é apenas para criação inicial."
         )
 
-    existing_user_email = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if existing_user_email:
+    if await _get_user(db, email=user.email):
         raise HTTPException(status_code=400, detail="Email já registrado")
 
-    existing_user_username = db.query(DBUser).filter(DBUser.username == user.username).first()
-    if existing_user_username:
+    if await _get_user(db, username=user.username):
         raise HTTPException(status_code=400, detail="Username já em uso")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = DBUser(
         email=user.email,
         username=user.username,
@@ -377,33 +223,38 @@ async def create_initial_superuser(
         is_superuser=True # Define como superusuário
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    await db.commit()
+    return await _get_user_with_relations(db, db_user.id)
 
-@router.get("/users", response_model=List[User])
+@router.get("/users", response_model=List[User] | Page[User])
 async def read_users(
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser), # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async), # Add this dependency
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: str | None = None,
 ):
     """
     Lista todos os usuários. Apenas superusuários podem acessar.
+    Com `cursor` (vazio na primeira página), pagina por id e devolve {items, next_cursor}.
     """
-    users = db.query(DBUser).offset(skip).limit(limit).all()
-    return users
+    statement = select(DBUser).options(selectinload(DBUser.projects), selectinload(DBUser.clients))
+    if cursor is None:
+        result = await db.execute(statement.offset(skip).limit(limit))
+        return result.scalars().all()
+    result = await db.execute(keyset_query(statement, DBUser.id, DBUser.id, cursor, limit))
+    return page_from_rows(result.scalars().all(), limit, "id")
 
 @router.get("/users/{user_id}", response_model=User)
 async def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Obtém um usuário pelo ID. Apenas superusuários podem acessar.
     """
-    user = db.query(DBUser).filter(DBUser.id == user_id).first()
+    user = await _get_user_with_relations(db, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return user
@@ -412,53 +263,59 @@ async def read_user(
 async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Atualiza informações de um usuário (incluindo status de superusuário). Apenas superusuários podem acessar.
     """
-    db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
+    db_user = await db.get(DBUser, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
     update_data = user_update.model_dump(exclude_unset=True)
-    
+
     # Se a senha for atualizada, faça o hash
     if "password" in update_data and update_data["password"]:
-        update_data["hashed_password"] = get_password_hash(update_data["password"])
+        update_data["hashed_password"] = await get_password_hash_async(update_data["password"])
         del update_data["password"] # Remove a senha em texto claro
 
+    previous_username = db_user.username
     for key, value in update_data.items():
         setattr(db_user, key, value)
-    
+
+    # Mudanças de credencial ou privilégio revogam os tokens já emitidos
+    if {"hashed_password", "is_superuser", "username"} & update_data.keys():
+        revoke_user_tokens(db_user)
+
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    await db.commit()
+    invalidate_principal(previous_username, db_user.username, user_id=db_user.id)
+    return await _get_user_with_relations(db, db_user.id)
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_superuser: DBUser = Depends(get_current_active_superuser) # Add this dependency
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async) # Add this dependency
 ):
     """
     Deleta um usuário pelo ID. Apenas superusuários podem acessar.
     """
-    db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
+    db_user = await db.get(DBUser, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
     if db_user.is_superuser:
         # Impedir a exclusão do último superusuário para evitar bloqueio
-        existing_superusers = db.query(DBUser).filter(DBUser.is_superuser == True).count()
-        if existing_superusers == 1:
+        if await _count_superusers(db) == 1:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Não é possível deletar o último superusuário."
             )
 
-    db.delete(db_user)
-    db.commit()
-    return {"message": "Usuário deletado com sucesso"}
\ No newline at end of file
+    deleted_username, deleted_id = db_user.username, db_user.id
+    await db.delete(db_user)
+    await db.commit()
+    invalidate_principal(deleted_username, user_id=deleted_id)
+    return {"message": "Usuário deletado com sucesso"}
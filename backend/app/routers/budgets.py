@@ -1,82 +1,165 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Budget as DBBudget, Client as DBClient, User as DBUser
-from app.schemas import Budget, BudgetCreate, BudgetUpdate
-from app.auth import get_current_user
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, get_read_db
+from app.models import Budget as DBBudget, BudgetItem as DBBudgetItem, Client as DBClient
+from app.pagination import keyset_query, page_from_rows
+from app.schemas import Page, Budget, BudgetCreate, BudgetItem, BudgetItemBase, BudgetSummary, BudgetUpdate
+from app.auth import Principal, get_current_principal_async
 
 router = APIRouter(
     prefix="/orcamentos",
     tags=["Orçamentos"]
 )
 
+async def _get_owned_budget(db: AsyncSession, budget_id: int, owner_id: int):
+    result = await db.execute(select(DBBudget).filter(DBBudget.id == budget_id, DBBudget.owner_id == owner_id))
+    return result.scalars().first()
+
+async def _store_items(db: AsyncSession, budget: DBBudget, items: list[BudgetItemBase], total: Decimal | None):
+    """
+    Grava os itens nas duas formas (JSON para leitura, budget_items para consultas)
+    e recalcula o total: soma dos itens com preço ou, se nenhum tiver, o total informado.
+    """
+    rows = []
+    for item in items:
+        line_total = None
+        if item.unit_price is not None:
+            line_total = (item.quantity * item.unit_price).quantize(Decimal("0.01"))
+        rows.append({**item.model_dump(), "line_total": line_total})
+
+    priced = [row["line_total"] for row in rows if row["line_total"] is not None]
+    budget.total = sum(priced, Decimal(0)) if priced else total
+    budget.items = [BudgetItem(**row).model_dump(mode="json") for row in rows]
+
+    if budget.id is None:
+        db.add(budget)
+        await db.flush()
+    else:
+        await db.execute(delete(DBBudgetItem).filter(DBBudgetItem.budget_id == budget.id))
+    db.add_all(DBBudgetItem(budget_id=budget.id, position=position, **row) for position, row in enumerate(rows))
+
+def _filter_budgets(statement, owner_id: int, budget_status: str | None, client_id: int | None, product: str | None):
+    statement = statement.filter(DBBudget.owner_id == owner_id)
+    if budget_status is not None:
+        statement = statement.filter(DBBudget.status == budget_status)
+    if client_id is not None:
+        statement = statement.filter(DBBudget.client_id == client_id)
+    if product:
+        statement = statement.filter(
+            exists().where(DBBudgetItem.budget_id == DBBudget.id, DBBudgetItem.product.ilike(f"%{product}%"))
+        )
+    return statement
+
 @router.post("/", response_model=Budget)
-def create_budget(
+async def create_budget(
     budget: BudgetCreate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    client = db.query(DBClient).filter(DBClient.id == budget.client_id).first()
+    client = await db.get(DBClient, budget.client_id)
     if not client or client.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Client not found or not authorized")
 
-    db_budget = DBBudget(**budget.model_dump())
-    db.add(db_budget)
-    db.commit()
-    db.refresh(db_budget)
+    db_budget = DBBudget(**budget.model_dump(exclude={"items", "total"}), owner_id=client.owner_id)
+    await _store_items(db, db_budget, budget.items, budget.total)
+    await db.commit()
+    await db.refresh(db_budget)
     return db_budget
 
-@router.get("/", response_model=list[Budget])
-def read_budgets(
+@router.get("/", response_model=list[Budget] | Page[Budget])
+async def read_budgets(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    cursor: str | None = None,
+    budget_status: str | None = Query(None, alias="status"),
+    client_id: int | None = None,
+    product: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    budgets = db.query(DBBudget).join(DBClient).filter(DBClient.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return budgets
+    """
+    Sem `cursor`, mantém a paginação antiga por skip/limit e devolve uma lista.
+    Com `cursor` (vazio na primeira página), pagina por keyset e devolve {items, next_cursor}.
+    Filtros opcionais por status, cliente e produto (trecho do nome, em qualquer item).
+    """
+    statement = _filter_budgets(select(DBBudget), current_user.id, budget_status, client_id, product)
+    if cursor is None:
+        result = await db.execute(statement.offset(skip).limit(limit))
+        return result.scalars().all()
+    result = await db.execute(keyset_query(statement, DBBudget.created_at, DBBudget.id, cursor, limit))
+    return page_from_rows(result.scalars().all(), limit, "created_at")
+
+@router.get("/resumo", response_model=list[BudgetSummary])
+async def summarize_budgets(
+    budget_status: str | None = Query(None, alias="status"),
+    client_id: int | None = None,
+    product: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Quantidade e soma dos orçamentos por status, com os mesmos filtros da listagem.
+    """
+    statement = _filter_budgets(
+        select(DBBudget.status, func.count(DBBudget.id).label("count"), func.coalesce(func.sum(DBBudget.total), 0).label("total")),
+        current_user.id, budget_status, client_id, product,
+    ).group_by(DBBudget.status).order_by(DBBudget.status)
+    result = await db.execute(statement)
+    return [BudgetSummary(status=row.status, count=row.count, total=row.total) for row in result]
 
 @router.get("/{budget_id}", response_model=Budget)
-def read_budget(
+async def read_budget(
     budget_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    budget = db.query(DBBudget).join(DBClient).filter(DBBudget.id == budget_id).filter(DBClient.owner_id == current_user.id).first()
+    budget = await _get_owned_budget(db, budget_id, current_user.id)
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
     return budget
 
 @router.put("/{budget_id}", response_model=Budget)
-def update_budget(
+async def update_budget(
     budget_id: int,
     budget_update: BudgetUpdate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    budget = db.query(DBBudget).join(DBClient).filter(DBBudget.id == budget_id).filter(DBClient.owner_id == current_user.id).first()
+    budget = await _get_owned_budget(db, budget_id, current_user.id)
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    
-    update_data = budget_update.model_dump(exclude_unset=True)
+
+    update_data = budget_update.model_dump(exclude_unset=True, exclude={"items", "total"})
     for key, value in update_data.items():
         setattr(budget, key, value)
 
+    # Itens ou total alterados: regrava os itens e recalcula o total
+    fields_set = budget_update.model_fields_set
+    if {"items", "total"} & fields_set:
+        items = budget_update.items if "items" in fields_set else [BudgetItemBase.model_validate(i) for i in budget.items]
+        total = budget_update.total if "total" in fields_set else budget.total
+        await _store_items(db, budget, items, total)
+
     db.add(budget)
-    db.commit()
-    db.refresh(budget)
+    await db.commit()
+    await db.refresh(budget)
     return budget
 
 @router.delete("/{budget_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_budget(
+async def delete_budget(
     budget_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    budget = db.query(DBBudget).join(DBClient).filter(DBBudget.id == budget_id).filter(DBClient.owner_id == current_user.id).first()
+    budget = await _get_owned_budget(db, budget_id, current_user.id)
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
-    
-    db.delete(budget)
-    db.commit()
+
+    # Sem depender de ON DELETE CASCADE (o SQLite só aplica com foreign_keys ligado)
+    await db.execute(delete(DBBudgetItem).filter(DBBudgetItem.budget_id == budget.id))
+    await db.delete(budget)
+    await db.commit()
     return None
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Client as DBClient, User as DBUser
-from app.schemas import Client, ClientCreate, ClientUpdate
-from app.auth import get_current_user
+from typing import Any
+
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, File, HTTPException, Query, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import client_import, client_search
+from app.bulk import bulk_create, validate_items
+from app.database import get_async_db, get_read_db
+from app.models import Client as DBClient, ImportJob as DBImportJob
+from app.pagination import keyset_query, page_from_rows
+from app.schemas import BulkResult, ImportJob, Page, Client, ClientCreate, ClientUpdate
+from app.auth import Principal, get_current_principal_async
 
 router = APIRouter(
     prefix="/clientes",
@@ -11,34 +17,104 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=Client)
-def create_client(
+async def create_client(
     client: ClientCreate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     db_client = DBClient(**client.model_dump(), owner_id=current_user.id)
     db.add(db_client)
-    db.commit()
-    db.refresh(db_client)
+    await db.commit()
+    await db.refresh(db_client)
     return db_client
 
-@router.get("/", response_model=list[Client])
-def read_clients(
+@router.post("/bulk", response_model=BulkResult[Client])
+async def create_clients_bulk(
+    items: list[Any] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Cria vários clientes de uma vez. Itens inválidos voltam em `errors` (com a posição
+    no lote) e não impedem a gravação dos demais.
+    """
+    valid, errors = validate_items(items, ClientCreate)
+    rows = [(index, {**client.model_dump(), "owner_id": current_user.id}) for index, client in valid]
+    return await bulk_create(db, DBClient, Client, rows, errors)
+
+@router.post("/importar", response_model=ImportJob, status_code=status.HTTP_202_ACCEPTED)
+async def import_clients(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Importa clientes de uma planilha CSV ou XLSX (colunas nome, telefone, email,
+    endereço, cpf/cnpj). O arquivo é processado em segundo plano; acompanhe o
+    progresso e os erros por linha em GET /clientes/importacoes/{job_id}.
+    """
+    kind = client_import.file_kind(file)
+    path = await client_import.save_upload(file, kind)
+    job = DBImportJob(owner_id=current_user.id, filename=file.filename, status="pending")
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    background_tasks.add_task(client_import.run_import, job.id, path, kind)
+    return job
+
+@router.get("/importacoes/{job_id}", response_model=ImportJob)
+async def read_import_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    result = await db.execute(select(DBImportJob).filter(DBImportJob.id == job_id, DBImportJob.owner_id == current_user.id))
+    job = result.scalars().first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.get("/busca", response_model=list[Client])
+async def search_clients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Busca por trecho do nome, e-mail, telefone ou CPF/CNPJ, sem diferenciar acentos
+    e maiúsculas. Quem começa pelos dígitos digitados (telefone, CPF/CNPJ) vem primeiro,
+    depois quem começa pelo nome; ver app/client_search.py.
+    """
+    return await client_search.search_clients(db, current_user.id, q, limit)
+
+@router.get("/", response_model=list[Client] | Page[Client])
+async def read_clients(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    clients = db.query(DBClient).filter(DBClient.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return clients
+    """
+    Sem `cursor`, mantém a paginação antiga por skip/limit e devolve uma lista.
+    Com `cursor` (vazio na primeira página), pagina por keyset e devolve {items, next_cursor}.
+    """
+    statement = select(DBClient).filter(DBClient.owner_id == current_user.id)
+    if cursor is None:
+        result = await db.execute(statement.offset(skip).limit(limit))
+        return result.scalars().all()
+    result = await db.execute(keyset_query(statement, DBClient.created_at, DBClient.id, cursor, limit))
+    return page_from_rows(result.scalars().all(), limit, "created_at")
 
 @router.get("/{client_id}", response_model=Client)
-def read_client(
+async def read_client(
     client_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    client = db.query(DBClient).filter(DBClient.id == client_id).first()
+    client = await db.get(DBClient, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     if client.owner_id != current_user.id:
@@ -46,39 +122,39 @@ def read_client(
     return client
 
 @router.put("/{client_id}", response_model=Client)
-def update_client(
+async def update_client(
     client_id: int,
     client_update: ClientUpdate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    client = db.query(DBClient).filter(DBClient.id == client_id).first()
+    client = await db.get(DBClient, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     if client.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    
+
     update_data = client_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(client, key, value)
-    
+
     db.add(client)
-    db.commit()
-    db.refresh(client)
+    await db.commit()
+    await db.refresh(client)
     return client
 
 @router.delete("/{client_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_client(
+async def delete_client(
     client_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    client = db.query(DBClient).filter(DBClient.id == client_id).first()
+    client = await db.get(DBClient, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     if client.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    
-    db.delete(client)
-    db.commit()
+
+    await db.delete(client)
+    await db.commit()
     return None
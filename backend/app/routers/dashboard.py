@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_read_db
+from app.models import TenantMonthlyStats as DBTenantMonthlyStats, month_of
+from app.schemas import Dashboard, DashboardMonth
+from app.auth import Principal, get_current_principal_async
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["Dashboard"]
+)
+
+def _previous_months(current, count: int) -> list:
+    months = [current]
+    while len(months) < count:
+        month = months[-1]
+        months.append(month.replace(year=month.year - 1, month=12) if month.month == 1 else month.replace(month=month.month - 1))
+    return months[::-1]
+
+@router.get("/", response_model=Dashboard)
+async def read_dashboard(
+    months: int = Query(12, ge=1, le=120),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Totais de clientes e piscinas e a série mensal (serviços, faturamento, orçamentos)
+    dos últimos `months` meses, lidos de tenant_monthly_stats: uma linha por mês com
+    movimento, sem varrer services/budgets.
+    """
+    result = await db.execute(
+        select(DBTenantMonthlyStats).filter(DBTenantMonthlyStats.owner_id == current_user.id)
+    )
+    rows = {row.month: row for row in result.scalars().all()}
+    series = [
+        DashboardMonth.model_validate(rows[month]) if month in rows else DashboardMonth(month=month)
+        for month in _previous_months(month_of(datetime.now(timezone.utc)), months)
+    ]
+    return Dashboard(
+        clients=sum(row.clients_added for row in rows.values()),
+        pools=sum(row.pools_added for row in rows.values()),
+        months=series,
+    )
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, get_read_db
+from app.dosing import CATALOG_KEY, catalog_adapter, check_catalog, dosing_sheet, load_catalog
+from app.models import AppSetting as DBAppSetting
+from app.schemas import DosingProduct, DosingSheet
+from app.auth import Principal, get_current_active_superuser_async, get_current_principal_async
+
+router = APIRouter(
+    prefix="/dosagem",
+    tags=["Dosagem"]
+)
+
+@router.get("/", response_model=DosingSheet)
+async def read_dosing_sheet(
+    pool_id: list[int] | None = Query(None),
+    include_ok: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Folha de dosagem do dia: produtos e quantidades para cada piscina, calculados pelo
+    volume e pela última leitura de pH, cloro e alcalinidade (ver app/dosing.py).
+    Por padrão só aparecem piscinas com dose ou aviso; `include_ok=true` lista todas.
+    `pool_id` (repetível) restringe às piscinas da rota.
+    """
+    return await dosing_sheet(db, current_user.id, pool_id, include_ok)
+
+@router.get("/catalogo", response_model=list[DosingProduct])
+async def read_dosing_catalog(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Produtos usados no cálculo, na ordem de preferência.
+    """
+    return await load_catalog(db)
+
+@router.put("/catalogo", response_model=list[DosingProduct])
+async def update_dosing_catalog(
+    products: list[DosingProduct],
+    db: AsyncSession = Depends(get_async_db),
+    current_superuser: Principal = Depends(get_current_active_superuser_async)
+):
+    """
+    Substitui o catálogo de produtos (gravado em AppSetting "dosing_catalog").
+    """
+    try:
+        check_catalog(products)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    value = catalog_adapter.dump_json(products).decode()
+
+    setting = (await db.execute(select(DBAppSetting).filter(DBAppSetting.key == CATALOG_KEY))).scalars().first()
+    if setting is None:
+        db.add(DBAppSetting(key=CATALOG_KEY, value=value))
+    else:
+        setting.value = value
+    await db.commit()
+    return products
@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.auth import Principal, get_current_principal_async
+from app.config import settings
+from app.database import get_replica_router, request_subject, wrote_recently
+from app.models import Budget as DBBudget, Client as DBClient, Pool as DBPool, Service as DBService
+from app.parsing import format_duration
+
+# Exportações completas (CSV ou NDJSON) para contabilidade. As linhas vêm do banco
+# por cursor no servidor (stream + yield_per), como tuplas de colunas, sem montar
+# objetos ORM nem modelos Pydantic, e são escritas na resposta bloco a bloco: a
+# memória não cresce com o tamanho da exportação. A sessão é aberta dentro do
+# gerador, porque a resposta continua sendo enviada depois que a rota retorna.
+
+router = APIRouter(
+    prefix="/exportar",
+    tags=["Exportação"]
+)
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+def _accepts_gzip(request: Request) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def _csv_value(value):
+    if isinstance(value, timedelta):
+        return format_duration(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _json_default(value):
+    if isinstance(value, timedelta):
+        return format_duration(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value) # Como na API: sem perder precisão
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+def _encode_rows(rows, columns: list[str], export_format: str, header: bool = False) -> bytes:
+    if export_format == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n" for row in rows
+        ).encode()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        buffer.write("\ufeff") # BOM: o Excel reconhece o UTF-8 e os acentos
+        writer.writerow(columns)
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+async def _stream_export(statement, export_format: str, subject: str | None, recent_write: bool, compress: bool):
+    columns = [column.name for column in statement.selected_columns]
+    compressor = zlib.compressobj(wbits=31) if compress else None # wbits=31: formato gzip
+
+    def output(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    db = await get_replica_router().open_read_session(subject, recent_write)
+    try:
+        result = await db.stream(statement.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        if export_format == "csv":
+            yield output(_encode_rows([], columns, export_format, header=True))
+        async for rows in result.partitions():
+            chunk = output(_encode_rows(rows, columns, export_format))
+            if chunk:
+                yield chunk
+    finally:
+        await db.close()
+    if compressor:
+        yield compressor.flush()
+
+def _export_response(request: Request, statement, export_format: str, name: str) -> StreamingResponse:
+    compress = _accepts_gzip(request)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{export_format}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _stream_export(statement, export_format, request_subject(request), wrote_recently(request), compress),
+        media_type=MEDIA_TYPES[export_format],
+        headers=headers,
+    )
+
+def _date_range(statement, column, start_date: date | None, end_date: date | None):
+    # Datas inclusivas (em UTC): end_date=2024-12-31 inclui o dia 31 inteiro
+    if start_date is not None:
+        statement = statement.filter(column >= datetime.combine(start_date, time.min, timezone.utc))
+    if end_date is not None:
+        statement = statement.filter(column < datetime.combine(end_date + timedelta(days=1), time.min, timezone.utc))
+    return statement
+
+@router.get("/servicos")
+async def export_services(
+    request: Request,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    start_date: date | None = None,
+    end_date: date | None = None,
+    pool_id: int | None = None,
+    client_id: int | None = None,
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Todos os serviços do usuário, em ordem de data, com cliente e piscina.
+    Filtros opcionais por período (datas inclusivas), piscina e cliente.
+    A saída é comprimida com gzip quando o cliente aceita (Accept-Encoding).
+    """
+    statement = (
+        select(
+            DBService.id, DBService.date, DBPool.client_id, DBClient.name.label("client_name"), DBService.pool_id,
+            DBService.service_type, DBService.description, DBService.value, DBService.time_spent,
+            DBService.ph, DBService.chlorine, DBService.alkalinity, DBService.remarks,
+        )
+        .join(DBPool, DBPool.id == DBService.pool_id)
+        .join(DBClient, DBClient.id == DBPool.client_id)
+        .filter(DBService.owner_id == current_user.id)
+        .order_by(DBService.date, DBService.id)
+    )
+    statement = _date_range(statement, DBService.date, start_date, end_date)
+    if pool_id is not None:
+        statement = statement.filter(DBService.pool_id == pool_id)
+    if client_id is not None:
+        statement = statement.filter(DBPool.client_id == client_id)
+    return _export_response(request, statement, export_format, "servicos")
+
+@router.get("/clientes")
+async def export_clients(
+    request: Request,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    start_date: date | None = None,
+    end_date: date | None = None,
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Todos os clientes do usuário; o período, se informado, filtra pela data de cadastro.
+    """
+    statement = (
+        select(
+            DBClient.id, DBClient.name, DBClient.phone, DBClient.email, DBClient.address,
+            DBClient.cpf_cnpj, DBClient.is_active, DBClient.created_at,
+        )
+        .filter(DBClient.owner_id == current_user.id)
+        .order_by(DBClient.id)
+    )
+    statement = _date_range(statement, DBClient.created_at, start_date, end_date)
+    return _export_response(request, statement, export_format, "clientes")
+
+@router.get("/orcamentos")
+async def export_budgets(
+    request: Request,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    start_date: date | None = None,
+    end_date: date | None = None,
+    client_id: int | None = None,
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Todos os orçamentos do usuário, em ordem de data, com os itens (JSON) e o total.
+    Filtros opcionais por período (datas inclusivas) e cliente.
+    """
+    statement = (
+        select(
+            DBBudget.id, DBBudget.date, DBBudget.client_id, DBClient.name.label("client_name"),
+            DBBudget.status, DBBudget.total, DBBudget.validity, DBBudget.items,
+        )
+        .join(DBClient, DBClient.id == DBBudget.client_id)
+        .filter(DBBudget.owner_id == current_user.id)
+        .order_by(DBBudget.date, DBBudget.id)
+    )
+    statement = _date_range(statement, DBBudget.date, start_date, end_date)
+    if client_id is not None:
+        statement = statement.filter(DBBudget.client_id == client_id)
+    return _export_response(request, statement, export_format, "orcamentos")
@@ -1,86 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Pool as DBPool, Client as DBClient, User as DBUser
-from app.schemas import Pool, PoolCreate, PoolUpdate
-from app.auth import get_current_user
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.bulk import bulk_create, validate_items
+from app.chemistry import invalidate_pool_trends, pool_trends, pools_needing_attention
+from app.database import get_async_db, get_read_db
+from app.models import Pool as DBPool, Client as DBClient
+from app.schemas import BulkError, BulkResult, Pool, PoolCreate, PoolTrends, PoolUpdate
+from app.auth import Principal, get_current_principal_async
 
 router = APIRouter(
     prefix="/piscinas",
     tags=["Piscinas"]
 )
 
+async def _get_owned_pool(db: AsyncSession, pool_id: int, owner_id: int):
+    result = await db.execute(select(DBPool).filter(DBPool.id == pool_id, DBPool.owner_id == owner_id))
+    return result.scalars().first()
+
 @router.post("/", response_model=Pool)
-def create_pool(
+async def create_pool(
     pool: PoolCreate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     # Verify if client belongs to user
-    client = db.query(DBClient).filter(DBClient.id == pool.client_id).first()
+    client = await db.get(DBClient, pool.client_id)
     if not client or client.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Client not found or not authorized")
 
-    db_pool = DBPool(**pool.model_dump())
+    db_pool = DBPool(**pool.model_dump(), owner_id=client.owner_id)
     db.add(db_pool)
-    db.commit()
-    db.refresh(db_pool)
+    await db.commit()
+    await db.refresh(db_pool)
     return db_pool
 
+@router.post("/bulk", response_model=BulkResult[Pool])
+async def create_pools_bulk(
+    items: list[Any] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Cria várias piscinas de uma vez. A posse de todos os clientes citados é conferida
+    numa única consulta; itens inválidos ou de clientes alheios voltam em `errors`.
+    """
+    valid, errors = validate_items(items, PoolCreate)
+    result = await db.execute(
+        select(DBClient.id).filter(
+            DBClient.id.in_({pool.client_id for _, pool in valid}), DBClient.owner_id == current_user.id
+        )
+    )
+    owned = set(result.scalars().all())
+    rows = []
+    for index, pool in valid:
+        if pool.client_id in owned:
+            rows.append((index, {**pool.model_dump(), "owner_id": current_user.id}))
+        else:
+            errors.append(BulkError(index=index, detail="Client not found or not authorized"))
+    return await bulk_create(db, DBPool, Pool, rows, errors)
+
 @router.get("/cliente/{client_id}", response_model=list[Pool])
-def read_pools_by_client(
+async def read_pools_by_client(
     client_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    client = db.query(DBClient).filter(DBClient.id == client_id).first()
+    client = await db.get(DBClient, client_id)
     if not client or client.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Client not found or not authorized")
-        
-    pools = db.query(DBPool).filter(DBPool.client_id == client_id).all()
-    return pools
+
+    result = await db.execute(
+        select(DBPool).filter(DBPool.client_id == client_id, DBPool.owner_id == current_user.id)
+    )
+    return result.scalars().all()
+
+# Declarada antes de /{pool_id} para "atencao" não ser lido como id
+@router.get("/atencao", response_model=list[PoolTrends])
+async def read_pools_needing_attention(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Piscinas com pH, cloro ou alcalinidade fora da faixa ideal (na última visita ou
+    em visitas seguidas) ou com tendência de sair dela nas próximas semanas.
+    Calculado para todas as piscinas do usuário de uma vez (app/chemistry.py).
+    """
+    return await pools_needing_attention(db, current_user.id)
+
+@router.get("/{pool_id}/tendencias", response_model=PoolTrends)
+async def read_pool_trends(
+    pool_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Leituras da piscina com médias móveis, inclinação por semana, sequência atual
+    fora da faixa e motivos de atenção.
+    """
+    pool = await _get_owned_pool(db, pool_id, current_user.id)
+    if not pool:
+        raise HTTPException(status_code=404, detail="Pool not found")
+    return await pool_trends(db, current_user.id, pool_id)
 
 @router.get("/{pool_id}", response_model=Pool)
-def read_pool(
+async def read_pool(
     pool_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    pool = db.query(DBPool).join(DBClient).filter(DBPool.id == pool_id).filter(DBClient.owner_id == current_user.id).first()
+    pool = await _get_owned_pool(db, pool_id, current_user.id)
     if not pool:
         raise HTTPException(status_code=404, detail="Pool not found")
     return pool
 
 @router.put("/{pool_id}", response_model=Pool)
-def update_pool(
+async def update_pool(
     pool_id: int,
     pool_update: PoolUpdate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    pool = db.query(DBPool).join(DBClient).filter(DBPool.id == pool_id).filter(DBClient.owner_id == current_user.id).first()
+    pool = await _get_owned_pool(db, pool_id, current_user.id)
     if not pool:
         raise HTTPException(status_code=404, detail="Pool not found")
-    
+
     update_data = pool_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(pool, key, value)
-    
+
     db.add(pool)
-    db.commit()
-    db.refresh(pool)
+    await db.commit()
+    await db.refresh(pool)
     return pool
 
 @router.delete("/{pool_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_pool(
+async def delete_pool(
     pool_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    pool = db.query(DBPool).join(DBClient).filter(DBPool.id == pool_id).filter(DBClient.owner_id == current_user.id).first()
+    pool = await _get_owned_pool(db, pool_id, current_user.id)
     if not pool:
         raise HTTPException(status_code=404, detail="Pool not found")
-    
-    db.delete(pool)
-    db.commit()
+
+    await db.delete(pool)
+    await db.commit()
+    await invalidate_pool_trends(db, current_user.id)
     return None
@@ -1,74 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Service as DBService, Pool as DBPool, Client as DBClient, User as DBUser
-from app.schemas import Service, ServiceCreate, ServiceUpdate
-from app.auth import get_current_user
+from datetime import datetime, timezone
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.bulk import bulk_create, validate_items
+from app.chemistry import invalidate_pool_trends
+from app.database import get_async_db, get_read_db
+from app.models import Service as DBService, Pool as DBPool
+from app.pagination import keyset_query, page_from_rows
+from app.schemas import BulkError, BulkResult, Page, Service, ServiceCreate, ServiceUpdate
+from app.auth import Principal, get_current_principal_async
 
 router = APIRouter(
     prefix="/servicos",
     tags=["Serviços"]
 )
 
+async def _get_owned_service(db: AsyncSession, service_id: int, owner_id: int):
+    result = await db.execute(select(DBService).filter(DBService.id == service_id, DBService.owner_id == owner_id))
+    return result.scalars().first()
+
 @router.post("/", response_model=Service)
-def create_service(
+async def create_service(
     service: ServiceCreate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    # Verify permissions (Pool -> Client -> User)
-    pool = db.query(DBPool).join(DBClient).filter(DBPool.id == service.pool_id).filter(DBClient.owner_id == current_user.id).first()
+    # Verify permissions (Pool -> User)
+    result = await db.execute(select(DBPool).filter(DBPool.id == service.pool_id, DBPool.owner_id == current_user.id))
+    pool = result.scalars().first()
     if not pool:
         raise HTTPException(status_code=404, detail="Pool not found or not authorized")
 
-    db_service = DBService(**service.model_dump())
+    service_data = service.model_dump()
+    if service_data["date"] is None:
+        del service_data["date"] # Deixa o banco preencher com a data atual (chave da paginação)
+    db_service = DBService(**service_data, owner_id=pool.owner_id)
     db.add(db_service)
-    db.commit()
-    db.refresh(db_service)
+    await db.commit()
+    await db.refresh(db_service)
+    await invalidate_pool_trends(db, pool.owner_id)
     return db_service
 
-@router.get("/", response_model=list[Service])
-def read_services(
+@router.post("/bulk", response_model=BulkResult[Service])
+async def create_services_bulk(
+    items: list[Any] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Registra vários serviços de uma vez. A posse de todas as piscinas citadas é conferida
+    numa única consulta; itens inválidos ou de piscinas alheias voltam em `errors`.
+    """
+    valid, errors = validate_items(items, ServiceCreate)
+    result = await db.execute(
+        select(DBPool.id).filter(
+            DBPool.id.in_({service.pool_id for _, service in valid}), DBPool.owner_id == current_user.id
+        )
+    )
+    owned = set(result.scalars().all())
+    now = datetime.now(timezone.utc) # Todas as linhas de um INSERT precisam das mesmas colunas
+    rows = []
+    for index, service in valid:
+        if service.pool_id in owned:
+            rows.append((index, {**service.model_dump(), "date": service.date or now, "owner_id": current_user.id}))
+        else:
+            errors.append(BulkError(index=index, detail="Pool not found or not authorized"))
+    result = await bulk_create(db, DBService, Service, rows, errors)
+    if result.created:
+        await invalidate_pool_trends(db, current_user.id)
+    return result
+
+@router.get("/", response_model=list[Service] | Page[Service])
+async def read_services(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    # Get all services regarding any pool owned by any client owned by the user
-    services = db.query(DBService).join(DBPool).join(DBClient).filter(DBClient.owner_id == current_user.id).offset(skip).limit(limit).all()
-    services = db.query(DBService).join(DBPool).join(DBClient).filter(DBClient.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return services
+    """
+    Sem `cursor`, mantém a paginação antiga por skip/limit e devolve uma lista.
+    Com `cursor` (vazio na primeira página), pagina do serviço mais recente para o
+    mais antigo por (date, id) e devolve {items, next_cursor}.
+    """
+    # Get all services regarding any pool owned by the user
+    statement = select(DBService).filter(DBService.owner_id == current_user.id)
+    if cursor is None:
+        result = await db.execute(statement.offset(skip).limit(limit))
+        return result.scalars().all()
+    result = await db.execute(
+        keyset_query(statement, DBService.date, DBService.id, cursor, limit, descending=True)
+    )
+    return page_from_rows(result.scalars().all(), limit, "date")
 
 @router.put("/{service_id}", response_model=Service)
-def update_service(
+async def update_service(
     service_id: int,
     service_update: ServiceUpdate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    service = db.query(DBService).join(DBPool).join(DBClient).filter(DBService.id == service_id).filter(DBClient.owner_id == current_user.id).first()
+    service = await _get_owned_service(db, service_id, current_user.id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    
+
     update_data = service_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(service, key, value)
 
     db.add(service)
-    db.commit()
-    db.refresh(service)
+    await db.commit()
+    await db.refresh(service)
+    await invalidate_pool_trends(db, current_user.id)
     return service
 
 @router.delete("/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_service(
+async def delete_service(
     service_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
-    service = db.query(DBService).join(DBPool).join(DBClient).filter(DBService.id == service_id).filter(DBClient.owner_id == current_user.id).first()
+    service = await _get_owned_service(db, service_id, current_user.id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    
-    db.delete(service)
-    db.commit()
+
+    await db.delete(service)
+    await db.commit()
+    await invalidate_pool_trends(db, current_user.id)
     return None
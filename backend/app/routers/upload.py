@@ -1,65 +1,116 @@
-import shutil
-import os
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-from fastapi.responses import JSONResponse
-from typing import List
-import uuid
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import images
+from app.auth import Principal, get_current_principal_async
+from app.database import get_async_db
+from app.storage import get_storage
+from app.uploads import STORED_NAME, receive_file, release, store
 
 router = APIRouter()
 
-UPLOAD_DIR = "backend/static/uploads"
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-ALLOWED_EXTENSIONS = {"image/jpeg", "image/png", "image/webp"}
+ALLOWED_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# O corpo é lido em streaming (app/uploads.py), então o formulário é descrito à mão
+_UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
 
-@router.post("/upload", tags=["Upload"])
-async def upload_file(file: UploadFile = File(...)):
+@router.post("/upload", tags=["Upload"], openapi_extra=_UPLOAD_FORM)
+async def upload_file(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
     """
     Upload an image file.
     Validates file type (JPEG, PNG, WEBP) and size (max 5MB).
-    Returns the URL of the uploaded file.
+    Returns the URL of the uploaded file and its SHA-256, which identifies the
+    content: the same bytes sent again return the same file, without using more disk.
     """
-    
-    # Validate file type
-    if file.content_type not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WEBP are allowed."
-        )
-
-    # Validate file size (approximate, as we read chunks)
-    # Note: For precise size validation before saving, we might need to read into memory 
-    # or check Content-Length header (which can be spoofed). 
-    # Here we'll read and check size.
-    
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File too large. Maximum size is 5MB."
-        )
-
-    # Generate unique filename
-    file_extension = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    # Tipo e tamanho conferidos durante a leitura: acima de 5MB a leitura para na hora,
+    # sem receber o resto do corpo
+    storage = get_storage()
+    received = await receive_file(
+        request,
+        storage.staging_dir,
+        allowed_types=set(ALLOWED_EXTENSIONS),
+        max_size=MAX_FILE_SIZE,
+        too_large_detail="File too large. Maximum size is 5MB.",
+        invalid_type_detail="Invalid file type. Only JPEG, PNG, and WEBP are allowed.",
+    )
 
+    # Nome pelo conteúdo (<sha256>.<ext>); a extensão segue o tipo validado, não o nome enviado
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        unique_filename, created = await store(db, received, storage, ALLOWED_EXTENSIONS[received.content_type], current_user.id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Could not save file: {str(e)}"
         )
 
-    # Construct public URL (assuming local serving for now)
-    # In production with S3/R2, this would be the cloud URL
-    file_url = f"/static/uploads/{unique_filename}"
+    # Miniatura, média e WebP são geradas em segundo plano (app/images.py)
+    if created:
+        images.schedule_variants(storage, unique_filename)
+
+    # Local: /static/uploads/...; S3/R2: URL pública ou pré-assinada do bucket
+    file_url = await run_in_threadpool(storage.url, unique_filename)
+
+    response.headers["ETag"] = f'"{received.sha256}"'
+    return {
+        "filename": unique_filename,
+        "url": file_url,
+        "sha256": received.sha256,
+        "size": received.size,
+        "deduplicated": not created,
+    }
+
+@router.delete("/upload/{filename}", status_code=status.HTTP_204_NO_CONTENT, tags=["Upload"])
+async def delete_upload(
+    filename: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
+):
+    """
+    Remove uma referência do usuário ao arquivo (404 se ele não o enviou); o conteúdo
+    (e as variantes) só é apagado quando ninguém mais o enviou.
+    """
+    match = STORED_NAME.match(filename)
+    if not match or not await release(db, match.group(1), get_storage(), current_user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found.")
+    return None
+
+@router.get("/upload/{filename}/{variant}", tags=["Upload"])
+async def read_variant(filename: str, variant: str):
+    """
+    URL de uma variante da imagem (thumb, medium, webp). Enquanto a variante não
+    fica pronta, devolve a URL do original com ready=false.
+    """
+    if variant not in images.VARIANTS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown variant.")
+    storage = get_storage()
+    if "/" in filename or "\\" in filename or filename.startswith(".") or not await run_in_threadpool(storage.exists, filename):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found.")
 
-    return {"filename": unique_filename, "url": file_url}
+    key = images.variant_key(filename, variant)
+    if await run_in_threadpool(storage.exists, key):
+        url = await run_in_threadpool(storage.url, key)
+        return {"filename": filename, "variant": variant, "url": url, "ready": True}
+    # Uploads anteriores ao pipeline, ou jobs perdidos num restart: gera agora
+    images.schedule_variants(storage, filename)
+    url = await run_in_threadpool(storage.url, filename)
+    return {"filename": filename, "variant": variant, "url": url, "ready": False}
@@ -1,6 +1,31 @@
 from __future__ import annotations
-from datetime import datetime
-from pydantic import BaseModel, EmailStr
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Annotated, Any, Generic, Literal, TypeVar
+from pydantic import BaseModel, BeforeValidator, EmailStr, Field, PlainSerializer, model_validator
+
+from app.parsing import format_duration, parse_budget_items, parse_decimal, parse_duration, parse_money
+
+# Números e durações aceitam o formato digitado no app ("7,2", "R$ 1.500,00", "1h30");
+# Decimal é devolvido como string no JSON para não perder precisão.
+# Os limites de dígitos acompanham as colunas Numeric de app/models.py.
+def _decimal(max_digits: int, decimal_places: int = 2, parser=parse_decimal, **constraints):
+    return Annotated[
+        Annotated[Decimal, Field(max_digits=max_digits, decimal_places=decimal_places, **constraints)] | None,
+        BeforeValidator(parser),
+    ]
+
+Money = _decimal(10, parser=parse_money, ge=0)
+Ph = _decimal(4, ge=0, le=14)
+Chlorine = _decimal(6, ge=0) # ppm
+Alkalinity = _decimal(7, ge=0) # ppm
+BudgetTotal = _decimal(12, parser=parse_money, ge=0)
+Quantity = _decimal(12, decimal_places=3, gt=0)
+Duration = Annotated[
+    timedelta | None,
+    BeforeValidator(parse_duration),
+    PlainSerializer(format_duration, return_type=str | None, when_used="json"),
+]
 
 # --- User Schemas ---
 class UserBase(BaseModel):
@@ -70,6 +95,26 @@ class Client(ClientBase):
     class Config:
         from_attributes = True
 
+class ImportRowError(BaseModel):
+    row: int # Linha da planilha (o cabeçalho é a linha 1)
+    detail: Any
+
+class ImportJob(BaseModel):
+    id: int
+    filename: str | None = None
+    status: str # pending, running, done, failed
+    processed_rows: int
+    created_count: int
+    duplicate_count: int
+    error_count: int
+    errors: list[ImportRowError] = [] # Limitado a IMPORT_MAX_ERRORS; error_count tem o total
+    detail: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
 # --- Pool Schemas ---
 class PoolBase(BaseModel):
     volume: int
@@ -99,12 +144,12 @@ class Pool(PoolBase):
 class ServiceBase(BaseModel):
     service_type: str
     description: str | None = None
-    value: str | None = None
-    time_spent: str | None = None
+    value: Money = None
+    time_spent: Duration = None
     date: datetime | None = None
-    ph: str | None = None
-    chlorine: str | None = None
-    alkalinity: str | None = None
+    ph: Ph = None
+    chlorine: Chlorine = None
+    alkalinity: Alkalinity = None
     remarks: str | None = None
 
 class ServiceCreate(ServiceBase):
@@ -121,20 +166,100 @@ class Service(ServiceBase):
     class Config:
         from_attributes = True
 
+# --- Tendências da química da água ---
+class ChemistryStats(BaseModel):
+    last: float | None = None
+    rolling_mean: float | None = None # Média das últimas visitas
+    slope_per_week: float | None = None # Variação por semana nas leituras recentes
+    out_of_range_streak: int = 0 # Leituras seguidas fora da faixa, até a mais recente
+    status: str # ok, baixo, alto, sem_leitura
+
+class TrendPoint(BaseModel):
+    date: datetime
+    ph: float | None = None
+    chlorine: float | None = None
+    alkalinity: float | None = None
+    ph_mean: float | None = None
+    chlorine_mean: float | None = None
+    alkalinity_mean: float | None = None
+
+class PoolTrends(BaseModel):
+    pool_id: int
+    readings: int
+    parameters: dict[str, ChemistryStats]
+    reasons: list[str] # Motivos de atenção; vazio quando está tudo bem
+    series: list[TrendPoint] = [] # Só em /piscinas/{id}/tendencias
+
+# --- Dosagem de produtos ---
+class DosingProduct(BaseModel):
+    key: str = Field(min_length=1)
+    name: str
+    parameter: Literal["ph", "chlorine", "alkalinity"]
+    direction: Literal["raise", "lower"] # Sobe ou baixa o parâmetro
+    dose: float = Field(gt=0) # Quantidade por 1000 L para mudar o parâmetro em 1 unidade (1 ppm, 1 de pH)
+    unit: str = "g"
+
+class DosingLine(BaseModel):
+    product: str
+    name: str
+    parameter: str
+    current: float
+    target: float
+    quantity: float
+    unit: str
+
+class PoolDosing(BaseModel):
+    pool_id: int
+    client_id: int
+    client_name: str
+    address: str | None = None
+    volume: int | None = None
+    last_reading: datetime | None = None
+    doses: list[DosingLine] # Na ordem de aplicação: alcalinidade, pH, cloro
+    warnings: list[str]
+
+class DosingSheet(BaseModel):
+    date: date
+    pools: list[PoolDosing]
+
 # --- Budget Schemas ---
+class BudgetItemBase(BaseModel):
+    product: str | None = None
+    description: str | None = None
+    quantity: Quantity = Decimal(1)
+    unit_price: Money = None
+
+class BudgetItem(BudgetItemBase):
+    line_total: Decimal | None = None # quantity * unit_price, calculado no servidor
+
+# Aceita também o formato antigo: texto JSON ou texto livre
+BudgetItems = Annotated[list[BudgetItemBase], BeforeValidator(parse_budget_items)]
+
 class BudgetBase(BaseModel):
-    items: str # JSON string for MVP simplicity
-    total: str
+    items: BudgetItems = []
+    total: BudgetTotal = None # Ignorado quando algum item tem preço: o servidor soma os itens
     status: str = "Open"
     validity: datetime | None = None
 
 class BudgetCreate(BudgetBase):
     client_id: int
 
+    @model_validator(mode="after")
+    def _total_or_prices(self):
+        if self.total is None and not any(item.unit_price is not None for item in self.items):
+            raise ValueError("Informe o total ou o preço unitário dos itens")
+        return self
+
 class BudgetUpdate(BudgetBase):
     pass
 
+class BudgetSummary(BaseModel):
+    status: str | None
+    count: int
+    total: Decimal
+
 class Budget(BudgetBase):
+    items: list[BudgetItem] = []
     id: int
     client_id: int
     created_at: datetime
@@ -168,3 +293,42 @@ class User(UserBase):
 
     class Config:
         from_attributes = True
+
+# --- Paginação por cursor ---
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None # Ausente na última página
+
+# --- Dashboard ---
+class DashboardMonth(BaseModel):
+    month: date # Primeiro dia do mês (UTC)
+    clients_added: int = 0
+    pools_added: int = 0
+    services_count: int = 0
+    services_revenue: Decimal = Decimal(0)
+    budgets_count: int = 0
+    budgets_total: Decimal = Decimal(0)
+    budgets_approved_total: Decimal = Decimal(0)
+
+    class Config:
+        from_attributes = True
+
+class Dashboard(BaseModel):
+    clients: int
+    pools: int
+    months: list[DashboardMonth] # Do mais antigo ao atual, meses sem movimento zerados
+
+# --- Criação em lote ---
+class BulkCreated(BaseModel, Generic[T]):
+    index: int # Posição do item no lote enviado
+    item: T
+
+class BulkError(BaseModel):
+    index: int
+    detail: Any # Mensagem ou lista de erros de validação
+
+class BulkResult(BaseModel, Generic[T]):
+    created: list[BulkCreated[T]] = []
+    errors: list[BulkError] = []
@@ -1,12 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
 import bcrypt # Importar a biblioteca bcrypt diretamente
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+from app.config import settings
+
+# Executor dedicado ao bcrypt: o custo 12 leva ~250 ms por hash, então o trabalho
+# nunca deve rodar no event loop nem competir sem limite com o threadpool do FastAPI.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    thread_name_prefix="password-hash",
+)
+
+
+class PasswordHashingBusy(Exception):
+    """Levantada quando um hash espera na fila além de PASSWORD_HASH_QUEUE_TIMEOUT."""
+
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     # bcrypt.checkpw espera bytes, então encode a senha simples e o hash
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
-def get_password_hash(password: str) -> str:
+
+def _hashpw(password: str) -> str:
     # bcrypt.hashpw espera bytes e retorna bytes
     # Gerar um salt (com custo padrão de 12 rounds) e então hash
     hashed_password_bytes = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
     # Decodificar o hash de bytes para string para armazenar no banco de dados
-    return hashed_password_bytes.decode('utf-8')
\ No newline at end of file
+    return hashed_password_bytes.decode('utf-8')
+
+
+def _run_bounded(fn, *args):
+    """Executa fn no executor de hash a partir de código síncrono (threadpool)."""
+    future = _hash_executor.submit(fn, *args)
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT)
+    except FutureTimeoutError:
+        # Só desistimos se o trabalho ainda está na fila; se já começou, esperamos terminar.
+        if future.cancel():
+            raise PasswordHashingBusy()
+        return future.result()
+
+
+async def _run_bounded_async(fn, *args):
+    """Executa fn no executor de hash sem bloquear o event loop."""
+    future = _hash_executor.submit(fn, *args)
+    wrapped = asyncio.wrap_future(future)
+    try:
+        return await asyncio.wait_for(asyncio.shield(wrapped), timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        if future.cancel():
+            raise PasswordHashingBusy()
+        return await wrapped
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _run_bounded(_checkpw, plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    return _run_bounded(_hashpw, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_bounded_async(_checkpw, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_bounded_async(_hashpw, password)
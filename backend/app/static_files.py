@@ -0,0 +1,91 @@
+"""
+Arquivos de upload servidos pelo app (STORAGE_BACKEND=local), em LOCAL_STORAGE_URL.
+
+Os nomes <sha256>.<extensão> (app/uploads.py) nunca mudam de conteúdo: vão com
+Cache-Control immutable de um ano e ETag forte derivado do hash, e o navegador ou
+app não volta a baixá-los. Os demais (uploads antigos com UUID) vão com no-cache:
+revalidados a cada uso, 304 se não mudaram.
+
+Range (fotos grandes em rede móvel) e If-Range ficam com o FileResponse do
+Starlette. Se o cliente aceita, "<nome>.br" ou "<nome>.gz" ao lado do arquivo é
+servido no lugar dele, com Content-Encoding. Temporários (".upload-*") não são servidos.
+"""
+import mimetypes
+import os
+import stat
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.storage import PRECOMPRESSED
+from app.uploads import STORED_NAME
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=")) if params.strip() else 1.0
+        except ValueError:
+            quality = 1.0
+        if coding.strip() and quality > 0: # q=0: recusado explicitamente
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _content_tag(path: str) -> str | None:
+    """ETag pelo conteúdo: "<sha256>" no original, "<sha256>-<variante>" nas variantes."""
+    parts = path.replace("\\", "/").strip("/").split("/")
+    match = STORED_NAME.match(parts[-1])
+    if not match:
+        return None
+    if len(parts) == 3 and parts[0] == "variants":
+        return f"{match.group(1)}-{parts[1]}"
+    return match.group(1) if len(parts) == 1 else None
+
+
+class UploadStaticFiles(StaticFiles):
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        if scope["method"] in ("GET", "HEAD"):
+            accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding not in accepted:
+                    continue
+                try:
+                    full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                except (OSError, ValueError):
+                    continue
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    return self._response(path, full_path, stat_result, scope, encoding)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        path = os.path.relpath(full_path, os.path.realpath(self.directory)) if self.directory else os.path.basename(full_path)
+        return self._response(path, full_path, stat_result, scope, None, status_code)
+
+    def _response(
+        self, path: str, full_path, stat_result: os.stat_result, scope: Scope,
+        encoding: str | None, status_code: int = 200,
+    ) -> Response:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        tag = _content_tag(path)
+        if tag:
+            response.headers["etag"] = f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+        response.headers["cache-control"] = IMMUTABLE if tag else REVALIDATE
+        response.headers["vary"] = "Accept-Encoding"
+        if encoding:
+            response.headers["content-encoding"] = encoding
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
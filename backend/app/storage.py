@@ -0,0 +1,213 @@
+"""
+Onde os uploads ficam guardados, escolhido por STORAGE_BACKEND.
+
+- LocalStorage: diretório LOCAL_STORAGE_DIR, servido pelo próprio app em /static/uploads.
+- S3Storage: bucket S3 ou compatível (R2, MinIO) via boto3, que só é importado
+  quando este backend é usado. Arquivos acima de S3_MULTIPART_THRESHOLD vão em
+  partes enviadas em paralelo (TransferManager do boto3). As URLs são as públicas
+  (S3_PUBLIC_URL) ou pré-assinadas.
+
+Os métodos são bloqueantes: nas rotas, chamar via run_in_threadpool. Os backends
+são serializáveis (pickle) para os workers de app/images.py.
+
+Chaves: "<sha256>.<ext>" para os originais e "variants/<variante>/<nome>" para as variantes.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+from app.config import settings
+
+# Versões pré-comprimidas ao lado do arquivo ("<nome>.br", "<nome>.gz"), servidas por app/static_files.py
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+# Permissão dos arquivos entregues ao armazenamento. O mkstemp cria com 0600, e o
+# arquivo movido para LOCAL_STORAGE_DIR ficaria ilegível para o nginx/CDN de outro usuário
+FILE_MODE = 0o644
+
+
+class StorageBackend:
+    staging_dir: str | None = None # Onde gravar os temporários do upload (mesmo disco = rename barato)
+
+    def save(self, local_path: str, key: str, content_type: str | None = None) -> None:
+        """Guarda o arquivo local em `key`; o arquivo local deixa de existir."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Apaga `key`; não é erro se não existir."""
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def fetch(self, key: str):
+        """Context manager com um caminho local para o conteúdo de `key`, válido dentro do bloco."""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str, base_url: str = "/static/uploads"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.staging_dir = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def save(self, local_path: str, key: str, content_type: str | None = None) -> None:
+        final = self.path(key)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        # Vindo de outro disco, copia para um temporário ao lado antes do rename atômico
+        temporary = f"{final}.{os.getpid()}.tmp"
+        shutil.move(local_path, temporary)
+        os.replace(temporary, final)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str) -> None:
+        path = self.path(key)
+        for candidate in [path, *(path + suffix for _, suffix in PRECOMPRESSED)]:
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    @contextmanager
+    def fetch(self, key: str) -> Iterator[str]:
+        yield self.path(key)
+
+
+class S3Storage(StorageBackend):
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        public_url: str | None = None,
+        presign_expires: int = 3600,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_chunk_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url or None
+        self.region = region or None
+        self.access_key_id = access_key_id or None
+        self.secret_access_key = secret_access_key or None
+        self.public_url = (public_url or "").rstrip("/") or None
+        self.presign_expires = presign_expires
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunk_size = multipart_chunk_size
+        self.max_concurrency = max_concurrency
+        self._client = None
+
+    def __getstate__(self):
+        # O client do boto3 não é serializável: cada processo cria o seu
+        return {**self.__dict__, "_client": None}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                aws_access_key_id=self.access_key_id,
+                aws_secret_access_key=self.secret_access_key,
+            )
+        return self._client
+
+    def _transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunk_size,
+            max_concurrency=self.max_concurrency,
+            use_threads=True,
+        )
+
+    def save(self, local_path: str, key: str, content_type: str | None = None) -> None:
+        # Conteúdo endereçado pelo hash: a chave nunca muda de conteúdo, pode ficar em cache para sempre
+        extra = {"CacheControl": "public, max-age=31536000, immutable"}
+        if content_type:
+            extra["ContentType"] = content_type
+        try:
+            self.client.upload_file(local_path, self.bucket, key, ExtraArgs=extra, Config=self._transfer_config())
+        finally:
+            os.remove(local_path)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.presign_expires
+        )
+
+    @contextmanager
+    def fetch(self, key: str) -> Iterator[str]:
+        fd, path = tempfile.mkstemp(prefix="storage-", suffix=os.path.splitext(key)[1])
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, key, path, Config=self._transfer_config())
+            yield path
+        finally:
+            os.remove(path)
+
+
+def build_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(settings.LOCAL_STORAGE_DIR, settings.LOCAL_STORAGE_URL)
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 exige S3_BUCKET")
+        return S3Storage(
+            settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            public_url=settings.S3_PUBLIC_URL,
+            presign_expires=settings.S3_PRESIGN_EXPIRES_SECONDS,
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunk_size=settings.S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+        )
+    raise RuntimeError(f"STORAGE_BACKEND desconhecido: {settings.STORAGE_BACKEND!r} (use local ou s3)")
+
+
+_storage: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = build_storage()
+    return _storage
@@ -0,0 +1,246 @@
+"""
+Recebimento de uploads multipart em streaming.
+
+O Starlette, ao montar o UploadFile, lê o corpo inteiro antes de a rota rodar
+(em memória até 1 MB, depois num temporário). Aqui o corpo é lido direto de
+request.stream(): o python-multipart separa as partes bloco a bloco e os bytes do
+campo de arquivo vão para um temporário no diretório de destino, com as escritas
+numa thread do pool. Passou do tamanho máximo, a leitura para na hora; no fim, o
+temporário é entregue ao armazenamento (app/storage.py) com o nome definitivo.
+
+O SHA-256 é calculado junto com a escrita, e o nome definitivo é o próprio hash
+(<sha256>.<extensão>): conteúdo repetido não ocupa disco de novo, só soma uma
+referência em stored_files e em upload_references (por dono). Cada usuário só tira
+as próprias referências; o arquivo só é apagado quando a última, de qualquer dono, sai.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import images
+from app.models import StoredFile, UploadReference
+from app.storage import FILE_MODE, StorageBackend
+
+# Folga para os cabeçalhos multipart ao comparar o Content-Length com o limite do arquivo
+MULTIPART_OVERHEAD = 64 * 1024
+WRITE_BLOCK_SIZE = 256 * 1024 # Junta as mensagens do servidor (~64 KB) antes de ir ao threadpool
+STORED_NAME = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$") # <sha256>.<extensão>
+
+
+@dataclass
+class ReceivedFile:
+    path: str # Temporário em `directory`; entregar ao armazenamento ou apagar
+    filename: str | None
+    content_type: str | None
+    size: int
+    sha256: str
+
+
+class _PartCollector:
+    """Callbacks do MultipartParser: guardam os bytes do campo `field` até a rota gravá-los."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.headers: dict[bytes, bytes] = {}
+        self.header_field = self.header_value = b""
+        self.in_target = False
+        self.found: dict | None = None # {"filename", "content_type"} do campo de arquivo
+        self.done = False # Campo de arquivo terminou
+        self.pending: list[bytes] = []
+        self.pending_size = 0
+        self.size = 0
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data, start, end):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        self.in_target = self.found is None and name == self.field and b"filename" in options
+        if self.in_target:
+            filename = options[b"filename"].decode("utf-8", "replace")
+            content_type = self.headers.get(b"content-type", b"").decode("latin-1").strip() or None
+            self.found = {"filename": os.path.basename(filename) or None, "content_type": content_type}
+
+    def on_part_data(self, data, start, end):
+        if self.in_target:
+            self.pending.append(data[start:end])
+            self.pending_size += end - start
+            self.size += end - start
+
+    def on_part_end(self):
+        if self.in_target:
+            self.in_target, self.done = False, True
+
+    def take(self) -> bytes:
+        data, self.pending, self.pending_size = b"".join(self.pending), [], 0
+        return data
+
+
+def _write(f, digest, data: bytes) -> None:
+    digest.update(data)
+    f.write(data)
+
+
+def _boundary(request: Request) -> bytes:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected multipart/form-data.")
+    return options[b"boundary"]
+
+
+async def receive_file(
+    request: Request,
+    directory: str | None,
+    field: str = "file",
+    allowed_types: set[str] | None = None,
+    max_size: int | None = None,
+    too_large_detail: str = "File too large.",
+    invalid_type_detail: str = "Invalid file type.",
+) -> ReceivedFile:
+    """
+    Lê o campo de arquivo `field` do corpo multipart para um temporário em `directory`
+    (None: o diretório temporário do sistema).
+    HTTP 400 se faltar o campo, o tipo não for permitido ou o tamanho passar de `max_size`
+    (neste caso sem ler o resto do corpo).
+    """
+    length = request.headers.get("content-length")
+    if max_size is not None and length and length.isdigit() and int(length) > max_size + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=too_large_detail)
+
+    collector = _PartCollector(field)
+    callbacks = {
+        name: getattr(collector, name)
+        for name in ("on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+                     "on_headers_finished", "on_part_data", "on_part_end")
+    }
+    parser = MultipartParser(_boundary(request), callbacks)
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.chmod(path, FILE_MODE)
+            async for chunk in request.stream():
+                try:
+                    parser.write(chunk)
+                except MultipartParseError:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body.")
+                if collector.found is not None and allowed_types is not None and collector.found["content_type"] not in allowed_types:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=invalid_type_detail)
+                if max_size is not None and collector.size > max_size:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=too_large_detail)
+                if collector.pending_size >= WRITE_BLOCK_SIZE or (collector.done and collector.pending):
+                    await run_in_threadpool(_write, f, digest, collector.take())
+                if collector.done:
+                    break # O resto do corpo não interessa
+        if not collector.done:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Missing file field '{field}'.")
+    except BaseException:
+        os.remove(path)
+        raise
+    return ReceivedFile(path=path, size=collector.size, sha256=digest.hexdigest(), **collector.found)
+
+
+def _place(storage: StorageBackend, received: ReceivedFile, key: str) -> bool:
+    """Entrega o temporário ao armazenamento; se o conteúdo já está lá, só descarta."""
+    if storage.exists(key):
+        os.remove(received.path)
+        return False
+    storage.save(received.path, key, received.content_type)
+    return True
+
+
+async def store(
+    db: AsyncSession, received: ReceivedFile, storage: StorageBackend, extension: str, owner_id: int
+) -> tuple[str, bool]:
+    """
+    Soma uma referência de `owner_id` ao conteúdo e garante o arquivo no armazenamento;
+    devolve o nome (<sha256>.<extensão>) e se o conteúdo era novo. Commit feito aqui.
+    """
+    table = StoredFile.__table__
+    references = UploadReference.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).values(
+        sha256=received.sha256, extension=extension, content_type=received.content_type,
+        size=received.size, ref_count=1,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.sha256], set_={"ref_count": table.c.ref_count + 1}
+    ).returning(table.c.extension)
+    reference = dialect.insert(references).values(owner_id=owner_id, sha256=received.sha256, ref_count=1)
+    reference = reference.on_conflict_do_update(
+        index_elements=[references.c.owner_id, references.c.sha256],
+        set_={"ref_count": references.c.ref_count + 1},
+    )
+    try:
+        # A linha fica travada até o commit: um release() concorrente espera o arquivo estar no lugar
+        stored_extension = (await db.execute(statement)).scalar_one()
+        await db.execute(reference)
+        filename = f"{received.sha256}.{stored_extension}"
+        created = await run_in_threadpool(_place, storage, received, filename)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        if os.path.exists(received.path):
+            os.remove(received.path)
+        raise
+    return filename, created
+
+
+def _remove_files(storage: StorageBackend, filename: str) -> None:
+    for key in [filename, *(images.variant_key(filename, variant) for variant in images.VARIANTS)]:
+        storage.delete(key)
+
+
+async def release(db: AsyncSession, sha256: str, storage: StorageBackend, owner_id: int) -> bool:
+    """
+    Tira uma referência de `owner_id`; na última de todos, apaga o arquivo e as variantes.
+    False se o conteúdo não existe ou `owner_id` não tem referência a ele.
+    """
+    # Mesma ordem de travas do store(): stored_files antes de upload_references
+    stored = (
+        await db.execute(select(StoredFile).filter(StoredFile.sha256 == sha256).with_for_update())
+    ).scalars().first()
+    reference = None
+    if stored is not None:
+        reference = (
+            await db.execute(
+                select(UploadReference)
+                .filter(UploadReference.owner_id == owner_id, UploadReference.sha256 == sha256)
+                .with_for_update()
+            )
+        ).scalars().first()
+    if reference is None:
+        await db.rollback()
+        return False
+    reference.ref_count -= 1
+    if reference.ref_count <= 0:
+        await db.delete(reference)
+    stored.ref_count -= 1
+    if stored.ref_count <= 0:
+        await db.delete(stored)
+        await db.flush()
+        # Ainda com a linha travada: um store() do mesmo conteúdo espera e recria o arquivo
+        await run_in_threadpool(_remove_files, storage, f"{sha256}.{stored.extension}")
+    await db.commit()
+    return True
@@ -0,0 +1,71 @@
+"""Utilidades compartilhadas pelos benchmarks (rodar a partir de backend/)."""
+import os
+import statistics
+import sys
+import tempfile
+
+# Os módulos da aplicação exigem estas variáveis no import
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, get_async_db, get_db
+
+
+def build_app(db_path: str | None = None):
+    """Importa o app e aponta get_db/get_async_db para um SQLite em arquivo temporário."""
+    from main import app
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+    )
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return app, SessionLocal
+
+
+async def register_and_login(client, username: str = "bench", password: str = "bench-password") -> dict:
+    """Cria um usuário no app e devolve os headers de autorização."""
+    await client.post(
+        "/auth/register",
+        json={"email": f"{username}@example.com", "username": username, "password": password},
+    )
+    response = await client.post("/auth/token", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """p50/p95/p99/max em milissegundos."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    q = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else [ordered[0]] * 99
+    return {
+        "n": len(ordered),
+        "p50_ms": round(q[49] * 1000, 2),
+        "p95_ms": round(q[94] * 1000, 2),
+        "p99_ms": round(q[98] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
@@ -0,0 +1,82 @@
+"""
+Compara a vazão da listagem de clientes pelo caminho assíncrono (AsyncSession)
+com uma rota equivalente usando a Session síncrona no threadpool.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_async_vs_sync.py [--requests 2000] [--concurrency 64] [--clients 200]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from _harness import build_app, percentiles, register_and_login
+
+
+def add_sync_route(app):
+    """Rota de referência: mesma consulta de read_clients, mas com get_db síncrono."""
+    from app.auth import Principal, get_current_principal
+    from app.database import get_db
+    from app.models import Client as DBClient
+    from app.schemas import Client
+
+    @app.get("/bench/sync/clientes", response_model=list[Client])
+    def read_clients_sync(
+        skip: int = 0,
+        limit: int = 100,
+        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal),
+    ):
+        return db.query(DBClient).filter(DBClient.owner_id == current_user.id).offset(skip).limit(limit).all()
+
+
+async def measure(client, path: str, headers: dict, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"req_s": round(total / elapsed, 1), **percentiles(latencies)}
+
+
+async def run(total: int, concurrency: int, seed_clients: int) -> None:
+    app, _ = build_app()
+    add_sync_route(app)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await register_and_login(client)
+        for i in range(seed_clients):
+            await client.post("/api/v1/clientes/", json={"name": f"Cliente {i}"}, headers=headers)
+
+        # Aquecimento dos dois caminhos (pools, caches de autenticação)
+        await measure(client, "/api/v1/clientes/", headers, 50, 8)
+        await measure(client, "/bench/sync/clientes", headers, 50, 8)
+
+        sync_stats = await measure(client, "/bench/sync/clientes", headers, total, concurrency)
+        async_stats = await measure(client, "/api/v1/clientes/", headers, total, concurrency)
+
+    print(f"requisições={total} concorrência={concurrency} clientes={seed_clients}")
+    print(f"sync  (Session + threadpool): {sync_stats}")
+    print(f"async (AsyncSession):         {async_stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.clients))
@@ -0,0 +1,69 @@
+"""
+Mede a latência p99 de outras rotas enquanto uma "tempestade" de logins roda.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_login_storm.py [--logins 60] [--concurrency 32] [--inline]
+
+--inline reproduz o comportamento antigo (bcrypt direto no event loop) para comparação.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from _harness import build_app, percentiles, register_and_login
+
+
+async def run(logins: int, concurrency: int, inline: bool) -> None:
+    app, _ = build_app()
+
+    if inline:
+        import main
+        from app import security
+
+        async def verify_inline(plain, hashed):
+            return security._checkpw(plain, hashed)
+
+        main.verify_password_async = verify_inline
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await register_and_login(client, "storm", "storm-password")
+
+        remaining = logins
+        storm_done = asyncio.Event()
+
+        async def login_worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await client.post("/auth/token", data={"username": "storm", "password": "storm-password"})
+
+        async def probe(samples: list[float]):
+            while not storm_done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                samples.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        samples: list[float] = []
+        probe_task = asyncio.create_task(probe(samples))
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        storm_done.set()
+        await probe_task
+
+    mode = "inline (event loop)" if inline else "executor"
+    print(f"modo={mode} logins={logins} concorrência={concurrency} duração={elapsed:.2f}s")
+    print(f"latência de GET / durante a tempestade: {percentiles(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.concurrency, args.inline))
@@ -0,0 +1,116 @@
+"""
+Uploads concorrentes de ~5 MB: latência por upload, latência de GET / durante os
+uploads (event loop livre?) e pico de memória alocada em Python (tracemalloc).
+
+Compara POST /api/v1/upload (streaming, app/uploads.py) com uma rota de referência
+que reproduz o caminho antigo: UploadFile lido inteiro pelo Starlette, seek para
+medir e shutil.copyfileobj no event loop.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_uploads.py [--uploads 64] [--concurrency 16] [--size-mb 4.9] [--legacy]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import httpx
+from fastapi import File, UploadFile
+
+from _harness import build_app, percentiles, register_and_login
+
+CHUNK_SIZE = 64 * 1024 # Tamanho típico das mensagens http.request de um servidor ASGI
+BOUNDARY = "benchboundary"
+
+
+def add_legacy_route(app, directory: str):
+    @app.post("/bench/legacy/upload")
+    async def upload_legacy(file: UploadFile = File(...)):
+        file.file.seek(0, 2)
+        file.file.tell()
+        file.file.seek(0)
+        with open(os.path.join(directory, f"{uuid.uuid4()}.jpg"), "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        return {"filename": file.filename}
+
+
+def multipart_body(size: int) -> bytes:
+    head = (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"foto.jpg\"\r\n"
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    return head + os.urandom(size) + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def chunks(body: bytes):
+    view = memoryview(body)
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield bytes(view[start:start + CHUNK_SIZE])
+        await asyncio.sleep(0) # Como a rede: o corpo chega aos poucos
+
+
+async def run(uploads: int, concurrency: int, size: int, legacy: bool) -> None:
+    app, _ = build_app()
+    directory = tempfile.mkdtemp(prefix="bench-uploads-")
+    from app import storage
+
+    storage._storage = storage.LocalStorage(directory)
+    add_legacy_route(app, directory)
+    path = "/bench/legacy/upload" if legacy else "/api/v1/upload"
+    body = multipart_body(size)
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers.update(await register_and_login(client))
+        latencies: list[float] = []
+        probes: list[float] = []
+        remaining = uploads
+        done = asyncio.Event()
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await client.post(path, content=chunks(body), headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probes.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        tracemalloc.start()
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    shutil.rmtree(directory)
+    mode = "legado (spool + copyfileobj)" if legacy else "streaming"
+    print(f"modo={mode} uploads={uploads} concorrência={concurrency} tamanho={size / 1024 / 1024:.1f} MB duração={elapsed:.2f}s")
+    print(f"latência por upload: {percentiles(latencies)}")
+    print(f"latência de GET / durante os uploads: {percentiles(probes)}")
+    print(f"pico de memória Python (tracemalloc): {peak / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size-mb", type=float, default=4.9)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.uploads, args.concurrency, int(args.size_mb * 1024 * 1024), args.legacy))
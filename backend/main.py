@@ -1,16 +1,23 @@
 import logging
 import logging.config
 from datetime import timedelta # Importar timedelta
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm # Importar para autenticação OAuth2
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.schemas import User, UserCreate, UserLogin, Project, ProjectCreate, ProjectUpdate # Adicionar Project e ProjectCreate
 from app.models import User as DBUser, Project as DBProject # Importar modelo Project
-from app.security import get_password_hash, verify_password
-from app.auth import create_access_token, get_current_user # Importar função de criação de token
-from app.database import SessionLocal, engine, Base, get_db
+from app.security import PasswordHashingBusy, get_password_hash, verify_password_async
+from app.auth import Principal, build_token_claims, create_access_token, get_current_principal_async, get_current_user # Importar função de criação de token
+from app.database import SessionLocal, engine, Base, get_db, get_async_db, get_read_db, mark_write_response
 from app.config import settings, LOGGING_CONFIG # Importar configurações de logging
-from app.routers import upload, admin, clients, pools, services, budgets # Importar routers
+from app import images
+from app.query_stats import notify_request, track_queries
+from app.static_files import UploadStaticFiles
+from app.storage import get_storage
+from app.routers import upload, admin, clients, pools, services, budgets, exports, dashboard, dosing # Importar routers
 from fastapi.staticfiles import StaticFiles # Importar StaticFiles
 from fastapi.middleware.cors import CORSMiddleware # Importar CORSMiddleware
 
@@ -34,9 +41,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Uploads em disco: cache longo, ETag, Range e versões pré-comprimidas (app/static_files.py).
+# Montado antes de /static, que casaria com o mesmo prefixo
+if settings.STORAGE_BACKEND == "local":
+    app.mount(settings.LOCAL_STORAGE_URL, UploadStaticFiles(directory=get_storage().root), name="uploads")
+
 # Mount static files for uploads (Local Development)
 app.mount("/static", StaticFiles(directory="backend/static"), name="static")
 
+@app.middleware("http")
+async def query_accounting(request: Request, call_next):
+    # Conta as consultas e o tempo de banco de cada requisição
+    with track_queries() as stats:
+        response = await call_next(request)
+    if stats.count:
+        logger.info(
+            f"{request.method} {request.url.path}: {stats.count} consultas, "
+            f"{stats.total_time_ms} ms no banco, {len(stats.slow)} lentas"
+        )
+    notify_request(request.method, request.url.path, stats)
+    return response
+
+@app.middleware("http")
+async def read_your_writes_marker(request: Request, call_next):
+    # Quem escreveu lê do primário por READ_YOUR_WRITES_SECONDS, em qualquer worker
+    response = await call_next(request)
+    mark_write_response(request, response)
+    return response
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    logger.warning(f"Fila de hash de senha saturada em {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Servidor ocupado, tente novamente em instantes"},
+        headers={"Retry-After": "1"},
+    )
+
 # Include Routers
 app.include_router(upload.router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1")
@@ -44,6 +85,9 @@ app.include_router(clients.router, prefix="/api/v1")
 app.include_router(pools.router, prefix="/api/v1")
 app.include_router(services.router, prefix="/api/v1")
 app.include_router(budgets.router, prefix="/api/v1")
+app.include_router(exports.router, prefix="/api/v1")
+app.include_router(dashboard.router, prefix="/api/v1")
+app.include_router(dosing.router, prefix="/api/v1")
 
 @app.on_event("startup")
 async def startup_event():
@@ -56,6 +100,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Aplicação Propiscineiro encerrando.")
+    images.shutdown() # Espera os jobs de variantes em andamento
 
 
 @app.get("/")
@@ -88,7 +133,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
 @app.post("/auth/token", tags=["Auth"])
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(DBUser).filter(DBUser.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         logger.warning(f"Tentativa de login falhou para o usuário: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -97,7 +142,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=build_token_claims(user), expires_delta=access_token_expires
     )
     logger.info(f"Login bem-sucedido para o usuário: {user.username}")
     return {"access_token": access_token, "token_type": "bearer"}
@@ -109,7 +154,7 @@ async def refresh_access_token(current_user: DBUser = Depends(get_current_user))
     """
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     new_access_token = create_access_token(
-        data={"sub": current_user.username}, expires_delta=access_token_expires
+        data=build_token_claims(current_user), expires_delta=access_token_expires
     )
     logger.info(f"Token de acesso atualizado para o usuário: {current_user.username}")
     return {"access_token": new_access_token, "token_type": "bearer"}
@@ -123,10 +168,10 @@ async def read_users_me(current_user: DBUser = Depends(get_current_user)):
     return current_user
 
 @app.post("/projetos/", response_model=Project, tags=["Projects"])
-def create_project(
+async def create_project(
     project: ProjectCreate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     """
     Cria um novo projeto para o usuário autenticado.
@@ -134,35 +179,36 @@ def create_project(
     logger.info(f"Usuário {current_user.username} tentando criar novo projeto: {project.name}")
     db_project = DBProject(**project.model_dump(), owner_id=current_user.id)
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.commit()
+    await db.refresh(db_project)
     logger.info(f"Projeto {db_project.id} - '{db_project.name}' criado por {current_user.username}")
     return db_project
 
 @app.get("/projetos/", response_model=list[Project], tags=["Projects"])
-def read_user_projects(
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+async def read_user_projects(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     """
     Lista todos os projetos do usuário autenticado.
     """
     logger.info(f"Usuário {current_user.username} requisitou a lista de projetos.")
-    projects = db.query(DBProject).filter(DBProject.owner_id == current_user.id).all()
+    result = await db.execute(select(DBProject).filter(DBProject.owner_id == current_user.id))
+    projects = result.scalars().all()
     logger.info(f"Encontrados {len(projects)} projetos para o usuário {current_user.username}.")
     return projects
 
 @app.get("/projetos/{project_id}", response_model=Project, tags=["Projects"])
-def get_project(
+async def get_project(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     """
     Obtém um projeto específico pelo ID, garantindo que pertence ao usuário autenticado.
     """
     logger.info(f"Usuário {current_user.username} requisitou o projeto ID: {project_id}.")
-    project = db.query(DBProject).filter(DBProject.id == project_id).first()
+    project = await db.get(DBProject, project_id)
 
     if not project:
         logger.warning(f"Projeto ID {project_id} não encontrado.")
@@ -176,17 +222,17 @@ def get_project(
     return project
 
 @app.put("/projetos/{project_id}", response_model=Project, tags=["Projects"])
-def update_project(
+async def update_project(
     project_id: int,
     project_update: ProjectUpdate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     """
     Atualiza um projeto existente pelo ID, garantindo que pertence ao usuário autenticado.
     """
     logger.info(f"Usuário {current_user.username} tentando atualizar projeto ID: {project_id}.")
-    project = db.query(DBProject).filter(DBProject.id == project_id).first()
+    project = await db.get(DBProject, project_id)
 
     if not project:
         logger.warning(f"Projeto ID {project_id} não encontrado para atualização.")
@@ -202,22 +248,22 @@ def update_project(
         setattr(project, key, value)
         
     db.add(project) # Adicionar para garantir que o SQLAlchemy detecte a mudança e atualize 'updated_at'
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
     logger.info(f"Projeto ID {project_id} atualizado com sucesso por {current_user.username}.")
     return project
 
 @app.delete("/projetos/{project_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Projects"])
-def delete_project(
+async def delete_project(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal_async)
 ):
     """
     Deleta um projeto existente pelo ID, garantindo que pertence ao usuário autenticado.
     """
     logger.info(f"Usuário {current_user.username} tentando deletar projeto ID: {project_id}.")
-    project = db.query(DBProject).filter(DBProject.id == project_id).first()
+    project = await db.get(DBProject, project_id)
 
     if not project:
         logger.warning(f"Projeto ID {project_id} não encontrado para exclusão.")
@@ -227,7 +273,7 @@ def delete_project(
         logger.warning(f"Usuário {current_user.username} tentou deletar projeto ID {project_id} de outro usuário.")
         raise HTTPException(status_code=403, detail="Não autorizado a deletar este projeto")
 
-    db.delete(project)
-    db.commit()
+    await db.delete(project)
+    await db.commit()
     logger.info(f"Projeto ID {project_id} deletado com sucesso por {current_user.username}.")
     return {"message": "Project deleted successfully"}
\ No newline at end of file
@@ -1,22 +1,46 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
 import pytest
+from fastapi import Request
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
-from app.database import Base, get_db
+from app.auth import principal_cache, token_epoch_cache
+from app.chemistry import trend_cache
+from app import database
+from app.database import Base, ReplicaRouter, get_db, get_async_db, track_writes
+from app.query_stats import request_observers
 from main import app
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite://"
+# SQLite em arquivo temporário: as rotas síncronas (pysqlite) e assíncronas (aiosqlite)
+# precisam enxergar o mesmo banco, o que não é possível com ":memory:".
+_db_dir = tempfile.mkdtemp(prefix="propiscineiro-tests-")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{_db_dir}/test.db"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{_db_dir}/test.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: o TestClient abre um event loop por requisição e conexões aiosqlite
+# não podem ser reaproveitadas entre loops.
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
+
+@pytest.fixture
+def anyio_backend():
+    # O app usa asyncio (aiosqlite/asyncpg); não rodar os testes assíncronos em trio
+    return "asyncio"
+
 @pytest.fixture(scope="function")
 def db():
     Base.metadata.create_all(bind=engine)
@@ -27,14 +51,84 @@ def db():
         db.close()
         Base.metadata.drop_all(bind=engine)
 
+def make_replica_router(replicas=(), **options) -> ReplicaRouter:
+    options.setdefault("retry_seconds", 30.0)
+    options.setdefault("read_your_writes_seconds", 5.0)
+    return ReplicaRouter(TestingAsyncSessionLocal, list(replicas), **options)
+
 @pytest.fixture(scope="function")
-def client(db):
-    def override_get_db():
+def client(db, monkeypatch):
+    def override_get_db(request: Request):
+        track_writes(db, request)
         try:
             yield db
         finally:
+            db.info.pop("subject", None)
+            db.info.pop("request", None)
             db.close()
-    
+
+    async def override_get_async_db(request: Request):
+        async with TestingAsyncSessionLocal() as async_db:
+            track_writes(async_db, request)
+            yield async_db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # get_read_db usa o roteador real; sem réplicas, toda leitura vai ao banco de teste
+    monkeypatch.setattr(database, "_replica_router", make_replica_router())
+    principal_cache.clear()
+    token_epoch_cache.clear()
+    trend_cache.clear()
     yield TestClient(app)
     del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_async_db]
+
+@pytest.fixture
+def query_budget():
+    """
+    `with query_budget(3): client.get(...)` falha se alguma requisição feita
+    dentro do bloco executar mais de 3 consultas.
+    """
+    recorded = []
+
+    def observer(method, path, stats):
+        recorded.append((method, path, stats))
+
+    @contextmanager
+    def budget(max_queries: int):
+        start = len(recorded)
+        yield recorded
+        requests = recorded[start:]
+        assert requests, "nenhuma requisição registrada dentro do bloco"
+        for method, path, stats in requests:
+            assert stats.count <= max_queries, (
+                f"{method} {path} executou {stats.count} consultas (orçamento: {max_queries})"
+            )
+
+    request_observers.append(observer)
+    yield budget
+    request_observers.remove(observer)
+
+@pytest.fixture
+def sql_statements():
+    """
+    `with sql_statements() as statements: client.get(...)` junta o SQL executado no
+    bloco, tanto pelas rotas síncronas quanto pelas async.
+    """
+    @contextmanager
+    def record_block():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engines = (engine, async_engine.sync_engine)
+        for bind in engines:
+            event.listen(bind, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            for bind in engines:
+                event.remove(bind, "before_cursor_execute", record)
+
+    return record_block
@@ -86,6 +86,23 @@ def test_list_users_as_superuser(client: TestClient, db: Session):
     assert any(u["username"] == "sadmin" for u in users)
     assert any(u["username"] == "normaluser" for u in users)
 
+def test_list_users_and_settings_with_cursor(client: TestClient, db: Session):
+    create_db_superuser(db, "sadmin@example.com", "sadmin", "sadminpassword")
+    for i in range(3):
+        create_test_user(client, f"user{i}@example.com", f"user{i}", "password")
+    headers = {"Authorization": f"Bearer {get_auth_token(client, 'sadmin', 'sadminpassword')}"}
+    for i in range(3):
+        client.post("/api/v1/admin/settings/", json={"key": f"k{i}", "value": "v"}, headers=headers)
+
+    first = client.get("/api/v1/admin/users", params={"cursor": "", "limit": 3}, headers=headers).json()
+    assert [u["username"] for u in first["items"]] == ["sadmin", "user0", "user1"]
+    second = client.get("/api/v1/admin/users", params={"cursor": first["next_cursor"], "limit": 3}, headers=headers).json()
+    assert [u["username"] for u in second["items"]] == ["user2"] and second["next_cursor"] is None
+
+    page = client.get("/api/v1/admin/settings/", params={"cursor": "", "limit": 2}, headers=headers).json()
+    rest = client.get("/api/v1/admin/settings/", params={"cursor": page["next_cursor"]}, headers=headers).json()
+    assert [s["key"] for s in page["items"] + rest["items"]] == ["k0", "k1", "k2"]
+
 def test_get_user_as_superuser(client: TestClient, db: Session):
     superuser = create_db_superuser(db, "sadmin2@example.com", "sadmin2", "sadminpassword")
     regular_user = create_test_user(client, "normal2@example.com", "normaluser2", "normalpassword")
@@ -129,7 +146,8 @@ def test_update_user_superuser_status(client: TestClient, db: Session):
     demoted_user = response.json()
     assert demoted_user["is_superuser"] == False
 
-    # Verify in DB
+    # Verify in DB (a rota usa outra sessão: descarta o que esta sessão já carregou)
+    db.expire_all()
     db_demoted_user = db.query(DBUser).filter(DBUser.id == user_to_promote["id"]).first()
     assert db_demoted_user.is_superuser == False
 
@@ -166,3 +184,151 @@ def test_cannot_delete_last_superuser(client: TestClient, db: Session):
     # Verify first superuser is deleted
     db_deleted_superuser = db.query(DBUser).filter(DBUser.id == superuser.id).first()
     assert db_deleted_superuser is None
+
+def test_demoted_superuser_loses_access_despite_principal_cache(client: TestClient, db: Session):
+    create_db_superuser(db, "boss@example.com", "boss", "bosspassword")
+    other = create_db_superuser(db, "other@example.com", "otheradmin", "otherpassword")
+    boss_token = get_auth_token(client, "boss", "bosspassword")
+    other_token = get_auth_token(client, "otheradmin", "otherpassword")
+
+    # Popula o cache com o usuário ainda superusuário
+    response = client.get("/api/v1/admin/users", headers={"Authorization": f"Bearer {other_token}"})
+    assert response.status_code == 200
+
+    response = client.put(
+        f"/api/v1/admin/users/{other.id}",
+        headers={"Authorization": f"Bearer {boss_token}"},
+        json={"is_superuser": False},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/admin/users", headers={"Authorization": f"Bearer {other_token}"})
+    assert response.status_code == 403
+
+def test_system_logs_returns_last_lines(client: TestClient, db: Session, tmp_path, monkeypatch):
+    from app.config import settings
+
+    log_file = tmp_path / "app.log"
+    log_file.write_text("".join(f"linha {i}\n" for i in range(5000)), encoding="utf-8")
+    monkeypatch.setattr(settings, "LOG_FILE", str(log_file))
+    create_db_superuser(db, "logs@example.com", "logsadmin", "logspassword")
+    token = get_auth_token(client, "logsadmin", "logspassword")
+
+    response = client.get("/api/v1/admin/system-logs?last_n_lines=3", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.text == "linha 4997\nlinha 4998\nlinha 4999\n"
+
+@pytest.mark.anyio
+async def test_admin_endpoints_do_not_block_event_loop(client: TestClient, db: Session, tmp_path, monkeypatch):
+    import asyncio
+    import time
+    import httpx
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from app.config import settings
+    from app.database import get_db
+    from main import app
+
+    # Sessões síncronas independentes e lentas (50 ms por comando): qualquer acesso
+    # síncrono ao banco feito no event loop aparece como atraso no heartbeat.
+    slow_engine = create_engine(str(db.get_bind().url), connect_args={"check_same_thread": False})
+    @event.listens_for(slow_engine, "before_cursor_execute")
+    def _slow_statement(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(0.05)
+    SlowSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=slow_engine)
+
+    def per_request_db():
+        session = SlowSessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+    monkeypatch.setitem(app.dependency_overrides, get_db, per_request_db)
+
+    # Log grande: ler o arquivo inteiro no loop também seria detectado
+    log_file = tmp_path / "app.log"
+    with open(log_file, "w", encoding="utf-8") as f:
+        f.writelines(f"{'x' * 120} {i}\n" for i in range(200_000))
+    monkeypatch.setattr(settings, "LOG_FILE", str(log_file))
+
+    create_db_superuser(db, "loop@example.com", "loopadmin", "looppassword")
+    target = create_db_superuser(db, "target@example.com", "target", "targetpassword")
+    target_id = target.id
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.post("/auth/token", data={"username": "loopadmin", "password": "looppassword"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        response = await http.post("/api/v1/admin/settings/", json={"key": "k", "value": "v"}, headers=headers)
+        assert response.status_code == 201
+
+        lags: list[float] = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            interval = 0.005
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(interval)
+                lags.append(time.perf_counter() - start - interval)
+
+        async def hammer(i: int):
+            await http.get("/api/v1/admin/users", headers=headers)
+            await http.get("/api/v1/admin/settings/", headers=headers)
+            await http.put("/api/v1/admin/settings/k", json={"value": str(i)}, headers=headers)
+            await http.get("/api/v1/admin/system-logs?last_n_lines=50", headers=headers)
+            await http.get(f"/api/v1/admin/users/{target_id}", headers=headers)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.gather(*(hammer(i) for i in range(20)))
+        response = await http.put(f"/api/v1/admin/users/{target_id}", json={"password": "rotated"}, headers=headers)
+        assert response.status_code == 200
+        stop.set()
+        await beat
+
+    assert lags, "heartbeat não executou"
+    blocked = sum(lag for lag in lags if lag > 0.02)
+    assert max(lags) < 0.25, f"event loop bloqueado por {max(lags) * 1000:.0f} ms"
+    assert blocked < 0.5, f"event loop bloqueado por {blocked * 1000:.0f} ms no total"
+
+def test_db_pool_metrics_report_waits(client: TestClient, db: Session, tmp_path, monkeypatch):
+    import threading
+    import time
+    from sqlalchemy import create_engine, text
+    from app import db_metrics
+
+    monkeypatch.setattr(db_metrics, "_registry", {})
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=db_metrics.InstrumentedQueuePool,
+        pool_logging_name="test_pool",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=5,
+    )
+    db_metrics.instrument_engine(engine, "test_pool", max_overflow=0)
+
+    # Segura a única conexão para que a segunda tenha de esperar
+    held = engine.connect()
+    held.execute(text("SELECT 1"))
+    def second_checkout():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    waiter = threading.Thread(target=second_checkout)
+    waiter.start()
+    time.sleep(0.1)
+    held.close()
+    waiter.join()
+
+    create_db_superuser(db, "pool@example.com", "pooladmin", "poolpassword")
+    token = get_auth_token(client, "pooladmin", "poolpassword")
+    response = client.get("/api/v1/admin/db-pool", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    [metrics] = response.json()
+    assert metrics["name"] == "test_pool"
+    assert metrics["checkouts"] == 2
+    assert metrics["checked_out"] == 0
+    assert metrics["waits"] == 1
+    assert metrics["wait_time_max_ms"] >= 50
+    assert metrics["checkout_latency_p99_ms"] >= 50
+    engine.dispose()
@@ -31,3 +31,113 @@ def test_login_invalid_credentials(client):
         data={"username": "wronguser", "password": "wrongpassword"},
     )
     assert response.status_code == 401
+
+def test_login_returns_503_when_hash_queue_is_saturated(client, monkeypatch):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app import security
+
+    client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "password123"},
+    )
+
+    # Ocupa o único worker do executor para que o login fique preso na fila
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    executor.submit(release.wait)
+    monkeypatch.setattr(security, "_hash_executor", executor)
+    monkeypatch.setattr(security.settings, "PASSWORD_HASH_QUEUE_TIMEOUT", 0.05)
+
+    try:
+        response = client.post(
+            "/auth/token",
+            data={"username": "testuser", "password": "password123"},
+        )
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_authenticated_requests_reuse_cached_principal(client, sql_statements):
+    client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "password123"},
+    )
+    token = client.post(
+        "/auth/token",
+        data={"username": "testuser", "password": "password123"},
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    with sql_statements() as statements:
+        response = client.get("/projetos/", headers=headers)
+
+    assert response.status_code == 200
+    assert not any("FROM users" in statement for statement in statements)
+
+def test_stateless_token_carries_claims_and_honours_revocation(client, db, monkeypatch, sql_statements):
+    from jose import jwt
+    from app.auth import ALGORITHM
+    from app.config import settings
+    from app.models import User as DBUser
+    from app.security import get_password_hash
+
+    monkeypatch.setattr(settings, "STATELESS_TOKENS", True)
+    admin = DBUser(email="admin@example.com", username="admin", hashed_password=get_password_hash("adminpass"), is_superuser=True)
+    db.add(admin)
+    db.commit()
+    client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "password123"},
+    )
+    token = client.post("/auth/token", data={"username": "testuser", "password": "password123"}).json()["access_token"]
+    admin_token = client.post("/auth/token", data={"username": "admin", "password": "adminpass"}).json()["access_token"]
+
+    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["sub"] == "testuser"
+    assert claims["su"] is False
+    assert claims["ep"] == 0
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # Primeira requisição aquece o cache de época; a segunda não toca em users
+    assert client.get("/api/v1/clientes/", headers=headers).status_code == 200
+    with sql_statements() as statements:
+        assert client.get("/api/v1/clientes/", headers=headers).status_code == 200
+    assert not any("FROM users" in statement for statement in statements)
+
+    # Trocar a senha incrementa a época e revoga o token antigo
+    response = client.put(
+        f"/api/v1/admin/users/{claims['uid']}",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"password": "newpassword"},
+    )
+    assert response.status_code == 200
+    response = client.get("/api/v1/clientes/", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token revogado"
+
+def test_async_routes_resolve_principal_without_sync_session(client, sql_statements):
+    from app.auth import principal_cache
+    from app.database import get_db
+    from main import app
+
+    client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "username": "testuser", "password": "password123"},
+    )
+    token = client.post("/auth/token", data={"username": "testuser", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def no_sync_session():
+        raise AssertionError("rota async abriu a sessão síncrona")
+    app.dependency_overrides[get_db] = no_sync_session
+    principal_cache.clear()
+    with sql_statements() as statements:
+        assert client.get("/api/v1/clientes/", headers=headers).status_code == 200
+        assert client.get("/projetos/", headers=headers).status_code == 200
+    assert sum("FROM users" in statement for statement in statements) == 1 # só a primeira, depois o cache
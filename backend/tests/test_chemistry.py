@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from app.chemistry import trend_cache
+from tests.test_domain import create_client_and_pool, create_user_and_headers
+
+
+def _visit(client, headers, pool_id, days_ago, **readings):
+    date = (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+    response = client.post(
+        "/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "tratamento", "date": date, **readings}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_pool_trends_and_attention_list(client):
+    headers = create_user_and_headers(client)
+    other = create_user_and_headers(client, "other")
+    _, acid_pool = create_client_and_pool(client, headers, "Ana")
+    _, fading_pool = create_client_and_pool(client, headers, "Bruno")
+    _, fine_pool = create_client_and_pool(client, headers, "Carla")
+
+    # pH baixo nas duas últimas visitas (a anterior estava boa)
+    for days_ago, ph in [(21, "7,4"), (14, "6,9"), (7, "6,8")]:
+        _visit(client, headers, acid_pool, days_ago, ph=ph, chlorine="2")
+    # Cloro ainda na faixa, mas caindo 0,5 ppm por semana
+    for days_ago, chlorine in [(21, "3"), (14, "2,5"), (7, "2"), (0, "1,5")]:
+        _visit(client, headers, fading_pool, days_ago, ph="7,4", chlorine=chlorine, alkalinity="100")
+    for days_ago in (14, 7, 0):
+        _visit(client, headers, fine_pool, days_ago, ph="7,4", chlorine="2", alkalinity="100")
+
+    response = client.get("/api/v1/piscinas/atencao", headers=headers)
+    assert response.status_code == 200
+    attention = {pool["pool_id"]: pool for pool in response.json()}
+    assert set(attention) == {acid_pool, fading_pool}
+    assert attention[acid_pool]["reasons"] == ["pH baixo nas últimas 2 visitas"]
+    assert attention[acid_pool]["parameters"]["ph"]["out_of_range_streak"] == 2
+    assert attention[acid_pool]["parameters"]["alkalinity"]["status"] == "sem_leitura"
+    assert attention[fading_pool]["reasons"] == ["cloro caindo 0.50/semana, deve sair da faixa em 14 dias"]
+    assert attention[fading_pool]["series"] == []
+
+    trends = client.get(f"/api/v1/piscinas/{fading_pool}/tendencias", headers=headers).json()
+    assert trends["readings"] == 4
+    assert trends["parameters"]["chlorine"] == {
+        "last": 1.5, "rolling_mean": 2.25, "slope_per_week": -0.5, "out_of_range_streak": 0, "status": "ok",
+    }
+    assert [point["chlorine_mean"] for point in trends["series"]] == [3.0, 2.75, 2.5, 2.25]
+
+    # Uma nova visita incrementa a versão no banco: o cache deixa de valer em todos os workers,
+    # sem depender de invalidação local
+    cached = len(trend_cache)
+    _visit(client, headers, acid_pool, 0, ph="7,4")
+    assert len(trend_cache) == cached
+    assert client.get(f"/api/v1/piscinas/{acid_pool}/tendencias", headers=headers).json()["readings"] == 4
+    pools = {pool["pool_id"] for pool in client.get("/api/v1/piscinas/atencao", headers=headers).json()}
+    assert pools == {fading_pool}
+
+    assert client.get(f"/api/v1/piscinas/{acid_pool}/tendencias", headers=other).status_code == 404
+    assert client.get("/api/v1/piscinas/atencao", headers=other).json() == []
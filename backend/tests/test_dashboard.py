@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from app.dashboard import rebuild_stats
+from app.models import month_of
+from tests.test_domain import create_client_and_pool, create_user_and_headers
+
+
+def test_dashboard_is_maintained_incrementally_and_matches_rebuild(client, db):
+    headers = create_user_and_headers(client)
+    other = create_user_and_headers(client, "other")
+    create_client_and_pool(client, other, "De outro usuário")
+
+    now = datetime.now(timezone.utc)
+    previous_day = month_of(now) - timedelta(days=1) # Último dia do mês anterior
+    last_month = f"{previous_day.isoformat()}T12:00:00Z"
+    first_client, first_pool = create_client_and_pool(client, headers, "Ana")
+    _, second_pool = create_client_and_pool(client, headers, "Bruno")
+
+    service_id = client.post(
+        "/api/v1/servicos/", json={"pool_id": first_pool, "service_type": "limpeza", "value": "100"}, headers=headers
+    ).json()["id"]
+    client.post("/api/v1/servicos/bulk", json=[
+        {"pool_id": second_pool, "service_type": "limpeza", "value": "50,50"},
+        {"pool_id": second_pool, "service_type": "tratamento", "date": last_month, "value": "30"},
+    ], headers=headers)
+    approved = client.post(
+        "/api/v1/orcamentos/", json={"client_id": first_client, "total": "200", "status": "Approved"}, headers=headers
+    ).json()["id"]
+    rejected = client.post(
+        "/api/v1/orcamentos/", json={"client_id": first_client, "total": "80"}, headers=headers
+    ).json()["id"]
+
+    # Alterações movem a contribuição: valor, mês, status; exclusão subtrai
+    client.put(f"/api/v1/servicos/{service_id}", json={"service_type": "limpeza", "value": "120"}, headers=headers)
+    client.put(f"/api/v1/orcamentos/{rejected}", json={"status": "Rejected"}, headers=headers)
+    client.put(f"/api/v1/orcamentos/{approved}", json={"items": [{"product": "Cloro", "quantity": "3", "unit_price": "50"}]}, headers=headers)
+    service_to_move = client.post(
+        "/api/v1/servicos/", json={"pool_id": first_pool, "service_type": "limpeza", "value": "10"}, headers=headers
+    ).json()["id"]
+    client.put(f"/api/v1/servicos/{service_to_move}", json={"service_type": "limpeza", "date": last_month}, headers=headers)
+    client.delete(f"/api/v1/orcamentos/{rejected}", headers=headers)
+
+    response = client.get("/api/v1/dashboard/", params={"months": 3}, headers=headers)
+    assert response.status_code == 200
+    dashboard = response.json()
+    assert (dashboard["clients"], dashboard["pools"]) == (2, 2)
+    assert [month["month"] for month in dashboard["months"]][1:] == [month_of(previous_day).isoformat(), month_of(now).isoformat()]
+    previous, current = dashboard["months"][1:]
+    assert dashboard["months"][0]["services_count"] == 0
+    assert (previous["services_count"], previous["services_revenue"]) == (2, "40.00")
+    assert (current["services_count"], current["services_revenue"]) == (2, "170.50")
+    assert (current["budgets_count"], current["budgets_total"], current["budgets_approved_total"]) == (1, "150.00", "150.00")
+    assert current["clients_added"] == 2
+
+    # A reconstrução completa chega aos mesmos números
+    with db.get_bind().begin() as connection:
+        assert rebuild_stats(connection) == 3 # dois meses deste usuário e um do outro
+    assert client.get("/api/v1/dashboard/", params={"months": 3}, headers=headers).json() == dashboard
+    with db.get_bind().begin() as connection:
+        rebuild_stats(connection, owner_id=2) # Só o outro usuário
+    assert client.get("/api/v1/dashboard/", params={"months": 3}, headers=headers).json() == dashboard
+    assert client.get("/api/v1/dashboard/", headers=other).json()["clients"] == 1
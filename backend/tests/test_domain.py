@@ -0,0 +1,344 @@
+def create_user_and_headers(client, username="owner"):
+    client.post(
+        "/auth/register",
+        json={"email": f"{username}@example.com", "username": username, "password": "password123"},
+    )
+    response = client.post("/auth/token", data={"username": username, "password": "password123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def create_client_and_pool(client, headers, name="Cliente"):
+    client_id = client.post("/api/v1/clientes/", json={"name": name}, headers=headers).json()["id"]
+    pool = client.post(
+        "/api/v1/piscinas/",
+        json={"client_id": client_id, "volume": 20000, "pool_type": "alvenaria"},
+        headers=headers,
+    ).json()
+    return client_id, pool["id"]
+
+def test_pool_service_budget_lifecycle(client):
+    headers = create_user_and_headers(client)
+    client_id, pool_id = create_client_and_pool(client, headers)
+
+    response = client.post(
+        "/api/v1/servicos/",
+        json={"pool_id": pool_id, "service_type": "limpeza", "ph": "7.4"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    service_id = response.json()["id"]
+
+    response = client.put(f"/api/v1/servicos/{service_id}", json={"service_type": "tratamento"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["service_type"] == "tratamento"
+    assert [s["id"] for s in client.get("/api/v1/servicos/", headers=headers).json()] == [service_id]
+
+    response = client.post(
+        "/api/v1/orcamentos/",
+        json={"client_id": client_id, "items": "[]", "total": "150.00"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    budget_id = response.json()["id"]
+    assert client.get(f"/api/v1/orcamentos/{budget_id}", headers=headers).status_code == 200
+
+    assert client.delete(f"/api/v1/servicos/{service_id}", headers=headers).status_code == 204
+    assert client.delete(f"/api/v1/orcamentos/{budget_id}", headers=headers).status_code == 204
+    assert client.delete(f"/api/v1/piscinas/{pool_id}", headers=headers).status_code == 204
+    assert client.get(f"/api/v1/piscinas/{pool_id}", headers=headers).status_code == 404
+
+def test_other_tenant_cannot_touch_pools_or_services(client):
+    owner = create_user_and_headers(client, "owner")
+    intruder = create_user_and_headers(client, "intruder")
+    client_id, pool_id = create_client_and_pool(client, owner)
+
+    assert client.get(f"/api/v1/piscinas/{pool_id}", headers=intruder).status_code == 404
+    assert client.get(f"/api/v1/piscinas/cliente/{client_id}", headers=intruder).status_code == 404
+    response = client.post(
+        "/api/v1/servicos/",
+        json={"pool_id": pool_id, "service_type": "limpeza"},
+        headers=intruder,
+    )
+    assert response.status_code == 404
+    assert client.get(f"/api/v1/clientes/{client_id}", headers=intruder).status_code == 403
+
+def test_owner_id_follows_parent_on_create_and_move(client, db):
+    from app.models import Budget, Client, Pool, Service, User
+
+    owner = create_user_and_headers(client, "owner")
+    create_user_and_headers(client, "other")
+    client_id, pool_id = create_client_and_pool(client, owner)
+    service_id = client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "limpeza"}, headers=owner).json()["id"]
+    budget_id = client.post(
+        "/api/v1/orcamentos/", json={"client_id": client_id, "items": "[]", "total": "10"}, headers=owner
+    ).json()["id"]
+    owner_id = db.query(User.id).filter(User.username == "owner").scalar()
+    other_id = db.query(User.id).filter(User.username == "other").scalar()
+    assert {db.get(m, i).owner_id for m, i in ((Pool, pool_id), (Service, service_id), (Budget, budget_id))} == {owner_id}
+
+    # Piscina movida para um cliente de outro dono leva os serviços junto
+    other_client = Client(name="Outro", owner_id=other_id)
+    db.add(other_client)
+    db.flush()
+    db.get(Pool, pool_id).client_id = other_client.id
+    db.commit()
+    db.expire_all()
+    assert db.get(Pool, pool_id).owner_id == other_id
+    assert db.get(Service, service_id).owner_id == other_id
+
+    # Cliente transferido: piscinas, serviços e orçamentos acompanham
+    db.get(Client, other_client.id).owner_id = owner_id
+    db.get(Client, client_id).owner_id = other_id
+    db.commit()
+    db.expire_all()
+    assert db.get(Service, service_id).owner_id == owner_id
+    assert db.get(Budget, budget_id).owner_id == other_id
+    assert client.get("/api/v1/servicos/", headers=owner).json()[0]["id"] == service_id
+
+def collect_pages(client, path, headers, limit):
+    items, cursor = [], ""
+    while cursor is not None:
+        page = client.get(path, params={"cursor": cursor, "limit": limit}, headers=headers).json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+    return items
+
+def test_cursor_pagination(client):
+    headers = create_user_and_headers(client)
+    client_id, pool_id = create_client_and_pool(client, headers)
+    for name in ("B", "C", "D", "E"):
+        client.post("/api/v1/clientes/", json={"name": name}, headers=headers)
+    for day in (3, 1, 2, 2, 5):
+        client.post(
+            "/api/v1/servicos/",
+            json={"pool_id": pool_id, "service_type": "limpeza", "date": f"2024-01-0{day}T10:00:00Z"},
+            headers=headers,
+        )
+    client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "sem data"}, headers=headers)
+
+    clients = collect_pages(client, "/api/v1/clientes/", headers, limit=2)
+    assert [c["name"] for c in clients] == ["Cliente", "B", "C", "D", "E"]
+
+    services = collect_pages(client, "/api/v1/servicos/", headers, limit=2)
+    assert len(services) == 6 and len({s["id"] for s in services}) == 6
+    assert services[0]["service_type"] == "sem data"  # data padrão = agora, a mais recente
+    assert [s["date"][:10] for s in services[1:]] == ["2024-01-05", "2024-01-03", "2024-01-02", "2024-01-02", "2024-01-01"]
+
+    # Modo de compatibilidade continua devolvendo lista
+    legacy = client.get("/api/v1/clientes/", params={"skip": 1, "limit": 2}, headers=headers).json()
+    assert [c["name"] for c in legacy] == ["B", "C"]
+    assert client.get("/api/v1/clientes/", params={"cursor": "???"}, headers=headers).status_code == 400
+
+def test_service_readings_are_typed(client, db):
+    from sqlalchemy import func
+    from app.models import Service
+
+    headers = create_user_and_headers(client)
+    _, pool_id = create_client_and_pool(client, headers)
+    response = client.post(
+        "/api/v1/servicos/",
+        json={"pool_id": pool_id, "service_type": "limpeza", "value": "R$ 1.500,50", "time_spent": "1h30", "ph": "7,2", "chlorine": ""},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["value"], body["time_spent"], body["ph"], body["chlorine"]) == ("1500.50", "1h30", "7.20", None)
+    client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "limpeza", "value": 99.5, "ph": 7.6}, headers=headers)
+
+    # Agregados rodam no banco
+    total, average_ph = db.query(func.sum(Service.value), func.avg(Service.ph)).one()
+    assert float(total) == 1600.0 and round(float(average_ph), 2) == 7.4
+
+    # Três casas nas leituras são decimais, não milhar (só dinheiro usa "1.500" = 1500)
+    response = client.post(
+        "/api/v1/servicos/",
+        json={"pool_id": pool_id, "service_type": "x", "chlorine": "0.500", "ph": "7.250", "alkalinity": "1.250", "value": "1.250"},
+        headers=headers,
+    )
+    body = response.json()
+    assert (body["chlorine"], body["ph"], body["alkalinity"], body["value"]) == ("0.50", "7.25", "1.25", "1250.00")
+
+    response = client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "x", "ph": "15"}, headers=headers)
+    assert response.status_code == 422
+    response = client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "x", "value": "abc"}, headers=headers)
+    assert response.status_code == 422
+
+def test_budget_items_are_structured_and_totalled_on_server(client):
+    headers = create_user_and_headers(client)
+    client_id, _ = create_client_and_pool(client, headers)
+    response = client.post(
+        "/api/v1/orcamentos/",
+        json={
+            "client_id": client_id,
+            "items": [
+                {"product": "Cloro granulado", "quantity": "2,5", "unit_price": "R$ 40,00"},
+                {"product": "Mão de obra", "unit_price": 120},
+                {"description": "Observação sem preço"},
+            ],
+            "total": "1",
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    budget = response.json()
+    assert budget["total"] == "220.00"
+    assert [i["line_total"] for i in budget["items"]] == ["100.00", "120.00", None]
+
+    # Formato antigo (texto JSON com descrições) continua aceito, com o total informado
+    legacy = client.post(
+        "/api/v1/orcamentos/",
+        json={"client_id": client_id, "items": '[{"description": "Limpeza"}]', "total": "80", "status": "Approved"},
+        headers=headers,
+    ).json()
+    assert legacy["items"][0]["description"] == "Limpeza" and legacy["total"] == "80.00"
+
+    found = client.get("/api/v1/orcamentos/", params={"product": "cloro"}, headers=headers).json()
+    assert [b["id"] for b in found] == [budget["id"]]
+    summary = client.get("/api/v1/orcamentos/resumo", headers=headers).json()
+    assert {(s["status"], s["count"], s["total"]) for s in summary} == {("Approved", 1, "80.00"), ("Open", 1, "220.00")}
+
+    # Chaves antigas (name/qty/price) são mapeadas; as desconhecidas ficam na descrição
+    renamed = client.post(
+        "/api/v1/orcamentos/",
+        json={"client_id": client_id, "items": '[{"name": "Sal", "qty": "3", "price": "1.500", "cor": "branco"}]'},
+        headers=headers,
+    ).json()
+    item = renamed["items"][0]
+    assert (item["product"], item["description"], item["line_total"]) == ("Sal", "cor: branco", "4500.00")
+    assert renamed["total"] == "4500.00"
+
+    # Edição no frontend sem mexer nos itens: eles voltam como vieram (com line_total)
+    resent = client.put(
+        f"/api/v1/orcamentos/{budget['id']}",
+        json={"client_id": client_id, "items": budget["items"], "total": budget["total"], "validity": None},
+        headers=headers,
+    ).json()
+    assert resent["items"] == budget["items"] and resent["total"] == "220.00"
+
+    response = client.put(f"/api/v1/orcamentos/{budget['id']}", json={"items": [{"product": "Cloro", "quantity": 1, "unit_price": 40}]}, headers=headers)
+    assert response.json()["total"] == "40.00"
+    assert client.get("/api/v1/orcamentos/", params={"product": "mão"}, headers=headers).json() == []
+    assert client.delete(f"/api/v1/orcamentos/{budget['id']}", headers=headers).status_code == 204
+
+def test_bulk_create_reports_errors_per_item(client, query_budget, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "BULK_CHUNK_SIZE", 2)
+    owner = create_user_and_headers(client, "owner")
+    intruder = create_user_and_headers(client, "intruder")
+    foreign_client_id, foreign_pool_id = create_client_and_pool(client, intruder, "Alheio")
+
+    # 5 válidos em blocos de 2: por bloco um INSERT e o upsert do dashboard, mais o commit
+    clients = [{"name": f"Cliente {i}"} for i in range(5)]
+    with query_budget(15):
+        response = client.post("/api/v1/clientes/bulk", json=clients[:2] + [{"phone": "sem nome"}] + clients[2:], headers=owner)
+    assert response.status_code == 200
+    body = response.json()
+    assert [created["index"] for created in body["created"]] == [0, 1, 3, 4, 5]
+    assert [created["item"]["name"] for created in body["created"]] == [c["name"] for c in clients]
+    assert [error["index"] for error in body["errors"]] == [2]
+    assert body["errors"][0]["detail"][0]["loc"] == ["name"]
+    client_ids = [created["item"]["id"] for created in body["created"]]
+
+    pools = [{"client_id": client_id, "volume": 30000, "pool_type": "vinil"} for client_id in client_ids[:3]]
+    pools.append({"client_id": foreign_client_id, "volume": 1000, "pool_type": "fibra"})
+    body = client.post("/api/v1/piscinas/bulk", json=pools, headers=owner).json()
+    assert [created["index"] for created in body["created"]] == [0, 1, 2]
+    assert body["errors"] == [{"index": 3, "detail": "Client not found or not authorized"}]
+    pool_id = body["created"][0]["item"]["id"]
+
+    services = [
+        {"pool_id": pool_id, "service_type": "limpeza", "ph": "7,4", "time_spent": "1h30"},
+        {"pool_id": pool_id, "service_type": "tratamento", "ph": "15"},
+        {"pool_id": foreign_pool_id, "service_type": "limpeza"},
+        "não é um objeto",
+    ]
+    body = client.post("/api/v1/servicos/bulk", json=services, headers=owner).json()
+    assert [(c["index"], c["item"]["ph"], c["item"]["time_spent"]) for c in body["created"]] == [(0, "7.40", "1h30")]
+    assert [error["index"] for error in body["errors"]] == [1, 2, 3]
+    assert body["created"][0]["item"]["date"] is not None
+
+    assert len(client.get("/api/v1/clientes/", headers=owner).json()) == 5
+    assert len(client.get(f"/api/v1/piscinas/cliente/{client_ids[0]}", headers=owner).json()) == 1
+    assert len(client.get("/api/v1/servicos/", headers=intruder).json()) == 0
+
+    monkeypatch.setattr(settings, "BULK_MAX_ITEMS", 3)
+    assert client.post("/api/v1/clientes/bulk", json=clients, headers=owner).status_code == 413
+
+def test_client_import_normalizes_and_dedupes(client, db, monkeypatch):
+    from app.config import settings
+    from app.models import Client as DBClient
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    headers = create_user_and_headers(client)
+    client.post("/api/v1/clientes/", json={"name": "Já cadastrado", "phone": "11 3333-4444"}, headers=headers)
+
+    # Exportação típica do Excel: ponto e vírgula, cp1252, números de telefone sem formatação
+    content = "\n".join([
+        "Nome;Telefone;CPF/CNPJ;E-mail;Endereço",
+        "Ana Souza;+55 (11) 98765-4321;529.982.247-25;ANA@EXEMPLO.COM;Rua São João, 10",
+        "Repetida no banco;(11) 3333-4444;;;",
+        "Empresa;1122223333;11222333000181;;",
+        ";;;;",
+        "Ana de novo;11 90000-0000;52998224725;;",
+        "CPF errado;;111.111.111-11;;",
+        ";11 95555-5555;;;",
+    ]).encode("cp1252")
+    response = client.post(
+        "/api/v1/clientes/importar", files={"file": ("clientes.csv", content, "text/csv")}, headers=headers
+    )
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    job = client.get(f"/api/v1/clientes/importacoes/{job_id}", headers=headers).json()
+    assert job["status"] == "done"
+    assert (job["processed_rows"], job["created_count"], job["duplicate_count"], job["error_count"]) == (6, 2, 2, 2)
+    assert [error["row"] for error in job["errors"]] == [7, 8]
+
+    imported = {c.name: c for c in db.query(DBClient).filter(DBClient.name.in_(["Ana Souza", "Empresa"]))}
+    assert imported["Ana Souza"].phone == "(11) 98765-4321"
+    assert imported["Ana Souza"].cpf_cnpj == "529.982.247-25"
+    assert imported["Ana Souza"].email == "ana@exemplo.com"
+    assert imported["Ana Souza"].address == "Rua São João, 10"
+    assert (imported["Empresa"].cpf_cnpj, imported["Empresa"].cpf_cnpj_digits) == ("11.222.333/0001-81", "11222333000181")
+
+    intruder = create_user_and_headers(client, "intruder")
+    assert client.get(f"/api/v1/clientes/importacoes/{job_id}", headers=intruder).status_code == 404
+    response = client.post(
+        "/api/v1/clientes/importar", files={"file": ("clientes.pdf", b"%PDF", "application/pdf")}, headers=headers
+    )
+    assert response.status_code == 415
+    response = client.post(
+        "/api/v1/clientes/importar", files={"file": ("vazio.csv", b"telefone\n119", "text/csv")}, headers=headers
+    )
+    job = client.get(f"/api/v1/clientes/importacoes/{response.json()['id']}", headers=headers).json()
+    assert job["status"] == "failed" and "nome" in job["detail"]
+
+def test_client_search_ranks_digit_prefix_first(client):
+    headers = create_user_and_headers(client)
+    other = create_user_and_headers(client, "other")
+    clients = [
+        {"name": "Ana Souza", "phone": "(21) 3333-1198"},
+        {"name": "José Álvares", "phone": "(11) 98765-4321"},
+        {"name": "Maria José", "email": "mjose@exemplo.com", "cpf_cnpj": "123.456.789-09"},
+        {"name": "Josefina Lima"},
+    ]
+    ids = [client.post("/api/v1/clientes/", json=data, headers=headers).json()["id"] for data in clients]
+    client.post("/api/v1/clientes/", json={"name": "José de outro usuário"}, headers=other)
+
+    def search(q, **params):
+        response = client.get("/api/v1/clientes/busca", params={"q": q, **params}, headers=headers)
+        assert response.status_code == 200
+        return [found["name"] for found in response.json()]
+
+    # Sem acento e sem diferenciar maiúsculas; começo do nome antes do meio
+    assert search("JOSE") == ["José Álvares", "Josefina Lima", "Maria José"]
+    assert search("jose", limit=1) == ["José Álvares"]
+    assert search("alv") == ["José Álvares"]
+    assert search("mjose@") == ["Maria José"]
+    # Dígitos: quem começa pelo número vem antes de quem só contém
+    assert search("1198") == ["José Álvares", "Ana Souza"]
+    assert search("123.456") == ["Maria José"]
+    assert search("zz") == []
+
+    # A busca acompanha as alterações
+    client.put(f"/api/v1/clientes/{ids[3]}", json={"name": "Fina Lima"}, headers=headers)
+    assert search("jose") == ["José Álvares", "Maria José"]
+    assert search("fina") == ["Fina Lima"]
@@ -0,0 +1,45 @@
+from tests.test_domain import create_client_and_pool, create_user_and_headers
+
+
+def test_dosing_sheet_for_all_pools(client):
+    headers = create_user_and_headers(client)
+    other = create_user_and_headers(client, "other")
+    _, unbalanced_pool = create_client_and_pool(client, headers, "Ana") # 20000 L
+    _, balanced_pool = create_client_and_pool(client, headers, "Bruno")
+    _, new_pool = create_client_and_pool(client, headers, "Carla")
+    readings = [
+        (unbalanced_pool, {"ph": "8", "chlorine": "0,5", "alkalinity": "60"}),
+        (balanced_pool, {"ph": "7,4", "chlorine": "2", "alkalinity": "100"}),
+    ]
+    for pool_id, values in readings:
+        client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "tratamento", **values}, headers=headers)
+
+    response = client.get("/api/v1/dosagem/", headers=headers)
+    assert response.status_code == 200
+    sheet = {pool["pool_id"]: pool for pool in response.json()["pools"]}
+    assert set(sheet) == {unbalanced_pool, new_pool}
+    doses = [(dose["product"], dose["current"], dose["target"], dose["quantity"], dose["unit"]) for dose in sheet[unbalanced_pool]["doses"]]
+    assert doses == [
+        ("bicarbonato", 60.0, 100.0, 1360.0, "g"),
+        ("redutor_ph", 8.0, 7.4, 1200.0, "ml"),
+        ("cloro_granulado", 0.5, 2.0, 45.0, "g"),
+    ]
+    assert sheet[new_pool]["warnings"] == ["Sem leituras no período"]
+
+    everything = client.get("/api/v1/dosagem/", params={"include_ok": True, "pool_id": [balanced_pool]}, headers=headers).json()
+    assert [(pool["pool_id"], pool["doses"]) for pool in everything["pools"]] == [(balanced_pool, [])]
+    assert client.get("/api/v1/dosagem/", params={"pool_id": [unbalanced_pool]}, headers=other).json()["pools"] == []
+
+    # Catálogo em AppSetting: só superusuário altera; sem redutor de pH, vira aviso
+    catalog = client.get("/api/v1/dosagem/catalogo", headers=headers).json()
+    without_reducer = [product for product in catalog if product["key"] != "redutor_ph"]
+    assert client.put("/api/v1/dosagem/catalogo", json=without_reducer, headers=headers).status_code == 403
+    client.post("/api/v1/admin/initial-superuser", json={"email": "admin@example.com", "username": "admin", "password": "adminpassword"})
+    token = client.post("/auth/token", data={"username": "admin", "password": "adminpassword"}).json()["access_token"]
+    admin = {"Authorization": f"Bearer {token}"}
+    assert client.put("/api/v1/dosagem/catalogo", json=catalog + catalog[:1], headers=admin).status_code == 422
+    assert client.put("/api/v1/dosagem/catalogo", json=without_reducer, headers=admin).status_code == 200
+
+    pool = client.get("/api/v1/dosagem/", params={"pool_id": [unbalanced_pool]}, headers=headers).json()["pools"][0]
+    assert [dose["product"] for dose in pool["doses"]] == ["bicarbonato", "cloro_granulado"]
+    assert pool["warnings"] == ["pH fora da faixa e sem produto no catálogo para corrigir"]
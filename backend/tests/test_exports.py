@@ -0,0 +1,75 @@
+import csv
+import gzip
+import io
+import json
+
+from app.config import settings
+from tests.test_domain import create_client_and_pool, create_user_and_headers
+
+
+def seed_services(client, headers):
+    first_client, first_pool = create_client_and_pool(client, headers, "Ana")
+    _, second_pool = create_client_and_pool(client, headers, "Bruno")
+    services = [
+        {"pool_id": first_pool, "service_type": "limpeza", "date": "2024-01-10T10:00:00Z", "value": "150,00", "time_spent": "1h30"},
+        {"pool_id": first_pool, "service_type": "tratamento", "date": "2024-06-30T23:00:00Z", "ph": "7,2"},
+        {"pool_id": second_pool, "service_type": "limpeza", "date": "2024-07-01T09:00:00Z"},
+        {"pool_id": first_pool, "service_type": "limpeza", "date": "2025-01-05T09:00:00Z"},
+    ]
+    assert not client.post("/api/v1/servicos/bulk", json=services, headers=headers).json()["errors"]
+    return first_client, first_pool, second_pool
+
+
+def test_export_services_csv_and_ndjson(client, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2) # Várias partições do cursor
+    headers = create_user_and_headers(client)
+    first_client, first_pool, second_pool = seed_services(client, headers)
+    other = create_user_and_headers(client, "other")
+    seed_services(client, other)
+
+    response = client.get(
+        "/api/v1/exportar/servicos", params={"start_date": "2024-01-01", "end_date": "2024-12-31"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="servicos.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert [(row["service_type"], row["client_name"]) for row in rows] == [
+        ("limpeza", "Ana"), ("tratamento", "Ana"), ("limpeza", "Bruno"),
+    ]
+    assert (rows[0]["value"], rows[0]["time_spent"], rows[1]["ph"]) == ("150.00", "1h30", "7.20")
+
+    response = client.get(
+        "/api/v1/exportar/servicos", params={"format": "ndjson", "pool_id": first_pool}, headers=headers
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [line["date"][:10] for line in lines] == ["2024-01-10", "2024-06-30", "2025-01-05"]
+    assert lines[0]["value"] == "150.00" and lines[0]["client_id"] == first_client
+
+    response = client.get("/api/v1/exportar/servicos", params={"format": "xml"}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_exports_are_gzipped_when_accepted(client):
+    headers = create_user_and_headers(client)
+    first_client, _, _ = seed_services(client, headers)
+    client.post(
+        "/api/v1/orcamentos/",
+        json={"client_id": first_client, "items": [{"product": "Cloro", "quantity": "2", "unit_price": "10"}]},
+        headers=headers,
+    )
+
+    # stream=True para ler o corpo comprimido sem a descompressão automática do httpx
+    with client.stream(
+        "GET", "/api/v1/exportar/orcamentos", params={"format": "ndjson"},
+        headers={**headers, "Accept-Encoding": "gzip"},
+    ) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        body = gzip.decompress(b"".join(response.iter_raw()))
+    [budget] = [json.loads(line) for line in body.decode().splitlines()]
+    assert (budget["client_name"], budget["total"], budget["items"][0]["product"]) == ("Ana", "20.00", "Cloro")
+
+    response = client.get("/api/v1/exportar/clientes", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert [row["name"] for row in csv.DictReader(io.StringIO(response.content.decode("utf-8-sig")))] == ["Ana", "Bruno"]
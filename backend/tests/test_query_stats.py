@@ -0,0 +1,33 @@
+import logging
+
+from app.config import settings
+from tests.test_domain import create_client_and_pool, create_user_and_headers
+
+def test_endpoint_query_budgets(client, query_budget):
+    headers = create_user_and_headers(client)
+    client_id, pool_id = create_client_and_pool(client, headers)
+    client.post("/api/v1/servicos/", json={"pool_id": pool_id, "service_type": "limpeza"}, headers=headers)
+
+    with query_budget(1):
+        client.get("/api/v1/clientes/", headers=headers)
+        client.get(f"/api/v1/clientes/{client_id}", headers=headers)
+        client.get("/api/v1/servicos/", headers=headers)
+        client.get("/api/v1/orcamentos/", headers=headers)
+        client.get(f"/api/v1/piscinas/{pool_id}", headers=headers)
+    with query_budget(2):
+        client.get(f"/api/v1/piscinas/cliente/{client_id}", headers=headers)
+
+def test_slow_queries_are_logged_with_redacted_parameters(client, query_budget, monkeypatch, caplog):
+    headers = create_user_and_headers(client)
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.INFO, logger="app"), query_budget(5) as recorded:
+        client.post("/api/v1/clientes/", json={"name": "Maria Sigilosa", "phone": "11999990000"}, headers=headers)
+
+    method, path, stats = recorded[-1]
+    assert stats.count >= 1 and stats.total_time > 0
+    insert = next(s for s in stats.slow if s["statement"].startswith("INSERT INTO clients"))
+    assert "<str>" in str(insert["parameters"])
+    assert "Maria Sigilosa" not in caplog.text and "11999990000" not in caplog.text
+    assert "Consulta lenta" in caplog.text
+    assert f"POST {path}: {stats.count} consultas" in caplog.text
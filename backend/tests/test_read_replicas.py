@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import database
+from tests.test_domain import create_user_and_headers
+
+# As "réplicas" são cópias do arquivo SQLite de teste, cada uma com um cliente
+# marcador a mais, para sabermos de qual fonte veio cada leitura.
+
+def make_router(replicas, **options):
+    # Reaproveita o sessionmaker do banco de teste a partir do roteador que o fixture instalou
+    return database.ReplicaRouter(
+        database._replica_router.primary,
+        replicas,
+        retry_seconds=options.get("retry_seconds", 30.0),
+        read_your_writes_seconds=options.get("read_your_writes_seconds", 5.0),
+    )
+
+def make_replica(db, name: str, marker: str | None = None):
+    primary_path = db.get_bind().url.database
+    path = os.path.join(os.path.dirname(primary_path), f"{name}.db")
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+        if marker:
+            target.execute("INSERT INTO clients (name, owner_id, is_active) SELECT ?, id, 1 FROM users", (marker,))
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    return async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+def client_names(client, headers):
+    return {c["name"] for c in client.get("/api/v1/clientes/", headers=headers).json()}
+
+def test_reads_round_robin_and_read_your_writes(client, db, monkeypatch):
+    headers = create_user_and_headers(client)
+    client.post("/api/v1/clientes/", json={"name": "Cliente"}, headers=headers)
+    router = make_router(
+        [make_replica(db, "replica_a", "Réplica A"), make_replica(db, "replica_b", "Réplica B")],
+        read_your_writes_seconds=0.3,
+    )
+    monkeypatch.setattr(database, "_replica_router", router)
+
+    first, second, third = (client_names(client, headers) for _ in range(3))
+    assert sorted([first - {"Cliente"}, second - {"Cliente"}], key=sorted) == [{"Réplica A"}, {"Réplica B"}]
+    assert third == first
+
+    # Logo após escrever, o próprio usuário lê do primário (as réplicas ainda não têm o dado)
+    client.post("/api/v1/clientes/", json={"name": "Novo"}, headers=headers)
+    assert client_names(client, headers) == {"Cliente", "Novo"}
+
+    # Passada a janela, as leituras voltam para as réplicas
+    time.sleep(0.35)
+    assert "Novo" not in client_names(client, headers)
+
+def test_unreachable_replica_is_skipped(client, db, monkeypatch):
+    headers = create_user_and_headers(client)
+    client.post("/api/v1/clientes/", json={"name": "Cliente"}, headers=headers)
+    unreachable = async_sessionmaker(
+        bind=create_async_engine(f"sqlite+aiosqlite:///{os.path.dirname(db.get_bind().url.database)}/missing/replica.db", poolclass=NullPool),
+        class_=AsyncSession,
+    )
+    client.cookies.clear() # Sem a marca de escrita recente: as leituras podem ir às réplicas
+    router = make_router([unreachable, make_replica(db, "replica_ok", "Réplica OK")])
+    monkeypatch.setattr(database, "_replica_router", router)
+
+    for _ in range(3):
+        assert client_names(client, headers) == {"Cliente", "Réplica OK"}
+    assert 0 in router._unhealthy_until and 1 not in router._unhealthy_until
+
+    # Sem nenhuma réplica saudável, a leitura cai no primário
+    router.mark_unhealthy(1)
+    assert client_names(client, headers) == {"Cliente"}
+
+def test_read_your_writes_follows_the_client_across_workers(client, db, monkeypatch):
+    # Escrita síncrona (get_db) também marca a resposta
+    register = client.post("/auth/register", json={"email": "w@example.com", "username": "w", "password": "password123"})
+    assert database.WRITE_MARKER_COOKIE in register.cookies
+    headers = create_user_and_headers(client, "w")
+    client.post("/api/v1/clientes/", json={"name": "Cliente"}, headers=headers)
+    replicas = [make_replica(db, "replica_w", "Réplica")]
+
+    # Outro worker: roteador novo, sem memória da escrita; quem leva a marca é o cliente
+    client.post("/api/v1/clientes/", json={"name": "Novo"}, headers=headers)
+    monkeypatch.setattr(database, "_replica_router", make_router(replicas))
+    assert client_names(client, headers) == {"Cliente", "Novo"}
+
+    client.cookies.clear()
+    monkeypatch.setattr(database, "_replica_router", make_router(replicas))
+    assert client_names(client, headers) == {"Cliente", "Réplica"}
+
+    # Cookie adulterado (fora da janela) é ignorado
+    client.cookies.set(database.WRITE_MARKER_COOKIE, str(time.time() + 3600))
+    assert client_names(client, headers) == {"Cliente", "Réplica"}
+
+def test_read_your_writes_cookie_works_through_cors(client, db, monkeypatch):
+    # Como o SPA: outra origem, com credenciais
+    origin = {"Origin": "http://localhost:5173"}
+    headers = {**create_user_and_headers(client), **origin}
+    client.cookies.clear()
+    client.post("/api/v1/clientes/", json={"name": "Cliente"}, headers=headers)
+    replicas = [make_replica(db, "replica_cors", "Réplica")]
+
+    response = client.post("/api/v1/clientes/", json={"name": "Novo"}, headers=headers)
+    assert response.headers["access-control-allow-origin"] == origin["Origin"]
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert "httponly" in response.headers["set-cookie"].lower()
+
+    monkeypatch.setattr(database, "_replica_router", make_router(replicas))
+    assert client_names(client, headers) == {"Cliente", "Novo"}
@@ -1,36 +1,301 @@
+import io
 import os
 import shutil
 
-def test_upload_image(client):
+import pytest
+
+def use_local_storage(monkeypatch, root):
+    from app import storage
+
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorage(str(root)))
+
+def serve_uploads_from(monkeypatch, root):
+    """Armazenamento local e o /static/uploads montado no app apontando para `root`."""
+    from main import app
+
+    use_local_storage(monkeypatch, root)
+    mounted = next(route.app for route in app.routes if getattr(route, "name", None) == "uploads")
+    monkeypatch.setattr(mounted, "directory", str(root))
+    monkeypatch.setattr(mounted, "all_directories", [str(root)])
+
+def skip_variant_jobs(monkeypatch) -> list:
+    """Registra as variantes pedidas em vez de gerá-las no pool de processos."""
+    from app import images
+
+    scheduled = []
+    monkeypatch.setattr(images, "schedule_variants", lambda storage, filename: scheduled.append(filename))
+    return scheduled
+
+@pytest.fixture
+def headers(client):
+    from tests.test_domain import create_user_and_headers
+
+    return create_user_and_headers(client)
+
+def test_upload_image(client, headers, tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads"
+    use_local_storage(monkeypatch, uploads)
+    scheduled = skip_variant_jobs(monkeypatch)
+
     # Create a dummy image file
-    with open("test_image.jpg", "wb") as f:
-        f.write(b"fake image content")
-        
-    with open("test_image.jpg", "rb") as f:
+    image_path = tmp_path / "test_image.jpg"
+    image_path.write_bytes(b"fake image content")
+
+    with open(image_path, "rb") as f:
         response = client.post(
             "/api/v1/upload",
-            files={"file": ("test_image.jpg", f, "image/jpeg")}
+            files={"file": ("test_image.jpg", f, "image/jpeg")},
+            headers=headers,
         )
         
     assert response.status_code == 200
     data = response.json()
     assert "url" in data
     assert "filename" in data
-    
-    # Cleanup
-    os.remove("test_image.jpg")
-    # Note: In a real test environment, we should clean up the uploaded file from backend/static/uploads too
-    # but since we use unique IDs, it won't conflict. Ideally, we mock the filesystem or use a temp dir.
+    assert (uploads / data["filename"]).read_bytes() == b"fake image content"
+    assert scheduled == [data["filename"]]
 
-def test_upload_invalid_file_type(client):
+def test_upload_invalid_file_type(client, headers):
     with open("test.txt", "w") as f:
         f.write("text content")
         
     with open("test.txt", "rb") as f:
         response = client.post(
             "/api/v1/upload",
-            files={"file": ("test.txt", f, "text/plain")}
+            files={"file": ("test.txt", f, "text/plain")},
+            headers=headers,
         )
         
     assert response.status_code == 400
     os.remove("test.txt")
+
+def test_upload_is_streamed_and_size_limited(client, headers, tmp_path, monkeypatch):
+    from app.routers import upload
+
+    use_local_storage(monkeypatch, tmp_path)
+    content = os.urandom(256 * 1024)
+    response = client.post("/api/v1/upload", files={"file": ("foto.php", content, "image/png")}, headers=headers)
+    assert response.status_code == 200
+    filename = response.json()["filename"]
+    assert filename.endswith(".png") # Extensão pelo tipo validado, não pelo nome enviado
+    assert (tmp_path / filename).read_bytes() == content
+    assert (tmp_path / filename).stat().st_mode & 0o777 == 0o644 # Legível pelo servidor web, não só pelo app
+
+    # Acima do limite: recusado, sem deixar temporário para trás
+    too_large = b"\0" * (upload.MAX_FILE_SIZE + 1)
+    response = client.post("/api/v1/upload", files={"file": ("grande.jpg", too_large, "image/jpeg")}, headers=headers)
+    assert response.status_code == 400
+    response = client.post(
+        "/api/v1/upload",
+        files={"file": ("grande.jpg", too_large, "image/jpeg")},
+        headers={**headers, "Content-Length": "1000"}, # Mentindo o tamanho: o corte é feito durante a leitura
+    )
+    assert response.status_code == 400
+    assert client.post("/api/v1/upload", data={"other": "x"}, files={"attachment": ("a.jpg", b"x", "image/jpeg")}, headers=headers).status_code == 400
+    assert sorted(path.name for path in tmp_path.iterdir()) == [filename]
+
+def test_upload_variants_are_generated_in_background(client, headers, tmp_path, monkeypatch):
+    pytest.importorskip("PIL")
+    from PIL import Image
+    from app import images
+
+    use_local_storage(monkeypatch, tmp_path)
+    jobs = {}
+    schedule = images.schedule_variants
+    monkeypatch.setattr(images, "schedule_variants", lambda storage, filename: jobs.setdefault(filename, schedule(storage, filename)))
+    # Foto "deitada" (1600x1200 + rotação de 90° no EXIF) com localização
+    exif = Image.Exif()
+    exif[0x0112] = 6 # Orientation
+    exif[0x010F] = "Celular"
+    photo = io.BytesIO()
+    Image.new("RGB", (1600, 1200), "blue").save(photo, "JPEG", exif=exif)
+
+    filename = client.post("/api/v1/upload", files={"file": ("foto.jpg", photo.getvalue(), "image/jpeg")}, headers=headers).json()["filename"]
+    jobs[filename].result(timeout=60)
+
+    response = client.get(f"/api/v1/upload/{filename}/thumb")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    with Image.open(tmp_path / "variants" / "thumb" / filename) as thumb:
+        assert thumb.size == (240, 320) # Rotação aplicada, lado maior 320
+        assert not thumb.getexif()
+    assert (tmp_path / "variants" / "thumb" / filename).stat().st_mode & 0o777 == 0o644
+    webp = client.get(f"/api/v1/upload/{filename}/webp").json()
+    assert webp["url"] == f"/static/uploads/variants/webp/{filename.replace('.jpg', '.webp')}"
+    with Image.open(tmp_path / "variants" / "webp" / filename.replace(".jpg", ".webp")) as full:
+        assert (full.format, full.size) == ("WEBP", (1200, 1600))
+
+    # Imagem que o Pillow não abre: continua servindo o original
+    broken = client.post("/api/v1/upload", files={"file": ("x.png", b"not a png", "image/png")}, headers=headers).json()["filename"]
+    with pytest.raises(Exception):
+        jobs[broken].result(timeout=60)
+    assert client.get(f"/api/v1/upload/{broken}/medium").json() == {
+        "filename": broken, "variant": "medium", "url": f"/static/uploads/{broken}", "ready": False,
+    }
+    assert client.get(f"/api/v1/upload/{broken}/huge").status_code == 404
+    assert client.get("/api/v1/upload/..%2Fsecret.png/thumb").status_code == 404
+
+def test_uploads_are_content_addressed_and_reference_counted(client, headers, tmp_path, monkeypatch):
+    import hashlib
+    from tests.test_domain import create_user_and_headers
+
+    use_local_storage(monkeypatch, tmp_path)
+    content = os.urandom(1024)
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert client.post("/api/v1/upload", files={"file": ("a.jpg", content, "image/jpeg")}).status_code == 401
+
+    first = client.post("/api/v1/upload", files={"file": ("a.jpg", content, "image/jpeg")}, headers=headers)
+    assert first.headers["ETag"] == f'"{sha256}"'
+    assert first.json() == {
+        "filename": f"{sha256}.jpg", "url": f"/static/uploads/{sha256}.jpg",
+        "sha256": sha256, "size": 1024, "deduplicated": False,
+    }
+    # Mesmo conteúdo por outro usuário, outro nome e outro tipo declarado: mesmo arquivo, sem cópia
+    other = create_user_and_headers(client, "outro")
+    second = client.post("/api/v1/upload", files={"file": ("b.png", content, "image/png")}, headers=other).json()
+    assert (second["filename"], second["deduplicated"]) == (f"{sha256}.jpg", True)
+    assert [path.name for path in tmp_path.iterdir()] == [f"{sha256}.jpg"]
+
+    # Cada um só tira as próprias referências
+    intruder = create_user_and_headers(client, "intruso")
+    assert client.delete(f"/api/v1/upload/{sha256}.jpg").status_code == 401
+    assert client.delete(f"/api/v1/upload/{sha256}.jpg", headers=intruder).status_code == 404
+    assert client.delete(f"/api/v1/upload/{sha256}.jpg", headers=other).status_code == 204
+    assert client.delete(f"/api/v1/upload/{sha256}.jpg", headers=other).status_code == 404
+    assert (tmp_path / f"{sha256}.jpg").exists() # Ainda há a referência do primeiro usuário
+    assert client.delete(f"/api/v1/upload/{sha256}.jpg", headers=headers).status_code == 204
+    assert list(tmp_path.iterdir()) == []
+    assert client.delete(f"/api/v1/upload/{sha256}.jpg", headers=headers).status_code == 404
+    assert client.delete("/api/v1/upload/foto.jpg", headers=headers).status_code == 404
+
+def test_s3_storage_uploads_in_parallel_parts(client, headers, tmp_path, monkeypatch):
+    pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    pytest.importorskip("PIL")
+    from PIL import Image
+    from app import images, storage
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        s3 = storage.S3Storage(
+            "fotos", region="us-east-1", multipart_threshold=5 * 1024 * 1024,
+            multipart_chunk_size=5 * 1024 * 1024, max_concurrency=4,
+        )
+        s3.client.create_bucket(Bucket="fotos")
+
+        # Acima do limite: enviado em partes (ETag de multipart termina em -<partes>)
+        large = os.urandom(11 * 1024 * 1024)
+        local_path = tmp_path / "grande.bin"
+        local_path.write_bytes(large)
+        s3.save(str(local_path), "grande.bin", "application/octet-stream")
+        assert not local_path.exists()
+        head = s3.client.head_object(Bucket="fotos", Key="grande.bin")
+        assert head["ETag"].endswith('-3"')
+        assert head["CacheControl"] == "public, max-age=31536000, immutable"
+        with s3.fetch("grande.bin") as path:
+            with open(path, "rb") as f:
+                assert f.read() == large
+        s3.delete("grande.bin")
+        assert not s3.exists("grande.bin")
+
+        # Pela API: URL pré-assinada e variantes geradas direto do bucket
+        monkeypatch.setattr(storage, "_storage", s3)
+        monkeypatch.setattr(images, "schedule_variants", lambda *args: None)
+        photo = io.BytesIO()
+        Image.new("RGB", (800, 600), "green").save(photo, "JPEG")
+        data = client.post("/api/v1/upload", files={"file": ("foto.jpg", photo.getvalue(), "image/jpeg")}, headers=headers).json()
+        assert data["url"].startswith("https://fotos.s3.amazonaws.com/") and "Signature=" in data["url"]
+        assert s3.client.head_object(Bucket="fotos", Key=data["filename"])["ContentType"] == "image/jpeg"
+        assert client.get(f"/api/v1/upload/{data['filename']}/thumb").json()["ready"] is False
+
+        images.make_variants(s3, data["filename"])
+        thumb = client.get(f"/api/v1/upload/{data['filename']}/thumb").json()
+        assert thumb["ready"] is True and f"variants/thumb/{data['filename']}" in thumb["url"]
+
+def test_uploads_are_served_with_cache_validators_and_ranges(client, headers, tmp_path, monkeypatch):
+    import gzip
+    import hashlib
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.testclient import TestClient
+    from app.static_files import UploadStaticFiles
+
+    # Pelo app: /static/uploads vem do handler de uploads, não do /static genérico
+    serve_uploads_from(monkeypatch, tmp_path / "app")
+    skip_variant_jobs(monkeypatch)
+    content = os.urandom(4096)
+    sha256 = hashlib.sha256(content).hexdigest()
+    url = client.post("/api/v1/upload", files={"file": ("a.jpg", content, "image/jpeg")}, headers=headers).json()["url"]
+    response = client.get(url)
+    assert response.content == content
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["etag"] == f'"{sha256}"'
+
+    (tmp_path / f"{sha256}.jpg").write_bytes(content)
+    (tmp_path / "variants" / "thumb").mkdir(parents=True)
+    (tmp_path / "variants" / "thumb" / f"{sha256}.jpg").write_bytes(b"thumb")
+    (tmp_path / "legado.svg").write_bytes(b"<svg/>")
+    (tmp_path / "legado.svg.gz").write_bytes(gzip.compress(b"<svg/>"))
+    (tmp_path / ".upload-x.part").write_bytes(b"em andamento")
+    static = TestClient(Starlette(routes=[Mount("/u", UploadStaticFiles(directory=str(tmp_path)))]))
+
+    original = static.get(f"/u/{sha256}.jpg")
+    assert (original.headers["etag"], original.headers["content-type"]) == (f'"{sha256}"', "image/jpeg")
+    assert static.get(f"/u/{sha256}.jpg", headers={"If-None-Match": f'"{sha256}"'}).status_code == 304
+    assert static.get(f"/u/variants/thumb/{sha256}.jpg").headers["etag"] == f'"{sha256}-thumb"'
+
+    partial = static.get(f"/u/{sha256}.jpg", headers={"Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == content[100:200]
+    assert partial.headers["content-range"] == "bytes 100-199/4096"
+    stale = static.get(f"/u/{sha256}.jpg", headers={"Range": "bytes=100-199", "If-Range": '"outro"'})
+    assert (stale.status_code, stale.content) == (200, content)
+
+    # Nome sem hash: revalida sempre; versão .gz servida a quem aceita gzip
+    compressed = static.get("/u/legado.svg", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["content-type"] == "image/svg+xml"
+    assert compressed.headers["cache-control"] == "public, no-cache"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.content == b"<svg/>" # Descomprimido pelo cliente
+    plain = static.get("/u/legado.svg", headers={"Accept-Encoding": "br, gzip;q=0"})
+    assert "content-encoding" not in plain.headers
+    revalidated = static.get("/u/legado.svg", headers={"Accept-Encoding": "identity", "If-None-Match": plain.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert static.get("/u/.upload-x.part").status_code == 404
+
+def test_variant_failures_are_retried_unless_the_image_is_undecodable(tmp_path, monkeypatch):
+    pytest.importorskip("PIL")
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+    from PIL import Image, UnidentifiedImageError
+    from app import images
+    from app.cache import TTLCache
+    from app.storage import LocalStorage
+
+    monkeypatch.setattr(images, "_failed", TTLCache(maxsize=10, ttl=60))
+
+    def failed(error):
+        future = Future()
+        future.set_exception(error)
+        return future
+
+    # Armazenamento fora do ar: tenta de novo; imagem que o Pillow não abre: não
+    images._finished("a.jpg", None, failed(FileNotFoundError("a.jpg")))
+    images._finished("b.jpg", None, failed(UnidentifiedImageError("b.jpg")))
+    assert not images._failed.get("a.jpg") and images._failed.get("b.jpg")
+    assert images.schedule_variants(LocalStorage(str(tmp_path)), "b.jpg") is None
+
+    # Worker morto quebra o pool: é trocado, e os jobs seguintes rodam
+    executor = images._get_executor()
+    crash = executor.submit(os._exit, 1)
+    with pytest.raises(BrokenProcessPool):
+        crash.result(timeout=60)
+    images._finished("c.jpg", executor, crash)
+    assert images._executor is not executor and not images._failed.get("c.jpg")
+
+    storage = LocalStorage(str(tmp_path))
+    Image.new("RGB", (400, 300), "red").save(tmp_path / "c.jpg", "JPEG")
+    images.schedule_variants(storage, "c.jpg").result(timeout=60)
+    assert storage.exists("variants/thumb/c.jpg")
@@ -33,16 +33,31 @@ interface Service {
     remarks?: string;
 }
 
+interface BudgetItem {
+    product: string | null;
+    description: string | null;
+    quantity: string;
+    unit_price: string | null;
+    line_total: string | null;
+}
+
 interface Budget {
     id: number;
     client_id: number;
-    items: string;
+    items: BudgetItem[];
     total: string;
     status: string;
     validity: string;
     created_at: string;
 }
 
+// Texto de um item do orçamento: "2 x Cloro (R$ 21.00)" ou só a descrição
+const describeItem = (item: BudgetItem) => {
+    const name = [item.product, item.description].filter(Boolean).join(' - ');
+    const quantity = Number(item.quantity) !== 1 ? `${Number(item.quantity)} x ` : '';
+    return item.line_total ? `${quantity}${name} (R$ ${item.line_total})` : `${quantity}${name}`;
+};
+
 export default function ClientDetails() {
     const { id } = useParams();
     const [client, setClient] = useState<Client | null>(null);
@@ -79,6 +94,7 @@ export default function ClientDetails() {
     // Edit State
     const [editingService, setEditingService] = useState<Service | null>(null);
     const [editingBudget, setEditingBudget] = useState<Budget | null>(null);
+    const [budgetItemsEdited, setBudgetItemsEdited] = useState(false);
 
     useEffect(() => {
         fetchData();
@@ -190,11 +206,17 @@ export default function ClientDetails() {
     const handleCreateOrUpdateBudget = async (e: React.FormEvent) => {
         e.preventDefault();
         try {
-            let itemsPayload = newBudget.items;
-            try {
-                JSON.parse(newBudget.items);
-            } catch {
-                itemsPayload = JSON.stringify([{ description: newBudget.items }]);
+            // Na edição, itens não alterados voltam como estão (produto, quantidade e preço);
+            // o texto do formulário é só a descrição deles
+            let itemsPayload: string | BudgetItem[] = newBudget.items;
+            if (editingBudget && !budgetItemsEdited) {
+                itemsPayload = editingBudget.items;
+            } else {
+                try {
+                    JSON.parse(newBudget.items);
+                } catch {
+                    itemsPayload = JSON.stringify([{ description: newBudget.items }]);
+                }
             }
 
             const payload = {
@@ -221,17 +243,10 @@ export default function ClientDetails() {
 
     const handleEditBudget = (budget: Budget) => {
         setEditingBudget(budget);
-
-        let displayItems = budget.items;
-        try {
-            const parsed = JSON.parse(budget.items);
-            if (Array.isArray(parsed) && parsed.length > 0) {
-                displayItems = parsed.map((i: any) => i.description).join('\n');
-            }
-        } catch { }
+        setBudgetItemsEdited(false);
 
         setNewBudget({
-            items: displayItems,
+            items: budget.items.map(describeItem).join('\n'),
             total: budget.total,
             validity: budget.validity ? budget.validity.split('T')[0] : ''
         });
@@ -550,7 +565,7 @@ export default function ClientDetails() {
                                         <label className="block text-sm font-medium text-gray-700">Descrição / Itens</label>
                                         <textarea required className="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring-blue-500 sm:text-sm"
                                             rows={3} placeholder="Descreva os itens do orçamento..."
-                                            value={newBudget.items} onChange={e => setNewBudget({ ...newBudget, items: e.target.value })} />
+                                            value={newBudget.items} onChange={e => { setNewBudget({ ...newBudget, items: e.target.value }); setBudgetItemsEdited(true); }} />
                                     </div>
                                     <div>
                                         <label className="block text-sm font-medium text-gray-700">Valor Total (R$)</label>
@@ -581,15 +596,7 @@ export default function ClientDetails() {
                                             R$ {budget.total}
                                         </p>
                                         <p className="text-sm text-gray-500 truncate">
-                                            {/* Tries to parse JSON description, fallback to raw string */}
-                                            {(() => {
-                                                try {
-                                                    const items = JSON.parse(budget.items);
-                                                    return items[0]?.description || budget.items;
-                                                } catch {
-                                                    return budget.items;
-                                                }
-                                            })()}
+                                            {budget.items[0] ? describeItem(budget.items[0]) : ''}
                                         </p>
                                         <p className="text-xs text-blue-500 mt-1">Status: {budget.status}</p>
                                     </div>
@@ -733,17 +740,7 @@ export default function ClientDetails() {
                                         <div>
                                             <p className="text-sm font-medium text-gray-500">Itens / Descrição</p>
                                             <div className="mt-2 bg-gray-50 rounded p-3 text-sm text-gray-900 whitespace-pre-wrap font-mono">
-                                                {/* Try to parse JSON or show raw */}
-                                                {(() => {
-                                                    try {
-                                                        const items = JSON.parse(selectedBudget.items);
-                                                        return Array.isArray(items)
-                                                            ? items.map((i: any, idx: number) => `- ${i.description}`).join('\n')
-                                                            : JSON.stringify(items, null, 2);
-                                                    } catch {
-                                                        return selectedBudget.items;
-                                                    }
-                                                })()}
+                                                {selectedBudget.items.map(item => `- ${describeItem(item)}`).join('\n')}
                                             </div>
                                         </div>
 
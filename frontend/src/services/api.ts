@@ -4,6 +4,9 @@ const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
 const api = axios.create({
     baseURL: API_URL,
+    // Envia e guarda os cookies da API (outra origem): o rw_until faz as leituras logo
+    // depois de uma gravação irem ao banco primário, em qualquer worker
+    withCredentials: true,
     headers: {
         'Content-Type': 'application/json',
     },